@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Start-up time of the azpipvar command.
+
+Every measurement starts a fresh interpreter, so module imports are paid in
+full each time. Three commands are timed: an empty interpreter, importing
+check_variables, and a complete cached run over a small pipeline tree. The
+difference between the first two is the import overhead of the entry point.
+The slowest imports are listed from python -X importtime.
+
+Run from the azpipvar directory:
+
+    python benchmarks/bench_startup.py --repeat 20 -o startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+# Format version of the results file
+RESULTS_VERSION = 1
+
+PIPELINE = """trigger:
+- main
+
+variables:
+- group: shared
+- name: Configuration
+  value: Release
+
+steps:
+- script: echo $(Configuration) $(BuildNumber) $(Environment)
+"""
+
+def make_tree(directory, files=20):
+    """Write a small pipeline tree to directory and return it."""
+    for i in range(files):
+        path = os.path.join(directory, f"team{i % 4}", f"pipeline{i}.yml")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(PIPELINE)
+    return directory
+
+def _time(command, cwd, env):
+    """Return the wall-clock seconds a command takes."""
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def slowest_imports(cwd, env, count):
+    """Return the count slowest imports of check_variables as [(module, cumulative ms)]."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import check_variables'],
+                            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        imports.append((fields[2].strip(), int(fields[1]) / 1000))
+    return sorted(imports, key=lambda entry: -entry[1])[:count]
+
+def run_suite(args):
+    """Time every command and return the results document."""
+    from version import __version__
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    with tempfile.TemporaryDirectory() as directory:
+        tree = make_tree(os.path.join(directory, 'pipelines'))
+        cache_dir = os.path.join(directory, 'cache')
+        commands = {
+            'interpreter': [sys.executable, '-c', 'pass'],
+            'import': [sys.executable, '-c', 'import check_variables'],
+            'run': [sys.executable, os.path.join(SRC, 'check_variables.py'), '--no-track-install',
+                    '--cache-dir', cache_dir],
+        }
+        # Fill the cache so the timed runs measure start-up rather than scanning
+        _time(commands['run'], tree, env)
+
+        cases = {}
+        for name, command in commands.items():
+            runs = [_time(command, tree, env) * 1000 for _ in range(args.repeat)]
+            cases[name] = {'min_ms': min(runs), 'median_ms': statistics.median(runs)}
+            print(f"{name:>11} min {cases[name]['min_ms']:7.1f} ms  median {cases[name]['median_ms']:7.1f} ms",
+                  file=sys.stderr)
+        overhead = cases['import']['min_ms'] - cases['interpreter']['min_ms']
+        print(f"{'overhead':>11} {overhead:7.1f} ms to import check_variables", file=sys.stderr)
+
+        imports = slowest_imports(tree, env, args.top)
+        for module, milliseconds in imports:
+            print(f"{milliseconds:9.1f} ms  {module}", file=sys.stderr)
+
+    return {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'azpipvar': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'repeat': args.repeat,
+        'results': cases,
+        'import_overhead_ms': overhead,
+        'slowest_imports': [{'module': module, 'ms': milliseconds} for module, milliseconds in imports],
+    }
+
+def compare(current, baseline, threshold):
+    """Return a description of each command that got slower than the baseline."""
+    regressions = []
+    for name, case in current['results'].items():
+        old = baseline['results'].get(name)
+        if old and case['min_ms'] > old['min_ms'] * (1 + threshold):
+            regressions.append(f"{name}: {case['min_ms']:.1f} ms, was {old['min_ms']:.1f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the start-up time of azpipvar')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per command (default: 10)')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list (default: 10)')
+    parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Fail if a command got slower than in this results file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative slowdown with --compare (default: 0.2)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, SRC)
+    results = run_suite(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
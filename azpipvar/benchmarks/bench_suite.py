@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Time and peak memory of each azpipvar stage over synthetic pipeline trees.
+
+The stages are the directory walk (find_yaml_files), reading and scanning
+every file (process_yaml_file), and a complete run of main, both without a
+cache and with the cache from a previous run. Each (stage, corpus) case runs
+in a fresh process, so its peak resident memory is measured on its own.
+Results are written as JSON and can be compared with an earlier run to catch
+regressions between releases.
+
+With --profile, each stage's run is also profiled with cProfile or
+pyinstrument and the profile is saved to --profile-dir. Profiling slows the
+stages down, so do not compare timings of profiled runs.
+
+Run from the azpipvar directory:
+
+    python benchmarks/bench_suite.py --files 100,10000 --depth 0,3 -o results.json
+    python benchmarks/bench_suite.py --files 100,10000 --depth 0,3 --compare results.json
+    python benchmarks/bench_suite.py --files 10000 --stages main --profile cprofile
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from corpus import corpus_name, ensure_corpus  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory is then not reported
+    resource = None
+
+STAGES = ('find', 'process', 'main', 'main-cached')
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+# Format version of the results file
+RESULTS_VERSION = 1
+
+def _peak_rss():
+    """Return the peak resident memory of this process or its largest child in bytes, or None."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _run_main(path, arguments, output):
+    """Run check_variables.main in path as the command line would and return the report size."""
+    import check_variables
+    argv = sys.argv
+    cwd = os.getcwd()
+    sys.argv = ['azpipvar', '--no-track-install', '-o', output] + arguments
+    os.chdir(path)
+    try:
+        check_variables.main()
+    finally:
+        os.chdir(cwd)
+        sys.argv = argv
+    return os.path.getsize(output)
+
+class _Profile:
+    """Profile a block with cProfile or pyinstrument and save it to path; does nothing without a profiler."""
+
+    def __init__(self, profiler, path):
+        self.profiler = profiler
+        self.path = path
+
+    def __enter__(self):
+        if self.profiler == 'cprofile':
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.profiler == 'pyinstrument':
+            import pyinstrument
+            self.profile = pyinstrument.Profiler()
+            self.profile.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler == 'cprofile':
+            self.profile.disable()
+            self.profile.dump_stats(self.path)
+        elif self.profiler == 'pyinstrument':
+            self.profile.stop()
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(self.profile.output_html())
+
+def _measure(stage, path, options, results):
+    """Child process body: time one stage and report its memory use."""
+    sys.path.insert(0, SRC)
+    from check_variables import find_yaml_files, process_yaml_file
+
+    # Warnings are printed; keep that cost but not the noise
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'report')
+        arguments = ['-j', str(options['jobs'])] + (['--templates'] if options['templates'] else [])
+        if stage == 'main':
+            arguments.append('--no-cache')
+        elif stage == 'main-cached':
+            arguments += ['--cache-dir', os.path.join(directory, 'cache')]
+            # Fill the cache first, so only the cached run is measured
+            _run_main(path, arguments, output)
+        elif stage == 'process':
+            files = list(find_yaml_files(path))
+
+        baseline = _peak_rss()
+        start = time.perf_counter()
+        with _Profile(options['profiler'], options['profile_path']):
+            if stage == 'find':
+                count = sum(1 for _ in find_yaml_files(path))
+            elif stage == 'process':
+                count = 0
+                for file_path in files:
+                    variables, variables_in_group = process_yaml_file(file_path)
+                    count += len(variables) + len(variables_in_group)
+            else:
+                count = _run_main(path, arguments, output)
+        elapsed = time.perf_counter() - start
+        peak = _peak_rss()
+
+    results.put({
+        'seconds': elapsed,
+        'count': count,
+        'peak_rss': peak,
+        'rss_delta': None if peak is None else peak - baseline,
+    })
+
+def run_case(stage, path, options):
+    """Run one stage in a fresh process and return its measurements."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(stage, path, options, results))
+    process.start()
+    measurement = results.get()
+    process.join()
+    if process.exitcode:
+        raise RuntimeError(f"{stage} benchmark on {path} exited with {process.exitcode}")
+    return measurement
+
+def environment():
+    """Describe the interpreter and libraries a run was measured with."""
+    from version import __version__
+    try:
+        import yaml
+        yaml_version = yaml.__version__
+    except ImportError:
+        yaml_version = None
+    return {
+        'azpipvar': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'pyyaml': yaml_version,
+    }
+
+def run_suite(args):
+    """Run every selected case and return the results document."""
+    if args.profile:
+        os.makedirs(args.profile_dir, exist_ok=True)
+    cases = []
+    for files in args.files:
+        for file_bytes in args.file_bytes:
+            for variables in args.variables:
+                for depth in args.depth:
+                    path = ensure_corpus(args.corpus_dir, files, file_bytes, variables, depth, args.seed)
+                    name = corpus_name(files, file_bytes, variables, depth, args.seed)
+                    for stage in args.stages:
+                        extension = 'prof' if args.profile == 'cprofile' else 'html'
+                        options = {
+                            'jobs': args.jobs,
+                            'templates': args.templates,
+                            'profiler': args.profile,
+                            'profile_path': os.path.join(args.profile_dir, f"{stage}-{name}.{extension}"),
+                        }
+                        runs = [run_case(stage, path, options) for _ in range(args.repeat)]
+                        best = min(runs, key=lambda run: run['seconds'])
+                        peaks = [run['peak_rss'] for run in runs if run['peak_rss'] is not None]
+                        case = {
+                            'stage': stage,
+                            'files': files,
+                            'file_bytes': file_bytes,
+                            'variables': variables,
+                            'depth': depth,
+                            'seed': args.seed,
+                            'seconds': best['seconds'],
+                            'files_per_second': files / best['seconds'] if best['seconds'] else None,
+                            'peak_rss': max(peaks) if peaks else None,
+                            'rss_delta': best['rss_delta'],
+                            'count': best['count'],
+                        }
+                        cases.append(case)
+                        print(format_case(case), file=sys.stderr)
+    return {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        'jobs': args.jobs,
+        'templates': args.templates,
+        'profiler': args.profile,
+        'results': cases,
+    }
+
+def case_key(case):
+    return (case['stage'], case['files'], case['file_bytes'], case['variables'], case['depth'], case['seed'])
+
+def format_case(case):
+    memory = '-' if case['peak_rss'] is None else f"{case['peak_rss'] / (1 << 20):.1f} MB"
+    return (f"{case['stage']:>11} n={case['files']:<7} b={case['file_bytes']:<6} v={case['variables']:<4} "
+            f"t={case['depth']:<2} {case['files_per_second'] or 0:12,.0f} files/s "
+            f"{case['seconds']:9.3f}s  peak {memory}")
+
+def compare(current, baseline, threshold):
+    """Return a description of each case that regressed against the baseline."""
+    previous = {case_key(case): case for case in baseline['results']}
+    regressions = []
+    for case in current['results']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        name = (f"{case['stage']} n={case['files']} b={case['file_bytes']} "
+                f"v={case['variables']} t={case['depth']}")
+        if case['count'] != old['count']:
+            regressions.append(f"{name}: count {case['count']}, was {old['count']}")
+        if old['files_per_second'] and case['files_per_second'] < old['files_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: {case['files_per_second']:,.0f} files/s, "
+                               f"was {old['files_per_second']:,.0f}")
+        if old['peak_rss'] and case['peak_rss'] and case['peak_rss'] > old['peak_rss'] * (1 + threshold):
+            regressions.append(f"{name}: peak {case['peak_rss'] / (1 << 20):.1f} MB, "
+                               f"was {old['peak_rss'] / (1 << 20):.1f} MB")
+    return regressions
+
+def _int_list(value):
+    # Accept 1e4 as well as 10000
+    return [int(float(item)) for item in value.split(',')]
+
+def _stage_list(value):
+    stages = value.split(',')
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage: {', '.join(sorted(unknown))}")
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark azpipvar on synthetic pipeline trees')
+    parser.add_argument('--files', type=_int_list, default=[100, 10000],
+                        help='Comma-separated numbers of pipeline files, e.g. 1e2,1e4')
+    parser.add_argument('--file-bytes', type=_int_list, default=[2048],
+                        help='Comma-separated approximate sizes of each file in bytes')
+    parser.add_argument('--variables', type=_int_list, default=[20],
+                        help='Comma-separated numbers of variables referenced by each file')
+    parser.add_argument('--depth', type=_int_list, default=[0],
+                        help='Comma-separated template nesting depths')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus seed')
+    parser.add_argument('--stages', type=_stage_list, default=list(STAGES),
+                        help=f"Comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Worker processes for the main stages (default: 1)')
+    parser.add_argument('--templates', action='store_true', help='Pass --templates to the main stages')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is kept')
+    parser.add_argument('--profile', choices=PROFILERS, help='Also save a profile of every run of each stage')
+    parser.add_argument('--profile-dir', default=os.path.join(tempfile.gettempdir(), 'azpipvar-profiles'),
+                        help='Where profiles are written (default: %(default)s)')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'azpipvar-corpora'),
+                        help='Where generated corpora are kept between runs')
+    parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Fail if a case regressed against this results file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative slowdown or memory growth with --compare (default: 0.2)')
+    args = parser.parse_args()
+
+    if args.profile == 'pyinstrument':
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            print("Error: pyinstrument is not installed; run pip install pyinstrument or use --profile cprofile")
+            sys.exit(1)
+
+    results = run_suite(args)
+    if args.profile:
+        print(f"Profiles written to {args.profile_dir}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Reproducible synthetic Azure pipeline trees for the benchmarks.
+
+A corpus is fully determined by its file count, file size, variable density,
+template nesting depth and seed, so two runs with the same parameters write
+byte-identical trees on any machine. Pipelines are spread over team
+directories and include a chain of templates nesting depth levels deep.
+Every file uses a mix of $(Name) references, some of them documented as
+coming from a variable group with '## - ' lines, and is padded with script
+steps to the requested size.
+"""
+
+import os
+import random
+import shutil
+
+# Pipelines per team directory
+FILES_PER_DIRECTORY = 50
+
+# Distinct templates at each nesting level
+TEMPLATES_PER_LEVEL = 8
+
+# Share of the referenced variables documented as coming from a variable group
+GROUP_SHARE = 0.3
+
+def variable_pool(size):
+    """Return size distinct variable names, in a fixed order."""
+    prefixes = ('Build', 'Deploy', 'Azure', 'App', 'Test', 'Release', 'Docker', 'Node')
+    return [f"{prefixes[i % len(prefixes)]}.Setting{i}" for i in range(size)]
+
+def render(rng, names, variables, file_bytes, templates=()):
+    """Return the text of one pipeline or template file."""
+    used = rng.sample(names, min(variables, len(names)))
+    grouped = used[:int(len(used) * GROUP_SHARE)]
+    lines = ['# Variables supplied by the shared variable group', '## The following variables are used:']
+    lines += [f"## - {name}" for name in grouped]
+    lines += ['', 'variables:', '- group: shared', '- name: Configuration', '  value: Release', '', 'steps:']
+    for template in templates:
+        lines.append(f"- template: {template}")
+    for i, name in enumerate(used):
+        lines += [f"- script: echo $({name})", f"  displayName: Step {i}"]
+
+    text = '\n'.join(lines) + '\n'
+    step = 0
+    padding = []
+    size = len(text)
+    while size < file_bytes:
+        line = f"- script: ./build.sh --target step{step} --configuration $(Configuration)\n"
+        padding.append(line)
+        size += len(line)
+        step += 1
+    return text + ''.join(padding)
+
+def corpus_name(files, file_bytes=2048, variables=20, depth=0, seed=0):
+    """Return a directory name that identifies a corpus by its parameters."""
+    return f"pipelines-n{files}-b{file_bytes}-v{variables}-t{depth}-s{seed}"
+
+def write_corpus(path, files, file_bytes=2048, variables=20, depth=0, seed=0):
+    """Write a pipeline tree to path, replacing it atomically.
+
+    files pipelines of about file_bytes bytes each reference variables
+    variables. With depth above zero, every pipeline includes a template of
+    the first level, and each template includes one of the next level.
+    """
+    rng = random.Random(seed)
+    names = variable_pool(max(variables * 10, 100))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    for level in range(depth):
+        directory = os.path.join(tmp_path, 'templates', f"level{level}")
+        os.makedirs(directory)
+        for i in range(TEMPLATES_PER_LEVEL):
+            includes = [f"../level{level + 1}/steps{rng.randrange(TEMPLATES_PER_LEVEL)}.yml"] \
+                if level + 1 < depth else []
+            with open(os.path.join(directory, f"steps{i}.yml"), 'w', encoding='utf-8') as f:
+                f.write(render(rng, names, variables, file_bytes, includes))
+
+    for i in range(files):
+        directory = os.path.join(tmp_path, f"team{i // FILES_PER_DIRECTORY}")
+        os.makedirs(directory, exist_ok=True)
+        includes = [f"../templates/level0/steps{rng.randrange(TEMPLATES_PER_LEVEL)}.yml"] if depth else []
+        with open(os.path.join(directory, f"pipeline{i}.yml"), 'w', encoding='utf-8') as f:
+            f.write(render(rng, names, variables, file_bytes, includes))
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def ensure_corpus(directory, files, file_bytes=2048, variables=20, depth=0, seed=0):
+    """Return the path of a corpus in directory, generating it if it does not exist yet."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, corpus_name(files, file_bytes, variables, depth, seed))
+    if not os.path.exists(path):
+        write_corpus(path, files, file_bytes, variables, depth, seed)
+    return path
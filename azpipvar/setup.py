@@ -10,7 +10,7 @@ from src.version import __version__
 setup(
     name="azpipvar",
     version=__version__,
-    py_modules=['check_variables', 'version', 'sunsoft'],
+    py_modules=['check_variables', 'scan_cache', 'template_graph', 'tree_walk', 'reports', 'file_watch', 'git_blobs', 'variable_index', 'version', 'sunsoft'],
     package_dir={'': 'src'},
     install_requires=[
         "pyyaml>=6.0.1",
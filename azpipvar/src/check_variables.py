@@ -1,9 +1,30 @@
+import argparse
+import io
+import json
 import os
 import re
-import yaml
+import sys
+import time
+from collections import deque
+from contextlib import redirect_stdout
 from pathlib import Path
 from version import __version__
-from sunsoft import send_first_run_stats
+from sunsoft import track_first_run
+from scan_cache import DEFAULT_CACHE_DIR, BlobCache, ScanCache, blob_cache_path, cache_path, content_digest
+from reports import REPORT_FORMATS, CollectedReport, JsonLinesReport, TextReport
+from template_graph import TemplateGraph, extract_templates
+from tree_walk import IgnoreRules, ignored, walk_files
+from variable_index import VariableIndex, index_path, variable_name
+
+# yaml, concurrent.futures, git_blobs and file_watch are imported where they
+# are needed, since most runs use none of them and startup time matters in
+# pre-commit hooks
+
+# Files handed to a worker process at a time
+BATCH_SIZE = 32
+
+# Extensions of the files scanned
+YAML_SUFFIXES = ('.yml', '.yaml')
 
 def extract_variables(content):
     """Extract all variables in $(VARIABLE) format from a string.
@@ -25,66 +46,690 @@ def extract_variable_names(content):
                 variable_names.add(variable_name)
     return variable_names
 
-def process_yaml_file(file_path):
-    """Process a YAML file and extract variables."""
-    try:
-        # First read the file as text to find variables in comments or invalid YAML sections
-        with open(file_path, 'r', encoding='utf-8') as f:
-            raw_content = f.read()
-            variables = extract_variables(raw_content)
-            variables_in_group = extract_variable_names(raw_content)
+# Precompiled patterns for extract_all, for both bytes and str input
+_VARIABLE_PATTERN = r'\$\(([a-zA-Z][a-zA-Z0-9_\.]*)\)'
+# First word after '## - ', up to a comment, description or colon
+_NAME_PATTERN = r'[ \t\f\v]*([^\s#(:]+)'
+_PATTERNS = {
+    str: (re.compile(_VARIABLE_PATTERN), re.compile(_NAME_PATTERN), '## - ', '\n', '\r'),
+    bytes: (re.compile(_VARIABLE_PATTERN.encode()), re.compile(_NAME_PATTERN.encode()), b'## - ', b'\n', b'\r'),
+}
 
-        # Then parse as YAML to get the structure (optional, for future use)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            try:
-                yaml_content = yaml.safe_load(f)
-            except yaml.YAMLError:
-                print(f"Warning: Could not parse {file_path} as valid YAML")
-                yaml_content = None
+def extract_all(content):
+    """Extract both the $(VARIABLE) references and the '## - ' variable names in one scan.
+
+    content may be str, bytes or a memoryview. Returns the same pair of sets
+    as extract_variables and extract_variable_names. Variables are found with
+    a single regex pass; '## - ' markers are located with a literal search,
+    so only the lines that carry them are looked at.
+    """
+    if isinstance(content, memoryview):
+        content = content.tobytes()
+    variable_re, name_re, marker, newline, carriage_return = _PATTERNS[type(content)]
+
+    variables = set(variable_re.findall(content))
+    variable_names = set()
+    position = content.find(marker)
+    while position != -1:
+        # The marker only counts at the start of a line, after optional indentation
+        line_start = content.rfind(newline, 0, position) + 1
+        line_start = content.rfind(carriage_return, line_start, position) + 1 or line_start
+        if not content[line_start:position].strip():
+            match = name_re.match(content, position + len(marker))
+            if match:
+                variable_names.add(match.group(1))
+        position = content.find(marker, position + len(marker))
+
+    if isinstance(content, bytes):
+        variables = {variable.decode('ascii') for variable in variables}
+        variable_names = {name.decode('utf-8', 'replace') for name in variable_names}
+    return variables, variable_names
+
+def load_yaml(content):
+    """Parse YAML text into Python objects with the fastest available safe loader."""
+    import yaml
+    # Use libyaml's C loader when PyYAML was built with it
+    return yaml.load(content, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+def process_yaml_content(raw_content, file_path, validate=False):
+    """Extract variables from the raw text or bytes of a YAML file.
 
-        return variables, variables_in_group
+    The content is scanned directly, so variables in comments or invalid
+    YAML sections are found too. The YAML structure is only parsed when
+    validate is true, to warn about files that are not valid YAML.
+    """
+    variables, variables_in_group = extract_all(raw_content)
+
+    if validate:
+        import yaml
+        try:
+            load_yaml(raw_content)
+        except yaml.YAMLError:
+            print(f"Warning: Could not parse {file_path} as valid YAML")
+
+    return variables, variables_in_group
+
+def process_yaml_file(file_path, validate=False):
+    """Process a YAML file and extract variables, reading it once."""
+    try:
+        with open(file_path, 'rb') as f:
+            raw_content = f.read()
+        return process_yaml_content(raw_content, file_path, validate)
     except Exception as e:
         print(f"Error processing {file_path}: {str(e)}")
         return set(), set()
 
-def find_yaml_files(directory):
-    """Find all YAML files in the given directory and subdirectories."""
-    yaml_files = []
-    for ext in ['.yml', '.yaml']:
-        yaml_files.extend(Path(directory).rglob(f'*{ext}'))
-    return yaml_files
+def find_yaml_files(directory, excludes=(), gitignore=True):
+    """Yield the YAML files in the given directory and subdirectories as they are found.
+
+    Directories matched by excludes, gitignore-style patterns, or by the
+    .gitignore files of the tree are skipped unless gitignore is false.
+    """
+    return map(Path, walk_files(directory, YAML_SUFFIXES, excludes, gitignore))
+
+def _scan_file(file_path, validate=False):
+    """Process a YAML file, capturing the warnings it prints.
+
+    Returns (variables, variables_in_group, templates, output, signature)
+    where templates lists the file's template references and signature is
+    the (size, mtime_ns, hash) of the scanned content for the scan cache, or
+    None if the file could not be processed.
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            stat = os.stat(file_path)
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            variables, variables_in_group = process_yaml_content(data, file_path, validate)
+            templates = extract_templates(data)
+            signature = (stat.st_size, stat.st_mtime_ns, content_digest(data))
+        except Exception as e:
+            print(f"Error processing {file_path}: {str(e)}")
+            variables, variables_in_group, templates, signature = set(), set(), [], None
+    return variables, variables_in_group, templates, output.getvalue(), signature
+
+def _scan_batch(file_paths, validate=False):
+    """Scan a batch of files in a worker process."""
+    return [_scan_file(file_path, validate) for file_path in file_paths]
+
+def scan_files(yaml_files, jobs=1, validate=False, cache=None, log=None):
+    """Yield (file_path, variables, variables_in_group, templates) for each file, in input order.
+
+    yaml_files may be any iterable, such as a directory walk that is still
+    running; files are scanned as they arrive. Files unchanged since they
+    were stored in cache, a ScanCache, are not scanned again. With jobs
+    greater than 1 the remaining files are processed in batches by a pool of
+    worker processes. Results and warnings are still emitted in input order,
+    so the output matches a sequential run. Warnings are printed to log,
+    stdout by default.
+    """
+    def emit(file_path, result, scanned):
+        variables, variables_in_group, templates, output = result[:4]
+        if scanned and cache is not None and result[4] is not None:
+            cache.put(file_path, result[4], variables, variables_in_group, templates, validate, output)
+        print(output, end='', file=log)
+        return file_path, variables, variables_in_group, templates
+
+    if jobs <= 1:
+        for file_path in yaml_files:
+            hit = cache.get(file_path, validate) if cache is not None else None
+            if hit is not None:
+                yield emit(file_path, hit, False)
+            else:
+                yield emit(file_path, _scan_file(file_path, validate), True)
+        return
+
+    # Each pending entry is [file_path, cached result, future of its batch, index in the batch]
+    pending = deque()
+    batch = []
+
+    def drain(block):
+        while pending:
+            file_path, hit, future, index = pending[0]
+            if hit is None and (future is None or not (block or future.done())):
+                return
+            pending.popleft()
+            if hit is not None:
+                yield emit(file_path, hit, False)
+            else:
+                yield emit(file_path, future.result()[index], True)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Worker processes are only started once the first batch is submitted
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        def submit():
+            future = pool.submit(_scan_batch, [entry[0] for entry in batch], validate)
+            for entry in batch:
+                entry[2] = future
+            batch.clear()
+
+        for file_path in yaml_files:
+            hit = cache.get(file_path, validate) if cache is not None else None
+            entry = [file_path, hit, None, len(batch)]
+            pending.append(entry)
+            if hit is None:
+                batch.append(entry)
+                if len(batch) == BATCH_SIZE:
+                    submit()
+            yield from drain(False)
+        if batch:
+            submit()
+        yield from drain(True)
 
 def main():
-    # Send first run statistics
-    send_first_run_stats(
-        script_name='azpipvar',
-        version=__version__
+    parser = argparse.ArgumentParser(
+        description='List the variables used in Azure Pipeline YAML files under the current directory'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Process files with N worker processes; 0 uses every CPU (default: 1)'
+    )
+    parser.add_argument(
+        '--validate',
+        action='store_true',
+        help='Also parse each file as YAML and warn about files that are not valid'
+    )
+    parser.add_argument(
+        '--templates',
+        action='store_true',
+        help='Follow template: includes and report each pipeline with the variables of its templates'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        metavar='PATTERN',
+        help='Skip files and directories matching this gitignore-style pattern; may be repeated'
+    )
+    parser.add_argument(
+        '--no-gitignore',
+        action='store_true',
+        help='Also scan files and directories ignored by .gitignore'
+    )
+    parser.add_argument(
+        '--format',
+        choices=list(REPORT_FORMATS),
+        default='text',
+        help='Report format: text, jsonl (one JSON object per file as it is scanned), '
+             'json or sarif (default: text)'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        metavar='FILE',
+        help='Write the report to FILE instead of stdout'
+    )
+    parser.add_argument(
+        '--where',
+        action='append',
+        default=[],
+        metavar='VARIABLE',
+        help='List the pipelines that use VARIABLE, given as $(Name) or Name; may be repeated'
+    )
+    parser.add_argument(
+        '--undeclared',
+        action='store_true',
+        help='List the variables that no pipeline gets from a variable group'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Update the variable index from the files before answering --where or --undeclared'
+    )
+    parser.add_argument(
+        '--rev',
+        action='append',
+        default=[],
+        metavar='REVISION',
+        help='Scan the files of a git revision instead of the working tree, without checking it out; '
+             'given twice, report the variables that changed between the two revisions'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and report the files whose variables change, until interrupted'
+    )
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='With --watch, poll for changes instead of using inotify'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=1.0,
+        metavar='SECONDS',
+        help='Time between polls with --watch where inotify is not used (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Rescan every file instead of reusing results for unchanged files'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        default=DEFAULT_CACHE_DIR,
+        help='Where scan results are kept between runs (default: %(default)s)'
     )
+    parser.add_argument(
+        '--no-track-install',
+        action='store_true',
+        help='Do not send anonymous first-run statistics'
+    )
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or more")
+    if (args.where or args.undeclared) and args.format == 'sarif':
+        parser.error("--where and --undeclared support the text, jsonl and json formats")
+    if len(args.rev) > 2:
+        parser.error("--rev can be given at most twice")
+    if args.rev and (args.watch or args.where or args.undeclared):
+        parser.error("--rev cannot be combined with --watch, --where or --undeclared")
+    if len(args.rev) == 2 and args.format == 'sarif':
+        parser.error("comparing revisions supports the text, jsonl and json formats")
+    if args.watch and (args.where or args.undeclared):
+        parser.error("--watch cannot be combined with --where or --undeclared")
+    if args.watch and args.format not in ('text', 'jsonl'):
+        parser.error("--watch supports the text and jsonl formats")
+    jobs = args.jobs or os.cpu_count() or 1
+
+    # Machine-readable reports keep stdout clean; notices and warnings go to stderr
+    log = sys.stdout if args.format == 'text' else sys.stderr
+
+    # First run statistics are sent in the background while the scan runs;
+    # their notices go to stderr so they do not interleave with the report
+    tracker = track_first_run('azpipvar', __version__, out=sys.stderr)
+    try:
+        run(args, jobs, log)
+    finally:
+        if tracker is not None:
+            tracker.join()
 
+def run(args, jobs, log):
+    """Scan the current directory and report as the parsed command line asks."""
     # Use the current working directory
     pipelines_dir = os.getcwd()
 
-    # Find all YAML files
-    yaml_files = find_yaml_files(pipelines_dir)
+    if args.output:
+        try:
+            out = open(args.output, 'w', encoding='utf-8')
+        except OSError as e:
+            print(f"Error: Could not write {args.output}: {str(e)}")
+            sys.exit(1)
+    else:
+        out = sys.stdout
+
+    if args.rev:
+        from git_blobs import GitError
+        try:
+            report_revisions(pipelines_dir, args, out, log)
+        except GitError as e:
+            print(f"Error: {str(e)}", file=log)
+            sys.exit(1)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    cache_file = cache_path(args.cache_dir, pipelines_dir)
+    if args.watch:
+        watch_tree(pipelines_dir, args, cache_file, out, log)
+        if out is not sys.stdout:
+            out.close()
+        return
+
+    querying = bool(args.where or args.undeclared)
+    saved_index = index_path(cache_file, args.templates)
+    index = None
+    if querying and not (args.refresh or args.no_cache) and index_is_current(saved_index, cache_file):
+        index = VariableIndex.load(saved_index, pipelines_dir, __version__, args.templates)
+
+    if index is None:
+        index = VariableIndex(pipelines_dir, __version__, args.templates)
+        # A query only needs the index, so the report is left out
+        report = None if querying else REPORT_FORMATS[args.format](out, pipelines_dir, __version__)
+        sinks = [report] if report is not None else []
+        if querying or not args.no_cache:
+            sinks.append(index)
+        cache_written = scan_tree(pipelines_dir, args, jobs, cache_file, sinks, log)
+        if report is not None:
+            report.close()
+        # The index only changes along with the scan cache, which the other mode may have updated
+        if not args.no_cache and (cache_written or not index_is_current(saved_index, cache_file)):
+            try:
+                index.save(saved_index)
+            except OSError as e:
+                print(f"Warning: Could not save the variable index: {str(e)}", file=log)
+
+    if querying:
+        report_queries(index, args, out)
+    if out is not sys.stdout:
+        out.close()
+
+def index_is_current(saved_index, cache_file):
+    """Return whether the saved index was written after the scan cache last changed.
+
+    The scan cache is shared by both --templates modes but each mode has its
+    own index, so a run in one mode can update the cache and leave the other
+    mode's index behind.
+    """
+    try:
+        index_mtime = os.stat(saved_index).st_mtime_ns
+    except OSError:
+        return False
+    try:
+        return index_mtime > os.stat(cache_file).st_mtime_ns
+    except OSError:
+        return True
+
+def scan_tree(pipelines_dir, args, jobs, cache_file, sinks, log):
+    """Scan the YAML files under pipelines_dir and pass each file's results to every sink.
+
+    Returns whether the scan cache was written.
+    """
+    # Find all YAML files; they are scanned while the walk goes on
+    yaml_files = find_yaml_files(pipelines_dir, args.exclude, not args.no_gitignore)
+
+    cache = None
+    if not args.no_cache:
+        cache = ScanCache(cache_file, __version__)
+
+    # Process each file; without --templates each one is reported as soon as it is scanned
+    scanned = scan_files(yaml_files, jobs, args.validate, cache, log)
+    graph = report_results(scanned, pipelines_dir, args.templates, sinks)
+
+    cache_written = False
+    if cache is not None:
+        try:
+            cache_written = cache.save()
+        except OSError as e:
+            print(f"Warning: Could not save the scan cache: {str(e)}", file=log)
+
+    if graph is not None:
+        report_pipelines(graph, sinks)
+    return cache_written
+
+def report_results(results, pipelines_dir, templates, sinks):
+    """Pass each (file_path, variables, variables_in_group, templates) result with variables to every sink.
+
+    With templates the results are collected instead, and the TemplateGraph
+    holding them is returned for report_pipelines once all are in.
+    """
+    graph = TemplateGraph(pipelines_dir) if templates else None
+    for file_path, variables, variables_in_group, file_templates in results:
+        if graph is not None:
+            graph.add(file_path, variables, variables_in_group, file_templates)
+        elif variables:
+            for sink in sinks:
+                sink.add(str(file_path), dict.fromkeys(variables), variables_in_group)
+    return graph
+
+def report_pipelines(graph, sinks):
+    """Pass each pipeline of a TemplateGraph, with its templates' variables, to every sink."""
+    # Templates are reported through the pipelines that include them
+    for file_path, (origins, variables_in_group) in graph.resolve().items():
+        if origins:
+            for sink in sinks:
+                sink.add(file_path, origins, variables_in_group)
+
+def scan_revisions(pipelines_dir, revisions, args, log):
+    """Return, for each git revision, the (file_path, variables, variables_in_group, templates) of its files.
+
+    The files below pipelines_dir are read from git objects, so nothing is
+    checked out. Each distinct blob is scanned once, however many revisions
+    and paths it appears at, and unless args.no_cache is set its results
+    are kept by blob id for later runs. When two revisions are compared
+    without args.templates, files with the same blob in both are left out,
+    so only the files that changed between them are read.
+    """
+    from git_blobs import git, list_blobs, read_blobs, repository_root, resolve_revision
+
+    top = repository_root(pipelines_dir)
+    prefix = git(pipelines_dir, 'rev-parse', '--show-prefix').decode('utf-8').strip()
+    excludes = IgnoreRules(args.exclude, pipelines_dir) if args.exclude else None
+    cache = None if args.no_cache else BlobCache(blob_cache_path(args.cache_dir, top), __version__)
+
+    trees = []
+    labels = {}
+    for revision in revisions:
+        tree = []
+        for path, blob in list_blobs(top, resolve_revision(top, revision), prefix, YAML_SUFFIXES):
+            file_path = os.path.join(pipelines_dir, *path[len(prefix):].split('/'))
+            if excludes is None or not excludes.covers(file_path):
+                tree.append((file_path, blob))
+                labels.setdefault(blob, f"{revision}:{path}")
+        trees.append(tree)
+
+    if len(trees) == 2 and not args.templates:
+        # A file whose blob is the same in both revisions cannot differ
+        unchanged = set(trees[0]) & set(trees[1])
+        trees = [[entry for entry in tree if entry not in unchanged] for tree in trees]
+        labels = {blob: labels[blob] for tree in trees for _, blob in tree}
+
+    results = {}
+    for blob in labels:
+        hit = cache.get(blob, args.validate) if cache is not None else None
+        if hit is not None:
+            results[blob] = hit[:3]
+            print(hit[3], end='', file=log)
+    misses = [blob for blob in labels if blob not in results]
+    for blob, data in read_blobs(top, misses):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            variables, variables_in_group = process_yaml_content(data, labels[blob], args.validate)
+        templates = extract_templates(data)
+        print(output.getvalue(), end='', file=log)
+        results[blob] = (variables, variables_in_group, templates)
+        if cache is not None:
+            cache.put(blob, variables, variables_in_group, templates, args.validate, output.getvalue())
+
+    if cache is not None:
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Warning: Could not save the blob cache: {str(e)}", file=log)
+    return [[(file_path, *results[blob]) for file_path, blob in tree] for tree in trees]
+
+def report_revisions(pipelines_dir, args, out, log):
+    """Report the variables of one git revision, or the changes between two."""
+    trees = scan_revisions(pipelines_dir, args.rev, args, log)
+    if len(trees) == 1:
+        reports = [REPORT_FORMATS[args.format](out, pipelines_dir, __version__)]
+    else:
+        reports = [CollectedReport(), CollectedReport()]
+    for tree, report in zip(trees, reports):
+        graph = report_results(tree, pipelines_dir, args.templates, [report])
+        if graph is not None:
+            report_pipelines(graph, [report])
+        report.close()
+    if len(trees) == 2:
+        report_changes(*args.rev, *reports, pipelines_dir, args.format, out)
+
+def report_changes(base, head, old, new, pipelines_dir, output_format, out):
+    """Report the variables added, removed or moved in or out of a variable group per file."""
+    records = []
+    for file_path in sorted(old.keys() | new.keys()):
+        old_variables, old_groups = old.get(file_path, ({}, set()))
+        new_variables, new_groups = new.get(file_path, ({}, set()))
+        added = sorted(new_variables.keys() - old_variables.keys())
+        removed = sorted(old_variables.keys() - new_variables.keys())
+        regrouped = sorted(var for var in new_variables.keys() & old_variables.keys()
+                           if (var in new_groups) != (var in old_groups))
+        if not (added or removed or regrouped):
+            continue
+        status = 'added' if file_path not in old else 'removed' if file_path not in new else 'modified'
+        records.append((file_path, status, [(var, var in new_groups) for var in added],
+                        [(var, var in old_groups) for var in removed], [(var, var in new_groups) for var in regrouped]))
+
+    if output_format != 'text':
+        def entries(pairs):
+            return [{'name': var, 'group': group} for var, group in pairs]
+        documents = [{
+            'file': Path(os.path.relpath(file_path, pipelines_dir)).as_posix(),
+            'status': status,
+            'added': entries(added),
+            'removed': entries(removed),
+            'regrouped': entries(regrouped),
+        } for file_path, status, added, removed, regrouped in records]
+        if output_format == 'json':
+            document = {'tool': 'azpipvar', 'version': __version__, 'base': base, 'head': head, 'files': documents}
+            out.write(json.dumps(document, separators=(',', ':')) + '\n')
+        else:
+            out.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in documents))
+        return
+
+    title = f"Variable changes from {base} to {head}:"
+    print(f"\n{title}", file=out)
+    print("=" * len(title), file=out)
+    if not records:
+        print("\nNo changes", file=out)
+    group_marker = "\033[92m (by variable group)\033[0m"
+    for file_path, status, added, removed, regrouped in records:
+        lines = [f"\n{os.path.relpath(file_path, pipelines_dir)}:" + (f" ({status})" if status != 'modified' else "")]
+        lines += [f"  + {var}" + (group_marker if group else "") for var, group in added]
+        lines += [f"  - {var}" + (group_marker if group else "") for var, group in removed]
+        lines += [f"  ~ {var}" + (" (now by variable group)" if group else " (no longer by variable group)")
+                  for var, group in regrouped]
+        print('\n'.join(lines), file=out)
+
+def watch_tree(pipelines_dir, args, cache_file, out, log):
+    """Report every file, then report again each file whose results change, until interrupted.
+
+    The results of every file are kept in memory. Only the files the
+    watcher names are scanned again, and only those whose variables, group
+    declarations or templates changed are reported. With --templates the
+    graph is resolved again after each change, and the pipelines whose
+    resolved variables changed are reported.
+    """
+    from file_watch import open_watcher
+
+    gitignore = not args.no_gitignore
+    watcher = open_watcher(lambda: walk_files(pipelines_dir, YAML_SUFFIXES, args.exclude, gitignore),
+                           args.poll_interval, args.poll)
+    cache = None if args.no_cache else ScanCache(cache_file, __version__)
+    results = {}
+    reported = {}
+
+    def walk():
+        return walk_files(pipelines_dir, YAML_SUFFIXES, args.exclude, gitignore, watcher.add)
+
+    def scan(paths):
+        """Scan paths and return those whose results changed."""
+        changed = []
+        for file_path, variables, variables_in_group, templates in scan_files(paths, 1, args.validate, cache, log):
+            if results.get(file_path) != (variables, variables_in_group, templates):
+                results[file_path] = (variables, variables_in_group, templates)
+                changed.append(file_path)
+        return changed
+
+    def emit(changed, title=None):
+        """Report the sections that differ from what was reported last; title None marks the first report."""
+        if args.templates:
+            graph = TemplateGraph(pipelines_dir)
+            for file_path, (variables, variables_in_group, templates) in results.items():
+                graph.add(file_path, variables, variables_in_group, templates)
+            current = graph.resolve()
+        else:
+            current = dict(reported)
+            for file_path in changed:
+                if file_path in results:
+                    current[file_path] = (dict.fromkeys(results[file_path][0]), results[file_path][1])
+                else:
+                    current.pop(file_path, None)
+
+        if args.format == 'jsonl':
+            report = JsonLinesReport(out, pipelines_dir, __version__)
+        else:
+            report = TextReport(out, pipelines_dir, __version__, title or "Variables found in pipeline files:")
+        sections = 0
+        for file_path in sorted(current.keys() | reported.keys()):
+            section = current.get(file_path)
+            if section is None:
+                if reported[file_path][0]:
+                    report.remove(file_path)
+                    sections += 1
+            elif section != reported.get(file_path) and (section[0] or file_path in reported):
+                report.add(file_path, *section)
+                sections += 1
+        reported.clear()
+        reported.update(current)
+        if sections or title is None:
+            report.close()
+            out.flush()
+
+    emit(scan(walk()))
+    try:
+        while True:
+            paths, rescan = watcher.read()
+            if rescan or any(os.path.basename(path) == '.gitignore' for path in paths):
+                # The set of watched files may have changed; walk the tree again
+                current = list(walk())
+                removed = results.keys() - set(current)
+                paths = current
+            else:
+                paths = sorted(path for path in paths if path.endswith(YAML_SUFFIXES))
+                removed = {path for path in paths
+                           if not os.path.isfile(path) or ignored(path, pipelines_dir, args.exclude, gitignore)}
+                paths = [path for path in paths if path not in removed]
+                removed &= results.keys()
+            for path in removed:
+                del results[path]
+            changed = scan(paths) + sorted(removed)
+            if changed:
+                emit(changed, f"Changes at {time.strftime('%H:%M:%S')}:")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if cache is not None:
+            try:
+                cache.save()
+            except OSError as e:
+                print(f"Warning: Could not save the scan cache: {str(e)}", file=log)
 
-    # Process each file
-    all_variables = {}
-    all_variables_in_group = {}
+def report_queries(index, args, out):
+    """Print the answers to --where and --undeclared from the variable index."""
+    answers = [(variable_name(reference), 'where') for reference in args.where]
+    if args.undeclared:
+        answers += [(var, 'undeclared') for var in index.undeclared()]
 
-    for file_path in yaml_files:
-        variables, variables_in_group = process_yaml_file(file_path)
-        if variables:
-            all_variables[str(file_path)] = variables
-            all_variables_in_group[str(file_path)] = variables_in_group
+    if args.format != 'text':
+        records = []
+        for var, _ in answers:
+            uses = [dict({'file': pipeline, 'group': group}, **({'template': template} if template else {}))
+                    for pipeline, group, template in index.where(var)]
+            records.append({'name': var, 'pipelines': uses})
+        if args.format == 'json':
+            out.write(json.dumps(records, separators=(',', ':')) + '\n')
+        else:
+            out.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+        return
 
-    # Print results
-    print("\nVariables found in pipeline files:")
-    print("==================================")
+    for var in [var for var, query in answers if query == 'where']:
+        uses = index.where(var)
+        if not uses:
+            print(f"\n$({var}) is not used in any pipeline", file=out)
+            continue
+        lines = [f"\n$({var}) is used in {len(uses)} pipeline{'s' if len(uses) != 1 else ''}:"]
+        for pipeline, group, template in uses:
+            lines.append(f"  - {pipeline}"
+                         + ("\033[92m (by variable group)\033[0m" if group else "")
+                         + (f" (from {template})" if template else ""))
+        print('\n'.join(lines), file=out)
 
-    for file_path, variables in all_variables.items():
-        print(f"\n{os.path.relpath(file_path, pipelines_dir)}:")
-        for var in sorted(variables):
-            print(f"  - {var}" + ("\033[92m (by variable group)\033[0m" if var in all_variables_in_group[file_path] else ""))
+    # The undeclared variables follow every --where answer, under their own heading
+    if args.undeclared:
+        undeclared = [var for var, query in answers if query == 'undeclared']
+        lines = [f"\nVariables not declared in any variable group ({len(undeclared)}):"]
+        for var in undeclared:
+            count = len(index.where(var))
+            lines.append(f"  - {var} ({count} pipeline{'s' if count != 1 else ''})")
+        print('\n'.join(lines), file=out)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""Change notification for --watch.
+
+On Linux the kernel's inotify interface is used through ctypes, with one
+watch per walked directory, so an edit is noticed as soon as the file is
+closed. Elsewhere, or when inotify is unavailable, the tree is polled: each
+pass compares the size and modification time of every file with the
+previous pass. Both watchers batch the changes that arrive close together,
+since editors often write a file in several steps.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# Quiet period that ends a batch of changes, in seconds
+DEBOUNCE = 0.02
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+_EVENT = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Changes under the watched directories, reported by the kernel.
+
+    Directories created or moved in while watching are not watched yet;
+    read() asks for a rescan, which walks the tree and calls add() for every
+    directory again.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.directories = {}
+
+    def add(self, directory):
+        """Watch a directory, not including its subdirectories."""
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            # Directories that vanished or cannot be read are left out
+            return
+        self.directories[wd] = directory
+
+    def read(self, timeout=None):
+        """Wait for changes and return (paths, rescan).
+
+        paths holds the files that were written, created, moved or deleted;
+        rescan is true when the tree has to be walked again, after
+        directories were added or removed or the event queue overflowed.
+        """
+        paths = set()
+        rescan = False
+        wait = timeout
+        while select.select([self.fd], [], [], wait)[0]:
+            data = os.read(self.fd, 1 << 16)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    rescan = True
+                elif mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                elif mask & (IN_ISDIR | IN_DELETE_SELF | IN_MOVE_SELF):
+                    rescan = True
+                elif wd in self.directories and name:
+                    paths.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+            # Keep collecting until the writes settle
+            wait = DEBOUNCE
+        return paths, rescan
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Changes found by walking the tree every interval seconds.
+
+    list_files is called on every pass and returns the paths to watch.
+    """
+
+    def __init__(self, list_files, interval=1.0):
+        self.list_files = list_files
+        self.interval = interval
+        self.signatures = self._snapshot()
+
+    def _snapshot(self):
+        signatures = {}
+        for path in self.list_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signatures[path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def add(self, directory):
+        """Every pass walks the whole tree, so there is nothing to register."""
+
+    def read(self, timeout=None):
+        """Wait for changes and return (paths, rescan); rescan is always false."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+            signatures = self._snapshot()
+            changed = {path for path in signatures.keys() | self.signatures.keys()
+                       if signatures.get(path) != self.signatures.get(path)}
+            self.signatures = signatures
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed, False
+
+    def close(self):
+        pass
+
+def open_watcher(list_files, interval=1.0, polling=False):
+    """Return an inotify watcher on Linux, or a polling watcher otherwise or when polling is set."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(list_files, interval)
@@ -0,0 +1,87 @@
+"""Reading pipeline files straight from git objects.
+
+A revision's files are listed with `git ls-tree` and their contents are read
+through a single `git cat-file --batch` process, so no checkout is needed.
+Blob ids identify content, so a file that is the same in two revisions is
+read and scanned once, and results can be cached by blob id.
+"""
+
+import subprocess
+import threading
+
+class GitError(Exception):
+    """A git command failed."""
+
+def git(repository, *args):
+    """Run a git command in repository and return its standard output as bytes."""
+    try:
+        result = subprocess.run(['git', '-C', repository, *args], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=False)
+    except OSError as e:
+        raise GitError(f"Could not run git: {str(e)}")
+    if result.returncode:
+        message = result.stderr.decode('utf-8', 'replace').strip() or f"git {args[0]} failed"
+        raise GitError(message)
+    return result.stdout
+
+def repository_root(directory):
+    """Return the top-level directory of the work tree directory is in."""
+    return git(directory, 'rev-parse', '--show-toplevel').decode('utf-8').strip()
+
+def resolve_revision(repository, revision):
+    """Return the commit id a revision name points at."""
+    return git(repository, 'rev-parse', '--verify', '--end-of-options', f"{revision}^{{commit}}").decode().strip()
+
+def list_blobs(repository, revision, prefix='', suffixes=('.yml', '.yaml')):
+    """Return [(path, blob_id)] for the files of a revision below prefix whose names end with suffixes.
+
+    Paths are relative to the top of the repository and use '/' separators.
+    Submodules and symbolic links are left out.
+    """
+    args = ['ls-tree', '-r', '-z', '--full-tree', revision]
+    if prefix:
+        args += ['--', prefix]
+    blobs = []
+    for record in git(repository, *args).split(b'\0'):
+        if not record:
+            continue
+        info, _, path = record.partition(b'\t')
+        mode, kind, blob_id = info.split(b' ')
+        if kind != b'blob' or mode == b'120000':
+            continue
+        path = path.decode('utf-8', 'surrogateescape')
+        if path.endswith(suffixes):
+            blobs.append((path, blob_id.decode('ascii')))
+    return blobs
+
+def read_blobs(repository, blob_ids):
+    """Yield (blob_id, content) for each blob id, in order, from one git cat-file process."""
+    blob_ids = list(blob_ids)
+    if not blob_ids:
+        return
+    process = subprocess.Popen(['git', '-C', repository, 'cat-file', '--batch'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    # Requests are written from a thread so that neither pipe fills up while
+    # the other is waited on
+    def request():
+        try:
+            process.stdin.write(''.join(f"{blob_id}\n" for blob_id in blob_ids).encode('ascii'))
+            process.stdin.close()
+        except OSError:
+            pass
+    writer = threading.Thread(target=request, daemon=True)
+    writer.start()
+
+    try:
+        for blob_id in blob_ids:
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                raise GitError(f"Could not read blob {blob_id}")
+            content = process.stdout.read(int(header[2]))
+            process.stdout.read(1)
+            yield blob_id, content
+    finally:
+        process.stdout.close()
+        writer.join()
+        process.wait()
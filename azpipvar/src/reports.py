@@ -0,0 +1,183 @@
+"""Report writers for the scan results.
+
+Every writer receives the results one file at a time through add() and
+finishes with close(). The text report keeps the results for its summary,
+while the machine-readable writers emit each file as soon as it is added.
+Their memory use therefore does not grow with the size of the repository.
+"""
+
+import json
+import os
+from pathlib import Path
+
+INFORMATION_URI = "https://github.com/greatbody/azure-pipeline-variable-list"
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+# SARIF rule for each kind of variable
+PIPELINE_VARIABLE = 'pipeline-variable'
+GROUP_VARIABLE = 'group-variable'
+SARIF_RULES = [
+    {
+        'id': PIPELINE_VARIABLE,
+        'name': 'PipelineVariable',
+        'shortDescription': {'text': 'Variable used by a pipeline'},
+    },
+    {
+        'id': GROUP_VARIABLE,
+        'name': 'GroupVariable',
+        'shortDescription': {'text': 'Variable used by a pipeline and supplied by a variable group'},
+    },
+]
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+class TextReport:
+    """The human-readable report, printed once the scan is complete."""
+
+    def __init__(self, out, root, version='', title="Variables found in pipeline files:"):
+        self.out = out
+        self.root = root
+        self.title = title
+        self.files = []
+
+    def add(self, file_path, variables, variables_in_group):
+        """Record the variables of one file.
+
+        variables maps each variable to the template it comes from, or to
+        None for the file's own variables.
+        """
+        self.files.append((file_path, variables, variables_in_group))
+
+    def remove(self, file_path):
+        """Record that a file reported earlier is gone, in watch mode."""
+        self.files.append((file_path, None, None))
+
+    def close(self):
+        print(f"\n{self.title}", file=self.out)
+        print("=" * len(self.title), file=self.out)
+
+        for file_path, variables, variables_in_group in self.files:
+            lines = [f"\n{os.path.relpath(file_path, self.root)}:"]
+            if not variables:
+                lines.append("  (removed)" if variables is None else "  (no variables)")
+            for var in sorted(variables or ()):
+                origin = variables[var]
+                lines.append(f"  - {var}"
+                             + ("\033[92m (by variable group)\033[0m" if var in variables_in_group else "")
+                             + (f" (from {os.path.relpath(origin, self.root)})" if origin else ""))
+            # One write per file rather than per variable
+            print('\n'.join(lines), file=self.out)
+
+class JsonLinesReport:
+    """One JSON object per file, written and flushed as soon as the file is added.
+
+    Each line looks like {"file": "ci/build.yml", "variables": [{"name": "X",
+    "group": false, "template": "templates/steps.yml"}]}, with paths relative
+    to the scanned directory. "template" is only present for variables that
+    come from an included template.
+    """
+
+    def __init__(self, out, root, version=''):
+        self.out = out
+        self.root = root
+
+    def relative(self, path):
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def record(self, file_path, variables, variables_in_group):
+        """Return the JSON-serialisable description of one file."""
+        entries = []
+        for var in sorted(variables):
+            entry = {'name': var, 'group': var in variables_in_group}
+            if variables[var]:
+                entry['template'] = self.relative(variables[var])
+            entries.append(entry)
+        return {'file': self.relative(file_path), 'variables': entries}
+
+    def add(self, file_path, variables, variables_in_group):
+        self.out.write(_dumps(self.record(file_path, variables, variables_in_group)) + '\n')
+        self.out.flush()
+
+    def remove(self, file_path):
+        self.out.write(_dumps({'file': self.relative(file_path), 'removed': True}) + '\n')
+        self.out.flush()
+
+    def close(self):
+        pass
+
+class JsonReport(JsonLinesReport):
+    """A single JSON document holding every file, written out as files are added."""
+
+    def __init__(self, out, root, version=''):
+        super().__init__(out, root, version)
+        self.count = 0
+        out.write(f'{{"tool":"azpipvar","version":{_dumps(version)},"root":{_dumps(root)},"files":[')
+
+    def add(self, file_path, variables, variables_in_group):
+        separator = ',' if self.count else ''
+        self.out.write(separator + _dumps(self.record(file_path, variables, variables_in_group)))
+        self.count += 1
+
+    def close(self):
+        self.out.write(']}\n')
+
+class SarifReport(JsonLinesReport):
+    """A SARIF 2.1.0 log with one result per variable use, for code-scanning upload."""
+
+    def __init__(self, out, root, version=''):
+        super().__init__(out, root, version)
+        self.count = 0
+        run = {
+            'tool': {'driver': {
+                'name': 'azpipvar',
+                'version': version,
+                'informationUri': INFORMATION_URI,
+                'rules': SARIF_RULES,
+            }},
+            'originalUriBaseIds': {'SRCROOT': {'uri': Path(root).as_uri().rstrip('/') + '/'}},
+        }
+        # The results array is streamed, so the run is written without its closing brace
+        out.write(f'{{"$schema":"{SARIF_SCHEMA}","version":"2.1.0","runs":[{_dumps(run)[:-1]},"results":[')
+
+    def add(self, file_path, variables, variables_in_group):
+        from urllib.parse import quote
+        uri = quote(self.relative(file_path))
+        results = []
+        for var in sorted(variables):
+            group = var in variables_in_group
+            message = f"$({var}) is used" + (" and supplied by a variable group" if group else "")
+            result = {
+                'ruleId': GROUP_VARIABLE if group else PIPELINE_VARIABLE,
+                'ruleIndex': 1 if group else 0,
+                'level': 'note',
+                'message': {'text': message},
+                'locations': [{'physicalLocation': {'artifactLocation': {'uri': uri, 'uriBaseId': 'SRCROOT'}}}],
+                'properties': {'variable': var},
+            }
+            if variables[var]:
+                result['properties']['template'] = self.relative(variables[var])
+            results.append(_dumps(result))
+        if results:
+            self.out.write((',' if self.count else '') + ','.join(results))
+            self.count += len(results)
+
+    def close(self):
+        self.out.write(']}]}\n')
+
+class CollectedReport(dict):
+    """Sections kept in memory by file, as (variables, variables_in_group), for comparing scans."""
+
+    def add(self, file_path, variables, variables_in_group):
+        self[file_path] = (variables, variables_in_group)
+
+    def close(self):
+        pass
+
+REPORT_FORMATS = {
+    'text': TextReport,
+    'jsonl': JsonLinesReport,
+    'json': JsonReport,
+    'sarif': SarifReport,
+}
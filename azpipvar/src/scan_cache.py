@@ -0,0 +1,178 @@
+"""Persistent per-file cache of scan results.
+
+Each scanned directory gets a small JSON file under the cache directory that
+maps every YAML file to its size, modification time, content hash and the
+variables found in it. A file whose size and mtime are unchanged is not read
+again; one that was only touched is read and hashed but not re-scanned.
+"""
+
+import hashlib
+import json
+import os
+
+# Default location of the cache files
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'azpipvar'
+)
+
+# Bumped whenever the entry layout changes
+CACHE_FORMAT = 2
+
+def content_digest(data):
+    """Return the hash of a file's raw bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def cache_path(directory, root):
+    """Return the cache file used for scans of root."""
+    name = hashlib.blake2b(os.path.realpath(root).encode('utf-8'), digest_size=8).hexdigest()
+    return os.path.join(directory, f"{name}.json")
+
+class ScanCache:
+    """Scan results of one directory, keyed by file path.
+
+    Entries are only kept for files looked up or stored since the cache was
+    loaded, so files that disappear from the tree drop out on the next save.
+    """
+
+    def __init__(self, path, version=''):
+        self.path = path
+        self.version = version
+        self._old = {}
+        self.entries = {}
+        self._changed = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == CACHE_FORMAT and data.get('version') == version:
+                self._old = data.get('files', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get(self, file_path, validate=False):
+        """Return the cached (variables, variables_in_group, templates, output) for an unchanged file, or None.
+
+        output holds the warnings printed when the file was validated; it is
+        empty unless validate is true. An entry scanned without validation
+        does not answer a validating lookup.
+        """
+        key = str(file_path)
+        entry = self.entries.get(key) or self._old.get(key)
+        if entry is None or (validate and not entry['validated']):
+            return None
+        try:
+            stat = os.stat(file_path)
+            if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime']):
+                if stat.st_size != entry['size']:
+                    return None
+                # Touched but possibly unchanged; compare the content
+                with open(file_path, 'rb') as f:
+                    if content_digest(f.read()) != entry['hash']:
+                        return None
+                entry = dict(entry, mtime=stat.st_mtime_ns)
+                self._changed = True
+        except OSError:
+            return None
+
+        self.entries[key] = entry
+        output = entry['output'] if validate else ''
+        return set(entry['variables']), set(entry['variables_in_group']), entry['templates'], output
+
+    def put(self, file_path, signature, variables, variables_in_group, templates=(), validated=False, output=''):
+        """Store the results of scanning a file.
+
+        signature is the (size, mtime_ns, hash) of the content that was scanned.
+        """
+        size, mtime, digest = signature
+        self._changed = True
+        self.entries[str(file_path)] = {
+            'size': size,
+            'mtime': mtime,
+            'hash': digest,
+            'variables': sorted(variables),
+            'variables_in_group': sorted(variables_in_group),
+            'templates': list(templates),
+            'validated': validated,
+            'output': output if validated else '',
+        }
+
+    def save(self):
+        """Write the entries used in this run to the cache file, replacing it atomically.
+
+        Nothing is written when every entry was reused unchanged. Returns
+        whether the file was written.
+        """
+        if not self._changed and self.entries.keys() == self._old.keys():
+            return False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {'format': CACHE_FORMAT, 'version': self.version, 'files': self.entries}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # dumps uses the C encoder; dump would encode piece by piece in Python
+            f.write(json.dumps(data, separators=(',', ':')))
+        os.replace(tmp_path, self.path)
+        return True
+
+# Blob entries kept between runs, beyond those used in the current one
+MAX_BLOB_ENTRIES = 200000
+
+def blob_cache_path(directory, repository):
+    """Return the blob cache file used for a git repository."""
+    return os.path.splitext(cache_path(directory, repository))[0] + '.blobs.json'
+
+class BlobCache:
+    """Scan results of git blobs, keyed by object id.
+
+    A blob's content is fixed by its id, so entries are never stale and are
+    shared by every revision and path the blob appears at. Entries from
+    earlier runs are kept, up to MAX_BLOB_ENTRIES, so switching between
+    branches does not rescan what was already seen.
+    """
+
+    def __init__(self, path, version=''):
+        self.path = path
+        self.version = version
+        self.entries = {}
+        self._changed = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == CACHE_FORMAT and data.get('version') == version:
+                self.entries = data.get('blobs', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get(self, blob, validate=False):
+        """Return the cached (variables, variables_in_group, templates, output) for a blob, or None."""
+        entry = self.entries.get(blob)
+        if entry is None or (validate and not entry['validated']):
+            return None
+        output = entry['output'] if validate else ''
+        return set(entry['variables']), set(entry['variables_in_group']), entry['templates'], output
+
+    def put(self, blob, variables, variables_in_group, templates=(), validated=False, output=''):
+        """Store the results of scanning a blob."""
+        self._changed = True
+        # Newest entries go last, so the oldest are dropped first
+        self.entries.pop(blob, None)
+        self.entries[blob] = {
+            'variables': sorted(variables),
+            'variables_in_group': sorted(variables_in_group),
+            'templates': list(templates),
+            'validated': validated,
+            'output': output if validated else '',
+        }
+
+    def save(self):
+        """Write the entries to the cache file if any were added, replacing it atomically."""
+        if not self._changed:
+            return False
+        entries = self.entries
+        if len(entries) > MAX_BLOB_ENTRIES:
+            entries = dict(list(entries.items())[-MAX_BLOB_ENTRIES:])
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {'format': CACHE_FORMAT, 'version': self.version, 'blobs': entries}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, separators=(',', ':')))
+        os.replace(tmp_path, self.path)
+        return True
@@ -2,13 +2,20 @@
 import os
 import json
 import sys
-from datetime import datetime
-from termcolor import colored
+import threading
+
+# termcolor and datetime are only imported once statistics are actually
+# handled, which is on a script's first run
 
 # Centralized tracking configuration
 TRACKING_BASE_URL = "https://package-download-logger.sunruicode.workers.dev/pip"
 STATS_FILE = os.path.expanduser("~/.sunsoft.json")
 
+def colored(text, color):
+    """Return text in a terminal colour."""
+    from termcolor import colored
+    return colored(text, color)
+
 def load_stats():
     """Load stats from the stats file."""
     stats = {}
@@ -20,49 +27,52 @@ def load_stats():
             stats = {}
     return stats
 
-def save_stats(stats):
+def save_stats(stats, out=None):
     """Save stats to the stats file."""
     try:
         with open(STATS_FILE, 'w') as f:
             json.dump(stats, f, indent=2)
     except Exception as e:
-        print(colored("Note: Could not save installation statistics. This does not affect functionality.", "yellow"))
+        print(colored("Note: Could not save installation statistics. This does not affect functionality.", "yellow"), file=out)
 
-def register_script(script_name, version):
+def register_script(script_name, version, out=None):
     """Register a new script in the stats file."""
+    from datetime import datetime
     stats = load_stats()
 
     if script_name not in stats:
-        print(colored(f"Notice: First time seeing script '{script_name}'", "blue"))
+        print(colored(f"Notice: First time seeing script '{script_name}'", "blue"), file=out)
         stats[script_name] = {
             'first_run_complete': False,
             'version': version,
             'registration_date': datetime.now().isoformat()
         }
-        save_stats(stats)
+        save_stats(stats, out)
     return stats[script_name]
 
-def send_first_run_stats(script_name, version):
+def send_first_run_stats(script_name, version, out=None):
     """Send anonymous statistics on first run of a script.
 
     Args:
         script_name (str): Name of the script being tracked
         version (str): Version of the script
+        out: Stream for notices, stdout by default
     """
+    from datetime import datetime
     # First ensure script is registered
-    script_stats = register_script(script_name, version)
+    script_stats = register_script(script_name, version, out)
 
     if not script_stats.get('first_run_complete'):
         if not "--no-track-install" in sys.argv:
             try:
                 import requests
-                print(colored("Notice: Submitting anonymous installation metrics. This occurs once and collects no personal data.", "yellow"))
+                print(colored("Notice: Submitting anonymous installation metrics. This occurs once and collects no personal data.", "yellow"), file=out)
                 url = f"{TRACKING_BASE_URL}/{script_name}/{version}"
-                print(f"Sending GET request to {url}")
+                print(f"Sending GET request to {url}", file=out)
                 requests.get(url, timeout=2)
-                print(colored("✓ Thank you for helping us improve!", "green"))
+                print(colored("✓ Thank you for helping us improve!", "green"), file=out)
             except Exception as e:
-                print(colored("Note: Could not send installation count. This does not affect functionality.", "yellow"))
+                print(colored("Note: Could not send installation count. This does not affect functionality.", "yellow"), file=out)
 
         # Update script stats
         stats = load_stats()
@@ -71,6 +81,19 @@ def send_first_run_stats(script_name, version):
             'version': version,
             'first_run_date': datetime.now().isoformat()
         })
-        save_stats(stats)
+        save_stats(stats, out)
+
+    return script_stats
 
-    return script_stats
\ No newline at end of file
+def track_first_run(script_name, version, out=None):
+    """Start send_first_run_stats in a background thread and return the thread.
+
+    Returns None without starting anything once the script's first run has
+    been recorded, which only costs reading the stats file. The caller
+    should join the thread before exiting so the request can finish.
+    """
+    if load_stats().get(script_name, {}).get('first_run_complete'):
+        return None
+    tracker = threading.Thread(target=send_first_run_stats, args=(script_name, version, out), daemon=True)
+    tracker.start()
+    return tracker
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""Resolution of `template:` includes between pipeline files.
+
+Each file's `template:` references are resolved to the scanned files they
+point at, giving an include graph. Strongly connected components are found
+with an iterative Tarjan pass, so include cycles are handled and every file
+in a cycle sees the same variables. Components come out of that pass with
+the templates they include before them, so each template's transitive
+variables are computed once and shared by all of its callers. The whole
+resolution runs in time linear in the size of the graph.
+"""
+
+import os
+import re
+
+# Per input type: the key that introduces a reference, line breaks, the text
+# allowed before the key on its line and the reference itself
+_PATTERNS = {
+    str: ('template:', '\n', '\r', re.compile(r'[ \t]*(?:-[ \t]*)?'), re.compile(r'[ \t]*["\']?([^"\'\s#]+)')),
+    bytes: (b'template:', b'\n', b'\r', re.compile(rb'[ \t]*(?:-[ \t]*)?'), re.compile(rb'[ \t]*["\']?([^"\'\s#]+)')),
+}
+
+def extract_templates(content):
+    """Return the template paths referenced by `template:` keys, in order of appearance.
+
+    content may be str, bytes or a memoryview. Only keys at the start of a
+    line, optionally after a list dash, are taken.
+    """
+    if isinstance(content, memoryview):
+        content = content.tobytes()
+    marker, newline, carriage_return, prefix_re, reference_re = _PATTERNS[type(content)]
+
+    templates = []
+    position = content.find(marker)
+    while position != -1:
+        line_start = content.rfind(newline, 0, position) + 1
+        line_start = content.rfind(carriage_return, line_start, position) + 1 or line_start
+        if prefix_re.fullmatch(content, line_start, position):
+            match = reference_re.match(content, position + len(marker))
+            if match:
+                reference = match.group(1)
+                templates.append(reference.decode('utf-8', 'replace') if isinstance(reference, bytes) else reference)
+        position = content.find(marker, position + len(marker))
+    return templates
+
+def resolve_template(reference, file_path, root):
+    """Return the normalised path a template reference points at, or None.
+
+    Paths starting with '/' are relative to root, others to the referencing
+    file's directory. References into other repositories (path@alias, other
+    than @self) and ones built from template expressions cannot be resolved
+    locally.
+    """
+    reference, _, alias = reference.partition('@')
+    if alias not in ('', 'self') or '${{' in reference or '$(' in reference:
+        return None
+    if reference.startswith('/'):
+        path = os.path.join(root, reference.lstrip('/'))
+    else:
+        path = os.path.join(os.path.dirname(str(file_path)), reference)
+    return os.path.normpath(path)
+
+class TemplateGraph:
+    """Include graph of scanned pipeline files with memoised transitive results."""
+
+    def __init__(self, root):
+        self.root = root
+        self.variables = {}
+        self.variables_in_group = {}
+        self.references = {}
+
+    def add(self, file_path, variables, variables_in_group, templates):
+        """Record the scan results and template references of one file."""
+        key = os.path.normpath(str(file_path))
+        self.variables[key] = variables
+        self.variables_in_group[key] = variables_in_group
+        self.references[key] = templates
+
+    def edges(self):
+        """Return each file's included files that were scanned, without duplicates."""
+        edges = {}
+        for file_path, references in self.references.items():
+            targets = (resolve_template(reference, file_path, self.root) for reference in references)
+            edges[file_path] = list(dict.fromkeys(
+                target for target in targets if target in self.variables and target != file_path
+            ))
+        return edges
+
+    def components(self, edges):
+        """Return the strongly connected components, each after the components it includes."""
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+
+        for start in edges:
+            if start in index:
+                continue
+            # Iterative Tarjan: each frame is a node and an iterator over its edges
+            index[start] = lowlink[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            frames = [(start, iter(edges[start]))]
+            while frames:
+                node, targets = frames[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = lowlink[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        frames.append((target, iter(edges[target])))
+                        break
+                    if target in on_stack:
+                        lowlink[node] = min(lowlink[node], index[target])
+                else:
+                    frames.pop()
+                    if frames:
+                        parent = frames[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    def resolve(self):
+        """Return {pipeline: (origins, variables_in_group)} for every top-level file.
+
+        origins maps each variable a pipeline uses, directly or through its
+        templates, to the template it comes from, or None for its own
+        variables. variables_in_group holds the group declarations of the
+        pipeline and all of its templates. Top-level files are those not
+        included by any other scanned file; a cycle that nothing else
+        includes is reported through each of its members.
+        """
+        edges = self.edges()
+        components = self.components(edges)
+        component_of = {member: number for number, component in enumerate(components) for member in component}
+
+        # Transitive results per component, computed once in include order
+        origins = []
+        groups = []
+        included = set()
+        for number, component in enumerate(components):
+            component_origins = {}
+            component_groups = set()
+            for member in component:
+                for variable in self.variables[member]:
+                    component_origins.setdefault(variable, member)
+                component_groups.update(self.variables_in_group[member])
+            for member in component:
+                for target in edges[member]:
+                    target_component = component_of[target]
+                    if target_component != number:
+                        included.add(target_component)
+                        for variable, origin in origins[target_component].items():
+                            component_origins.setdefault(variable, origin)
+                        component_groups.update(groups[target_component])
+            origins.append(component_origins)
+            groups.append(component_groups)
+
+        # Pipelines are returned in the order their files were added
+        pipelines = {}
+        for member in self.variables:
+            number = component_of[member]
+            if number in included:
+                continue
+            pipeline_origins = {
+                variable: None if variable in self.variables[member] else origin
+                for variable, origin in origins[number].items()
+            }
+            pipelines[member] = (pipeline_origins, groups[number])
+        return pipelines
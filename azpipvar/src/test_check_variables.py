@@ -1,5 +1,23 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
-from check_variables import extract_variables, extract_variable_names
+from argparse import Namespace
+from contextlib import redirect_stdout
+from unittest import mock
+import check_variables
+from file_watch import InotifyWatcher, PollingWatcher
+from check_variables import report_changes, report_results, scan_revisions, extract_all, extract_variables, extract_variable_names, find_yaml_files, scan_files
+from reports import CollectedReport, JsonLinesReport, JsonReport, SarifReport, TextReport
+from scan_cache import BlobCache, ScanCache, blob_cache_path
+from version import __version__
+from template_graph import TemplateGraph, extract_templates, resolve_template
+from tree_walk import ignored, walk_files
+from variable_index import VariableIndex, variable_name
 
 class TestExtractVariables(unittest.TestCase):
     def test_basic_variables(self):
@@ -99,5 +117,597 @@ class TestExtractVariableNames(unittest.TestCase):
         expected = set()
         self.assertEqual(extract_variable_names(content), expected)
 
+class TestExtractAll(unittest.TestCase):
+    SAMPLES = [
+        """
+        variables:
+          ## - GROUP_VAR # from the infra group
+          ## - OTHER_VAR (set in the UI)
+            ## - INDENTED:
+        steps:
+        - script: echo $(GROUP_VAR) $(Build.BuildId) $(echo no) $(123no)
+        """,
+        "## - FIRST\n  not ## - INLINE\n## - $(IN_MARKER)\n##- not_valid\n## -invalid_no_space\n",
+        "## - CRLF_VAR\r\nsteps:\r\n- script: $(CRLF_REF)\r\n",
+        "## - CR_VAR\r## - SECOND_CR\r$(CR_REF)",
+        "",
+    ]
+
+    def assert_matches(self, content):
+        # A text-mode read translates newlines before the old extractors see them
+        text = content.replace('\r\n', '\n').replace('\r', '\n')
+        expected = (extract_variables(text), extract_variable_names(text))
+        self.assertEqual(extract_all(content), expected)
+        self.assertEqual(extract_all(content.encode('utf-8')), expected)
+        self.assertEqual(extract_all(memoryview(content.encode('utf-8'))), expected)
+
+    def test_matches_separate_extractors(self):
+        for content in self.SAMPLES:
+            self.assert_matches(content)
+
+    def test_marker_must_start_line(self):
+        variables, names = extract_all(b"## - A ## - B\n x ## - C\n\t## - D\n")
+        self.assertEqual(names, {'A', 'D'})
+
+    def test_variable_after_marker(self):
+        self.assertEqual(extract_all(b"## - $(VAR)\n"), ({'VAR'}, {'$'}))
+
+    def test_empty_marker_is_ignored(self):
+        self.assertEqual(extract_all(b"## -   # nothing\n## - (x)\n"), (set(), set()))
+
+class TestTemplateGraph(unittest.TestCase):
+    ROOT = os.path.join(os.sep, 'repo')
+
+    def path(self, name):
+        return os.path.join(self.ROOT, name)
+
+    def test_extract_templates(self):
+        content = b"""
+        extends:
+          template: /templates/base.yml@self
+        steps:
+        - template: 'steps/build.yml'
+        -   template: "steps/test.yml" # unit tests
+        - script: echo template: not/a/reference.yml
+        """
+        self.assertEqual(extract_templates(content),
+                         ['/templates/base.yml@self', 'steps/build.yml', 'steps/test.yml'])
+        self.assertEqual(extract_templates(content.decode()), extract_templates(content))
+
+    def test_resolve_template(self):
+        pipeline = self.path('pipelines/app.yml')
+        self.assertEqual(resolve_template('../templates/a.yml', pipeline, self.ROOT), self.path('templates/a.yml'))
+        self.assertEqual(resolve_template('/templates/a.yml@self', pipeline, self.ROOT), self.path('templates/a.yml'))
+        self.assertIsNone(resolve_template('templates/a.yml@shared', pipeline, self.ROOT))
+        self.assertIsNone(resolve_template('${{ parameters.steps }}.yml', pipeline, self.ROOT))
+
+    def test_transitive_variables_and_cycles(self):
+        graph = TemplateGraph(self.ROOT)
+        graph.add(self.path('app.yml'), {'APP'}, {'DEEP'}, ['templates/build.yml'])
+        graph.add(self.path('other.yml'), set(), set(), ['/templates/build.yml', 'missing.yml'])
+        graph.add(self.path('templates/build.yml'), {'BUILD', 'APP'}, set(), ['loop.yml'])
+        graph.add(self.path('templates/loop.yml'), {'DEEP'}, {'LOOP_GROUP'}, ['build.yml'])
+        graph.add(self.path('island/a.yml'), {'A'}, set(), ['b.yml'])
+        graph.add(self.path('island/b.yml'), {'B'}, set(), ['a.yml'])
+
+        pipelines = graph.resolve()
+        self.assertEqual(sorted(pipelines), [
+            self.path('app.yml'), self.path('island/a.yml'), self.path('island/b.yml'), self.path('other.yml'),
+        ])
+        origins, groups = pipelines[self.path('app.yml')]
+        self.assertEqual(origins, {
+            'APP': None,
+            'BUILD': self.path('templates/build.yml'),
+            'DEEP': self.path('templates/loop.yml'),
+        })
+        self.assertEqual(groups, {'DEEP', 'LOOP_GROUP'})
+        self.assertEqual(set(pipelines[self.path('other.yml')][0]), {'APP', 'BUILD', 'DEEP'})
+        self.assertEqual(pipelines[self.path('island/a.yml')][0], {'A': None, 'B': self.path('island/b.yml')})
+
+class TestFindYamlFiles(unittest.TestCase):
+    FILES = [
+        "azure-pipelines.yml",
+        "ci/build.yaml",
+        "ci/notes.txt",
+        "ci/generated/out.yml",
+        "ci/generated/keep.yml",
+        "node_modules/pkg/.travis.yml",
+        "docs/build/pipeline.yml",
+        "build/pipeline.yml",
+        ".git/hooks/config.yml",
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name in self.FILES:
+            path = os.path.join(self.tmp.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        self.write(".gitignore", "# dependencies\nnode_modules/\n/build\n")
+        self.write("ci/.gitignore", "generated/*\n!generated/keep.yml\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.tmp.name, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def find(self, *args):
+        return [os.path.relpath(path, self.tmp.name).replace(os.sep, '/')
+                for path in find_yaml_files(self.tmp.name, *args)]
+
+    def test_gitignore_rules_prune_the_walk(self):
+        self.assertEqual(self.find(), [
+            "azure-pipelines.yml", "ci/build.yaml", "ci/generated/keep.yml", "docs/build/pipeline.yml",
+        ])
+
+    def test_excludes_override_gitignore(self):
+        self.assertEqual(self.find(["docs", "keep.yml"]), ["azure-pipelines.yml", "ci/build.yaml"])
+
+    def test_without_gitignore(self):
+        self.assertEqual(self.find(["**/pkg"], False), [
+            "azure-pipelines.yml", "build/pipeline.yml", "ci/build.yaml",
+            "ci/generated/keep.yml", "ci/generated/out.yml", "docs/build/pipeline.yml",
+        ])
+
+    def test_rules_of_enclosing_repository_apply(self):
+        os.mkdir(os.path.join(self.tmp.name, ".git", "info"))
+        self.write(".git/info/exclude", "*.yaml\n")
+        self.write(".gitignore", "ci/generated/\n")
+        nested = [os.path.relpath(path, self.tmp.name).replace(os.sep, '/')
+                  for path in find_yaml_files(os.path.join(self.tmp.name, "ci"))]
+        self.assertEqual(nested, [])
+
+    def test_ignored_agrees_with_the_walk(self):
+        found = set(self.find(["docs"]))
+        for name in self.FILES:
+            path = os.path.join(self.tmp.name, name)
+            if name.endswith(('.yml', '.yaml')):
+                self.assertEqual(ignored(path, self.tmp.name, ["docs"]), name not in found, name)
+
+class TestWatchers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pipeline = os.path.join(self.tmp.name, "pipeline.yml")
+        self.write(self.pipeline)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content="steps: []\n"):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def list_files(self):
+        return walk_files(self.tmp.name, ('.yml',))
+
+    def test_polling_watcher(self):
+        watcher = PollingWatcher(self.list_files, interval=0.01)
+        self.assertEqual(watcher.read(timeout=0.05), (set(), False))
+        added = os.path.join(self.tmp.name, "added.yml")
+        self.write(added)
+        os.remove(self.pipeline)
+        self.assertEqual(watcher.read(timeout=1), ({added, self.pipeline}, False))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "inotify is only available on Linux")
+    def test_inotify_watcher(self):
+        watcher = InotifyWatcher()
+        try:
+            for _ in walk_files(self.tmp.name, ('.yml',), on_directory=watcher.add):
+                pass
+            self.assertEqual(watcher.read(timeout=0.05), (set(), False))
+            self.write(self.pipeline, "steps:\n  - script: echo $(CHANGED)\n")
+            self.assertEqual(watcher.read(timeout=1), ({self.pipeline}, False))
+            os.mkdir(os.path.join(self.tmp.name, "templates"))
+            self.assertTrue(watcher.read(timeout=1)[1])
+        finally:
+            watcher.close()
+
+@unittest.skipUnless(shutil.which('git'), "git is not installed")
+class TestRevisions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(os.path.realpath(self.tmp.name), "repo")
+        self.pipelines = os.path.join(self.repo, "pipelines")
+        os.makedirs(self.pipelines)
+        self.git('init', '-q')
+        self.commit({"app.yml": "steps:\n  - script: echo $(OLD) $(KEPT)\n", "same.yml": "x: $(SAME)\n",
+                     "../outside.yml": "x: $(OUTSIDE)\n"})
+        self.commit({"app.yml": "## - KEPT\nsteps:\n  - script: echo $(NEW) $(KEPT)\n", "added.yaml": "x: $(ADDED)\n"})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git', '-C', self.repo, '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    def commit(self, files):
+        for name, content in files.items():
+            with open(os.path.join(self.pipelines, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'change')
+
+    def args(self, **overrides):
+        defaults = dict(exclude=[], no_cache=False, cache_dir=os.path.join(self.tmp.name, 'cache'),
+                        validate=False, templates=False)
+        return Namespace(**dict(defaults, **overrides))
+
+    def scan(self, revisions, **overrides):
+        return scan_revisions(self.pipelines, revisions, self.args(**overrides), io.StringIO())
+
+    def test_revision_is_read_without_checkout(self):
+        # The working tree differs from both commits
+        os.remove(os.path.join(self.pipelines, "app.yml"))
+        (tree,) = self.scan(['HEAD~1'])
+        self.assertEqual(sorted((os.path.relpath(path, self.pipelines), variables) for path, variables, _, _ in tree),
+                         [("app.yml", {'OLD', 'KEPT'}), ("same.yml", {'SAME'})])
+
+    def test_changes_between_revisions(self):
+        reports = [CollectedReport(), CollectedReport()]
+        for tree, report in zip(self.scan(['HEAD~1', 'HEAD']), reports):
+            report_results(tree, self.pipelines, False, [report])
+        self.assertNotIn(os.path.join(self.pipelines, "same.yml"), reports[1])
+
+        out = io.StringIO()
+        report_changes('HEAD~1', 'HEAD', *reports, self.pipelines, 'jsonl', out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records, [
+            {'file': 'added.yaml', 'status': 'added', 'added': [{'name': 'ADDED', 'group': False}],
+             'removed': [], 'regrouped': []},
+            {'file': 'app.yml', 'status': 'modified', 'added': [{'name': 'NEW', 'group': False}],
+             'removed': [{'name': 'OLD', 'group': False}], 'regrouped': [{'name': 'KEPT', 'group': True}]},
+        ])
+
+    def test_blob_results_are_cached_by_id(self):
+        args = self.args()
+        self.scan(['HEAD'])
+        cache = BlobCache(blob_cache_path(args.cache_dir, self.repo), __version__)
+        self.assertEqual(len(cache.entries), 3)
+
+        # The blob is cached under its id, whatever its path
+        with open(os.path.join(self.pipelines, "app.yml"), 'rb') as f:
+            blob = subprocess.run(['git', 'hash-object', '--stdin'], input=f.read(), stdout=subprocess.PIPE,
+                                  check=True).stdout.decode().strip()
+        self.assertEqual(cache.get(blob)[:2], ({'NEW', 'KEPT'}, {'KEPT'}))
+
+        self.commit({"renamed.yml": "## - KEPT\nsteps:\n  - script: echo $(NEW) $(KEPT)\n"})
+        self.scan(['HEAD'])
+        self.assertEqual(len(BlobCache(blob_cache_path(args.cache_dir, self.repo), __version__).entries), 3)
+
+class TestScanFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for i in range(12):
+            path = os.path.join(self.tmp.name, f"pipeline{i:02d}.yml")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"variables:\n  ## - VAR{i}\nsteps:\n  - script: echo $(VAR{i}) $(SHARED)\n")
+        with open(os.path.join(self.tmp.name, "broken.yaml"), 'w', encoding='utf-8') as f:
+            f.write("steps: [\n  - script: echo $(BROKEN)\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scan(self, jobs, validate=True):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            results = list(scan_files(sorted(find_yaml_files(self.tmp.name)), jobs, validate))
+        return results, output.getvalue()
+
+    def test_parallel_matches_sequential(self):
+        sequential = self.scan(jobs=1)
+        parallel = self.scan(jobs=3)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(len(sequential[0]), 13)
+        self.assertIn("Warning: Could not parse", sequential[1])
+
+    def test_streams_files_as_they_are_found(self):
+        files = find_yaml_files(self.tmp.name)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            streamed = list(scan_files(files, jobs=3, validate=True))
+        self.assertEqual(sorted(streamed), self.scan(jobs=1)[0])
+
+    def test_yaml_parsed_only_when_validating(self):
+        results, output = self.scan(jobs=1, validate=False)
+        self.assertEqual(output, "")
+        self.assertEqual(results, self.scan(jobs=1)[0])
+        broken = [variables for path, variables, _, _ in results if path.name == "broken.yaml"]
+        self.assertEqual(broken, [{'BROKEN'}])
+
+class TestReports(unittest.TestCase):
+    ROOT = os.path.join(os.sep, 'repo')
+
+    def write(self, report_class):
+        out = io.StringIO()
+        report = report_class(out, self.ROOT, '1.0')
+        report.add(os.path.join(self.ROOT, 'ci', 'build.yml'),
+                   {'APP': None, 'KEY': os.path.join(self.ROOT, 'templates', 'deploy.yml')}, {'KEY'})
+        streamed = out.getvalue()
+        report.add(os.path.join(self.ROOT, 'other.yml'), {'OTHER': None}, set())
+        report.close()
+        return streamed, out.getvalue()
+
+    def test_json_lines_are_written_per_file(self):
+        streamed, output = self.write(JsonLinesReport)
+        self.assertEqual(json.loads(streamed), {'file': 'ci/build.yml', 'variables': [
+            {'name': 'APP', 'group': False},
+            {'name': 'KEY', 'group': True, 'template': 'templates/deploy.yml'},
+        ]})
+        self.assertEqual([json.loads(line)['file'] for line in output.splitlines()], ['ci/build.yml', 'other.yml'])
+
+    def test_json_report(self):
+        streamed, output = self.write(JsonReport)
+        self.assertIn('ci/build.yml', streamed)
+        document = json.loads(output)
+        self.assertEqual(document['version'], '1.0')
+        self.assertEqual([entry['file'] for entry in document['files']], ['ci/build.yml', 'other.yml'])
+
+    def test_sarif_report(self):
+        _, output = self.write(SarifReport)
+        run = json.loads(output)['runs'][0]
+        rules = [rule['id'] for rule in run['tool']['driver']['rules']]
+        results = [(result['ruleId'], result['properties']['variable'],
+                    result['locations'][0]['physicalLocation']['artifactLocation']['uri'])
+                   for result in run['results']]
+        self.assertEqual(results, [
+            ('pipeline-variable', 'APP', 'ci/build.yml'),
+            ('group-variable', 'KEY', 'ci/build.yml'),
+            ('pipeline-variable', 'OTHER', 'other.yml'),
+        ])
+        self.assertTrue(all(rules[result['ruleIndex']] == result['ruleId'] for result in run['results']))
+
+    def test_text_report_is_printed_on_close(self):
+        streamed, output = self.write(TextReport)
+        self.assertEqual(streamed, "")
+        self.assertIn(f"{os.path.join('ci', 'build.yml')}:\n  - APP\n  - KEY\033[92m (by variable group)\033[0m", output)
+
+class TestVariableIndex(unittest.TestCase):
+    ROOT = os.path.join(os.sep, 'repo')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = VariableIndex(self.ROOT, '1.0')
+        self.index.add(os.path.join(self.ROOT, 'deploy.yml'),
+                       {'DeployKey': None, 'Tag': os.path.join(self.ROOT, 'templates', 'steps.yml')}, {'DeployKey'})
+        self.index.add(os.path.join(self.ROOT, 'ci', 'build.yml'), {'DeployKey': None, 'Tag': None}, set())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_queries(self):
+        self.assertEqual(self.index.where('DeployKey'), [('ci/build.yml', False, None), ('deploy.yml', True, None)])
+        self.assertEqual(self.index.where('Tag'), [('ci/build.yml', False, None),
+                                                   ('deploy.yml', False, 'templates/steps.yml')])
+        self.assertEqual(self.index.where('Missing'), [])
+        self.assertEqual(self.index.undeclared(), ['Tag'])
+
+    def test_saved_index_answers_queries(self):
+        path = os.path.join(self.tmp.name, 'index', 'scan.index.json')
+        self.index.save(path)
+        loaded = VariableIndex.load(path, self.ROOT, '1.0')
+        self.assertEqual(loaded.where('Tag'), self.index.where('Tag'))
+        self.assertEqual(loaded.undeclared(), ['Tag'])
+        self.assertIsNone(VariableIndex.load(path, self.ROOT, '1.1'))
+        self.assertIsNone(VariableIndex.load(path, self.ROOT, '1.0', templates=True))
+
+    def test_variable_name(self):
+        self.assertEqual(variable_name('$(DeployKey)'), 'DeployKey')
+        self.assertEqual(variable_name(' Build.Id '), 'Build.Id')
+
+class TestMain(unittest.TestCase):
+    FILES = {
+        "azure-pipelines.yml": "## - GroupVar\nvariables:\n- group: shared\nsteps:\n"
+                               "- template: templates/steps.yml\n- script: echo $(GroupVar) $(OwnVar)\n",
+        "templates/steps.yml": "steps:\n- script: echo $(TemplateVar)\n",
+        "ci/build.yml": "steps:\n- script: echo $(OwnVar)\n",
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tmp.name)
+        self.tree = os.path.join(self.root, "tree")
+        self.cache_dir = os.path.join(self.root, "cache")
+        for name, content in self.FILES.items():
+            self.write(name, content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.tree, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def main(self, *args):
+        """Run the command line in the test tree and return what it printed."""
+        argv, cwd = sys.argv, os.getcwd()
+        sys.argv = ['azpipvar', '--no-track-install', '--cache-dir', self.cache_dir, *args]
+        os.chdir(self.tree)
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                check_variables.main()
+        finally:
+            os.chdir(cwd)
+            sys.argv = argv
+        return output.getvalue()
+
+    def test_text_report(self):
+        output = self.main()
+        self.assertIn("ci/build.yml:\n  - OwnVar\n", output)
+        self.assertIn("azure-pipelines.yml:\n  - GroupVar\033[92m (by variable group)\033[0m\n  - OwnVar\n", output)
+        self.assertIn("templates/steps.yml:\n  - TemplateVar\n", output)
+
+    def test_templates_report(self):
+        output = self.main('--templates')
+        self.assertIn("  - TemplateVar (from templates/steps.yml)\n", output)
+        self.assertNotIn("templates/steps.yml:", output)
+
+    def test_cached_run_matches_uncached(self):
+        uncached = self.main('--no-cache')
+        self.assertFalse(os.path.exists(self.cache_dir))
+        self.assertEqual(self.main(), uncached)
+        self.assertEqual(self.main(), uncached)
+        self.assertTrue(any(name.endswith('.index.json') for name in os.listdir(self.cache_dir)))
+
+    def test_jsonl_report_to_file(self):
+        report = os.path.join(self.root, "report.jsonl")
+        self.assertEqual(self.main('--format', 'jsonl', '-o', report), "")
+        with open(report, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['file'] for record in records],
+                         ["azure-pipelines.yml", "ci/build.yml", "templates/steps.yml"])
+        self.assertEqual(records[1]['variables'], [{'name': 'OwnVar', 'group': False}])
+
+    def test_where_and_undeclared(self):
+        expected = (
+            "\n$(GroupVar) is used in 1 pipeline:\n"
+            "  - azure-pipelines.yml\033[92m (by variable group)\033[0m\n"
+            "\n$(TemplateVar) is used in 1 pipeline:\n"
+            "  - templates/steps.yml\n"
+            "\nVariables not declared in any variable group (2):\n"
+            "  - OwnVar (2 pipelines)\n"
+            "  - TemplateVar (1 pipeline)\n"
+        )
+        query = ('--where', '$(GroupVar)', '--where', 'TemplateVar', '--undeclared')
+        # Answered by a scan the first time, then from the saved index
+        self.assertEqual(self.main(*query), expected)
+        self.assertEqual(self.main(*query), expected)
+
+        self.write("ci/build.yml", "## - OwnVar\nsteps:\n- script: echo $(OwnVar)\n")
+        self.assertEqual(self.main(*query), expected)
+        self.assertIn("Variables not declared in any variable group (1):\n  - TemplateVar",
+                      self.main('--refresh', *query))
+
+    def test_index_follows_edits_in_both_modes(self):
+        for first, second in ((), ('--templates',)), (('--templates',), ()):
+            with self.subTest(first=first):
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+                self.write("ci/build.yml", self.FILES["ci/build.yml"])
+                self.main(*first)
+                self.main(*second)
+                self.write("ci/build.yml", "steps:\n- script: echo $(NewVar)\n")
+                self.main(*first)
+                self.main(*second)
+                for mode in (first, second):
+                    self.assertIn("$(NewVar) is used in 1 pipeline:\n  - ci/build.yml\n",
+                                  self.main(*mode, '--where', 'NewVar'))
+
+    def test_where_json(self):
+        records = json.loads(self.main('--format', 'json', '--where', 'OwnVar'))
+        self.assertEqual(records, [{'name': 'OwnVar', 'pipelines': [
+            {'file': 'azure-pipelines.yml', 'group': False}, {'file': 'ci/build.yml', 'group': False}]}])
+
+    def test_invalid_combinations(self):
+        with redirect_stdout(io.StringIO()), mock.patch('sys.stderr', io.StringIO()):
+            for args in (['--rev', 'a', '--rev', 'b', '--rev', 'c'], ['--watch', '--undeclared'],
+                         ['--where', 'X', '--format', 'sarif'], ['-j', '-1']):
+                with self.assertRaises(SystemExit):
+                    self.main(*args)
+
+    def test_watch(self):
+        build = os.path.join(self.tree, "ci", "build.yml")
+
+        class ScriptedWatcher:
+            """Hands out scripted changes, then stops the watch like Ctrl-C."""
+
+            def __init__(watcher, steps):
+                watcher.steps = list(steps)
+
+            def add(watcher, directory):
+                pass
+
+            def read(watcher, timeout=None):
+                if not watcher.steps:
+                    raise KeyboardInterrupt
+                return watcher.steps.pop(0)()
+
+            def close(watcher):
+                pass
+
+        def edit():
+            self.write("ci/build.yml", "steps:\n- script: echo $(OwnVar) $(NewVar)\n")
+            return {build}, False
+
+        def touch():
+            # Unchanged results are not reported again
+            self.write("ci/build.yml", "steps:\n- script: echo $(NewVar) $(OwnVar)\n")
+            return {build}, False
+
+        def remove():
+            os.remove(build)
+            return {build}, False
+
+        watcher = ScriptedWatcher([edit, touch, remove])
+        with mock.patch('file_watch.open_watcher', lambda *args: watcher):
+            output = self.main('--watch', '--format', 'jsonl')
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([record['file'] for record in records],
+                         ["azure-pipelines.yml", "ci/build.yml", "templates/steps.yml", "ci/build.yml", "ci/build.yml"])
+        self.assertEqual([variable['name'] for variable in records[3]['variables']], ['NewVar', 'OwnVar'])
+        self.assertEqual(records[4], {'file': 'ci/build.yml', 'removed': True})
+
+class TestScanCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp.name, "cache", "scan.json")
+        self.pipeline = os.path.join(self.tmp.name, "pipeline.yml")
+        self.write("## - GROUP_VAR\nsteps:\n  - script: echo $(GROUP_VAR) $(OTHER)\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, content, mtime=None):
+        with open(self.pipeline, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.pipeline, ns=(mtime, mtime))
+
+    def scan(self, validate=False):
+        cache = ScanCache(self.cache_file, '1.0')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            results = list(scan_files([self.pipeline], validate=validate, cache=cache))
+        cache.save()
+        return cache, results[0][1:3], output.getvalue()
+
+    def test_unchanged_file_is_not_rescanned(self):
+        _, first, _ = self.scan()
+        self.assertEqual(first, ({'GROUP_VAR', 'OTHER'}, {'GROUP_VAR'}))
+        cache = ScanCache(self.cache_file, '1.0')
+        self.assertEqual(cache.get(self.pipeline), first + ([], ''))
+
+    def test_changed_file_is_rescanned(self):
+        self.scan()
+        self.write("steps:\n  - script: echo $(NEW_VAR)\n")
+        _, results, _ = self.scan()
+        self.assertEqual(results, ({'NEW_VAR'}, set()))
+
+    def test_touched_file_is_matched_by_hash(self):
+        self.scan()
+        stat = os.stat(self.pipeline)
+        os.utime(self.pipeline, ns=(stat.st_mtime_ns + 10 ** 9, stat.st_mtime_ns + 10 ** 9))
+        cache = ScanCache(self.cache_file, '1.0')
+        self.assertIsNotNone(cache.get(self.pipeline))
+        # Same size, new content and a new mtime
+        self.write("## - GROUP_XYZ\nsteps:\n  - script: echo $(GROUP_XYZ) $(OTHER)\n", stat.st_mtime_ns + 2 * 10 ** 9)
+        self.assertIsNone(ScanCache(self.cache_file, '1.0').get(self.pipeline))
+
+    def test_validation_warnings_are_replayed(self):
+        self.write("steps: [\n  - script: echo $(BROKEN)\n")
+        _, _, output = self.scan(validate=True)
+        self.assertIn("Warning: Could not parse", output)
+        cache, _, cached_output = self.scan(validate=True)
+        self.assertEqual(cached_output, output)
+        self.assertEqual(self.scan(validate=False)[2], "")
+
+    def test_other_version_is_ignored(self):
+        self.scan()
+        self.assertIsNone(ScanCache(self.cache_file, '2.0').get(self.pipeline))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
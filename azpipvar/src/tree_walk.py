@@ -0,0 +1,247 @@
+"""Single-pass directory walk that skips ignored directories.
+
+The tree is walked once with os.scandir, and every wanted suffix is matched
+in that same pass. Directories matched by .gitignore rules or by --exclude
+patterns are pruned instead of being walked and filtered afterwards, so
+node_modules, build output and the .git directory cost nothing. Paths are
+yielded as soon as they are found.
+"""
+
+import os
+import re
+
+# Directories that are never descended into
+PRUNED = frozenset({'.git'})
+
+def _translate(pattern):
+    """Return the regular expression for a gitignore glob, for /-separated paths."""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if (pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/')
+                    and (i + 2 == n or pattern[i + 2] == '/')):
+                if i + 2 == n:
+                    # Trailing /** matches everything inside
+                    parts.append('.*')
+                    i += 2
+                else:
+                    # **/ matches zero or more directories
+                    parts.append('(?:.*/)?')
+                    i += 3
+                continue
+            while i < n and pattern[i] == '*':
+                i += 1
+            parts.append('[^/]*')
+            continue
+        if c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j == -1:
+                parts.append(re.escape(c))
+            else:
+                members = pattern[i + 1:j].replace('\\', '\\\\')
+                if members[:1] in ('!', '^'):
+                    members = '^/' + members[1:]
+                parts.append(f'[{members}]')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+def parse_pattern(line):
+    """Return (regex, negated, directories_only) for one line of an ignore file, or None.
+
+    Blank lines and comments give None. The regex matches a path relative to
+    the directory of the ignore file.
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    # Trailing spaces are dropped unless escaped with a backslash
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    directories_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # A slash anywhere but at the end ties the pattern to the ignore file's directory
+    if '/' in line:
+        regex = _translate(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + _translate(line)
+    return regex, negated, directories_only
+
+class IgnoreRules:
+    """The patterns of one ignore file, applied below its directory."""
+
+    def __init__(self, lines, base):
+        self.prefix_length = len(os.path.join(base, ''))
+        self.rules = []
+        for line in lines:
+            parsed = parse_pattern(line)
+            if parsed is not None:
+                regex, negated, directories_only = parsed
+                self.rules.append((re.compile(regex), negated, directories_only))
+        self.negations = any(negated for _, negated, _ in self.rules)
+
+        # Most paths match no pattern at all; one combined regex per kind of
+        # entry settles those with a single call
+        def combined(rules):
+            regexes = [rule.pattern for rule, _, _ in rules]
+            return re.compile('|'.join(f'(?:{regex})' for regex in regexes)) if regexes else None
+        self.any_directory = combined(self.rules)
+        self.any_file = combined([rule for rule in self.rules if not rule[2]])
+
+    @classmethod
+    def from_file(cls, path, base):
+        """Load the rules of an ignore file, or return None if it cannot be read."""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return cls(f.read().splitlines(), base)
+        except OSError:
+            return None
+
+    def match(self, path, is_dir):
+        """Return True if path is ignored, False if a negated pattern keeps it, or None if no pattern applies."""
+        relative = path[self.prefix_length:]
+        if os.sep != '/':
+            relative = relative.replace(os.sep, '/')
+        candidates = self.any_directory if is_dir else self.any_file
+        if candidates is None or not candidates.fullmatch(relative):
+            return None
+        if not self.negations:
+            return True
+        # The last matching pattern decides
+        for rule, negated, directories_only in reversed(self.rules):
+            if (is_dir or not directories_only) and rule.fullmatch(relative):
+                return not negated
+        return None
+
+    def covers(self, path):
+        """Return whether path, a file below the rules' directory, is ignored itself or through a parent directory."""
+        directory = path[:self.prefix_length].rstrip(os.sep) or os.sep
+        for name in path[self.prefix_length:].split(os.sep)[:-1]:
+            directory = os.path.join(directory, name)
+            if self.match(directory, True):
+                return True
+        return bool(self.match(path, False))
+
+def repository_rules(root):
+    """Return the ignore rules of the git repository root is in that apply from above root.
+
+    These are the repository's .git/info/exclude and the .gitignore files of
+    the directories between the repository root and root, outermost first.
+    Outside a repository there are none.
+    """
+    directories = []
+    directory = root
+    while not os.path.exists(os.path.join(directory, '.git')):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return []
+        directory = parent
+        directories.append(directory)
+
+    rules = [IgnoreRules.from_file(os.path.join(directory, '.git', 'info', 'exclude'), directory)]
+    for ancestor in reversed(directories):
+        rules.append(IgnoreRules.from_file(os.path.join(ancestor, '.gitignore'), ancestor))
+    return [rule_set for rule_set in rules if rule_set is not None]
+
+def _ignored(path, is_dir, rule_sets, excludes):
+    """Return whether the entry at path is ignored."""
+    # --exclude patterns come first, then deeper ignore files before outer ones
+    for rule_set in ([excludes] if excludes is not None else []) + rule_sets[::-1]:
+        ignored = rule_set.match(path, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+def ignored(path, root, excludes=(), gitignore=True):
+    """Return whether walk_files(root, ...) skips path, a file below root."""
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    exclude_rules = IgnoreRules(excludes, root) if excludes else None
+    rule_sets = repository_rules(root) if gitignore else []
+    relative = os.path.relpath(os.path.dirname(path), root)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return True
+    names = [] if relative == os.curdir else relative.split(os.sep)
+
+    # Follow the walk down to the file's directory
+    directory = root
+    for name in names + [None]:
+        if gitignore:
+            rule_set = IgnoreRules.from_file(os.path.join(directory, '.gitignore'), directory)
+            if rule_set is not None and rule_set.rules:
+                rule_sets = rule_sets + [rule_set]
+        if name is None:
+            break
+        directory = os.path.join(directory, name)
+        if name in PRUNED or _ignored(directory, True, rule_sets, exclude_rules):
+            return True
+    return _ignored(path, False, rule_sets, exclude_rules)
+
+def walk_files(root, suffixes, excludes=(), gitignore=True, on_directory=None):
+    """Yield the path of every file under root whose name ends with one of suffixes.
+
+    excludes are gitignore-style patterns relative to root and override any
+    .gitignore rule. With gitignore, the .gitignore files found in the tree
+    and those of the enclosing repository are honoured as git does. Each
+    directory's entries are visited in name order, files before the
+    subdirectories below them. Symbolic links to directories are not followed.
+    on_directory, if given, is called with every directory that is walked.
+    """
+    root = os.path.abspath(root)
+    suffixes = tuple(suffixes)
+    exclude_rules = IgnoreRules(excludes, root) if excludes else None
+    if exclude_rules is not None and not exclude_rules.rules:
+        exclude_rules = None
+
+    stack = [(root, repository_rules(root) if gitignore else [])]
+    while stack:
+        directory, rule_sets = stack.pop()
+        if on_directory is not None:
+            on_directory(directory)
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        if gitignore and any(entry.name == '.gitignore' for entry in entries):
+            rule_set = IgnoreRules.from_file(os.path.join(directory, '.gitignore'), directory)
+            if rule_set is not None and rule_set.rules:
+                rule_sets = rule_sets + [rule_set]
+
+        subdirectories = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNED and not _ignored(entry.path, True, rule_sets, exclude_rules):
+                        subdirectories.append(entry.path)
+                elif (entry.name.endswith(suffixes) and entry.is_file()
+                        and not _ignored(entry.path, False, rule_sets, exclude_rules)):
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend((subdirectory, rule_sets) for subdirectory in reversed(subdirectories))
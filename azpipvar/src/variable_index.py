@@ -0,0 +1,133 @@
+"""Inverted index from variables to the pipelines that use them.
+
+The index is filled during a scan, alongside the report, and saved next to
+the scan cache. Questions such as where a variable is used, or which
+variables never come from a variable group, are then answered from the saved
+index without scanning the tree again.
+"""
+
+import json
+import os
+import re
+
+# Bumped whenever the file layout changes
+INDEX_FORMAT = 1
+
+# A variable given as $(Name) or as a bare name
+_REFERENCE = re.compile(r'\$\((.*)\)')
+
+def index_path(cache_file, templates=False):
+    """Return the index file kept next to a scan cache file, one per --templates mode."""
+    return os.path.splitext(cache_file)[0] + ('.templates' if templates else '') + '.index.json'
+
+def variable_name(reference):
+    """Return the variable name of a query written as $(Name) or Name."""
+    match = _REFERENCE.fullmatch(reference.strip())
+    return match.group(1) if match else reference.strip()
+
+class VariableIndex:
+    """For each variable, the pipelines using it and whether a variable group supplies it there.
+
+    Paths are stored once in files, relative to root. uses maps a variable
+    to a flat list of (pipeline, group, template) triples of integers: the
+    pipeline's position in files, 1 if a variable group supplies the
+    variable there, and the position of the template it comes from, or -1
+    for variables the pipeline uses itself. The saved index is loaded as is,
+    so a query on a large repository starts quickly.
+    """
+
+    def __init__(self, root, version='', templates=False):
+        self.root = root
+        self.version = version
+        self.templates = templates
+        self.files = []
+        self._uses = {}
+        self._file_ids = {}
+        self._pending = []
+        self._prefix = os.path.join(root, '')
+
+    def file_id(self, path):
+        """Return the position of path in files, adding it if needed."""
+        path = str(path)
+        if path.startswith(self._prefix):
+            relative = path[len(self._prefix):]
+        else:
+            relative = os.path.relpath(path, self.root)
+        if os.sep != '/':
+            relative = relative.replace(os.sep, '/')
+        file_id = self._file_ids.get(relative)
+        if file_id is None:
+            file_id = self._file_ids[relative] = len(self.files)
+            self.files.append(relative)
+        return file_id
+
+    def add(self, file_path, variables, variables_in_group):
+        """Record the variables of one pipeline, in the form given to the reports.
+
+        The results are only inverted when the index is queried or saved, so
+        a run whose index is already up to date does not pay for it.
+        """
+        self._pending.append((file_path, variables, variables_in_group))
+
+    @property
+    def uses(self):
+        """The inverted index, after folding in the pipelines added since it was last read."""
+        uses = self._uses
+        for file_path, variables, variables_in_group in self._pending:
+            pipeline = self.file_id(file_path)
+            for var, origin in variables.items():
+                triple = (pipeline, 1 if var in variables_in_group else 0, self.file_id(origin) if origin else -1)
+                if var in uses:
+                    uses[var].extend(triple)
+                else:
+                    uses[var] = list(triple)
+        self._pending.clear()
+        return uses
+
+    def where(self, variable):
+        """Return [(pipeline, group, template)] for every pipeline using variable, by path.
+
+        template is None for variables the pipeline uses itself.
+        """
+        uses = self.uses.get(variable, [])
+        files = self.files
+        return sorted(
+            (files[uses[i]], bool(uses[i + 1]), files[uses[i + 2]] if uses[i + 2] >= 0 else None)
+            for i in range(0, len(uses), 3)
+        )
+
+    def undeclared(self):
+        """Return the variables that no pipeline gets from a variable group, by name."""
+        return sorted(var for var, uses in self.uses.items() if not any(uses[1::3]))
+
+    def save(self, path):
+        """Write the index to path, replacing it atomically."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = {
+            'format': INDEX_FORMAT,
+            'version': self.version,
+            'root': self.root,
+            'templates': self.templates,
+            'files': self.files,
+            'variables': self.uses,
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, separators=(',', ':')))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, root, version='', templates=False):
+        """Return the index saved at path, or None if there is none for this root, version and mode."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('format'), data.get('version'), data.get('root'), data.get('templates')) != \
+                    (INDEX_FORMAT, version, root, templates):
+                return None
+            index = cls(root, version, templates)
+            index.files = data['files']
+            index._uses = data['variables']
+            return index
+        except (OSError, ValueError, AttributeError, KeyError):
+            return None
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for the conversion engine on IPv4, IPv6 and mixed input.
+
+Run from the ip2cidr directory:
+
+    python benchmarks/bench_engine.py -n 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ip_engine import NetworkAggregator  # noqa: E402
+
+def random_ipv4(rng):
+    return f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+
+def random_ipv6(rng):
+    return f"2001:db8:{rng.randrange(1 << 16):x}:{rng.randrange(1 << 16):x}::{rng.randrange(1 << 16):x}"
+
+def make_corpus(kind, count, unique, seed=0):
+    """Build a newline-separated corpus of count addresses drawn from unique distinct ones."""
+    rng = random.Random(seed)
+    if kind == 'v4':
+        pool = [random_ipv4(rng) for _ in range(unique)]
+    elif kind == 'v6':
+        pool = [random_ipv6(rng) for _ in range(unique)]
+    else:
+        pool = [random_ipv4(rng) if i % 2 else random_ipv6(rng) for i in range(unique)]
+    return '\n'.join(rng.choice(pool) for _ in range(count))
+
+def run(corpus, chunk_size):
+    aggregator = NetworkAggregator()
+    start = 0
+    while start < len(corpus):
+        # Cut on the next newline so no address is split between chunks
+        end = corpus.find('\n', start + chunk_size)
+        if end == -1:
+            end = len(corpus)
+        aggregator.add(corpus[start:end])
+        start = end + 1
+    return aggregator
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ip2cidr engine')
+    parser.add_argument('-n', '--count', type=int, default=1000000, help='Addresses per corpus')
+    parser.add_argument('-u', '--unique', type=int, default=100000, help='Distinct addresses per corpus')
+    parser.add_argument('--chunk-size', type=int, default=1 << 18, help='Bytes per parsed chunk')
+    args = parser.parse_args()
+
+    for kind in ('v4', 'v6', 'mixed'):
+        corpus = make_corpus(kind, args.count, args.unique)
+        start = time.perf_counter()
+        aggregator = run(corpus, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{kind:>5}: {args.count / elapsed:12,.0f} addresses/s "
+              f"({elapsed:.3f}s, {len(aggregator)} networks)")
+
+if __name__ == "__main__":
+    main()
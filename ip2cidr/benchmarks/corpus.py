@@ -0,0 +1,89 @@
+"""Reproducible synthetic address corpora for the benchmarks.
+
+A corpus is fully determined by its size, duplicate ratio, malformed rate,
+IPv6 share and seed, so two runs with the same parameters write byte-identical
+files on any machine. Distinct addresses are derived from a counter through a
+bijective integer mix, so repeats can be drawn from every address generated so
+far without keeping them in memory; a corpus of 10^8 addresses is written in
+constant memory.
+"""
+
+import os
+import random
+import socket
+
+# Addresses formatted per write
+BATCH_SIZE = 1 << 16
+
+# Odd multipliers, so the mixes below are bijections on 32 and 64 bits
+_MIX32 = 0x9E3779B1
+_MIX64 = 0x9E3779B97F4A7C15
+
+# Tokens that are not valid IPv4 addresses
+MALFORMED = (
+    '999.1.2.3', '10.0.0', '1.2.3.4.5', 'abc.def.1.2', '01.2.3.4',
+    '10..0.1', '256.256.256.256', '-1.2.3.4', '1.2.3.4/24', 'localhost',
+)
+
+def distinct_ipv4(index, seed=0):
+    """Return the index-th distinct IPv4 address of a corpus."""
+    value = (((index + 1) * _MIX32) ^ (seed * _MIX32 >> 7)) & 0xFFFFFFFF
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+def distinct_ipv6(index, seed=0):
+    """Return the index-th distinct IPv6 address of a corpus, inside 2001:db8::/32."""
+    value = (((index + 1) * _MIX64) ^ seed) & 0xFFFFFFFFFFFFFFFF
+    packed = b'\x20\x01\x0d\xb8' + (value >> 32).to_bytes(4, 'big') + (value & 0xFFFFFFFF).to_bytes(8, 'big')
+    return socket.inet_ntop(socket.AF_INET6, packed)
+
+def iter_corpus(count, duplicate_ratio=0.0, malformed_rate=0.0, ipv6_ratio=0.0, seed=0):
+    """Yield count address tokens.
+
+    Each token is malformed with probability malformed_rate; otherwise it
+    repeats an earlier distinct address with probability duplicate_ratio, or
+    is a new distinct address, IPv6 with probability ipv6_ratio.
+    """
+    rng = random.Random(seed)
+    random_value = rng.random
+    seen4 = seen6 = 0
+    for _ in range(count):
+        if malformed_rate and random_value() < malformed_rate:
+            yield MALFORMED[rng.randrange(len(MALFORMED))]
+            continue
+        v6 = ipv6_ratio and random_value() < ipv6_ratio
+        seen = seen6 if v6 else seen4
+        if seen and duplicate_ratio and random_value() < duplicate_ratio:
+            index = rng.randrange(seen)
+        else:
+            index = seen
+            if v6:
+                seen6 += 1
+            else:
+                seen4 += 1
+        yield distinct_ipv6(index, seed) if v6 else distinct_ipv4(index, seed)
+
+def corpus_name(count, duplicate_ratio=0.0, malformed_rate=0.0, ipv6_ratio=0.0, seed=0):
+    """Return a file name that identifies a corpus by its parameters."""
+    return f"ips-n{count}-d{duplicate_ratio:g}-m{malformed_rate:g}-v6{ipv6_ratio:g}-s{seed}.txt"
+
+def write_corpus(path, count, duplicate_ratio=0.0, malformed_rate=0.0, ipv6_ratio=0.0, seed=0):
+    """Write a newline-separated corpus to path, replacing it atomically."""
+    tokens = iter_corpus(count, duplicate_ratio, malformed_rate, ipv6_ratio, seed)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        remaining = count
+        while remaining:
+            batch = min(BATCH_SIZE, remaining)
+            f.write('\n'.join(next(tokens) for _ in range(batch)))
+            f.write('\n')
+            remaining -= batch
+    os.replace(tmp_path, path)
+    return path
+
+def ensure_corpus(directory, count, duplicate_ratio=0.0, malformed_rate=0.0, ipv6_ratio=0.0, seed=0):
+    """Return the path of a corpus in directory, generating it if it does not exist yet."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, corpus_name(count, duplicate_ratio, malformed_rate, ipv6_ratio, seed))
+    if not os.path.exists(path):
+        write_corpus(path, count, duplicate_ratio, malformed_rate, ipv6_ratio, seed)
+    return path
@@ -10,12 +10,15 @@ from src.version import __version__
 setup(
     name="ip2cidr",
     version=__version__,
-    py_modules=['ip_converter', 'version'],
+    py_modules=['ip_cache', 'ip_converter', 'ip_counter', 'ip_engine', 'ip_index', 'ip_reader', 'ip_rejects', 'ip_shard', 'version'],
     package_dir={'': 'src'},
     install_requires=[
         "argparse>=1.4.0",
     ],
     extras_require={
+        'fast': [
+            'numpy>=1.20.0',
+        ],
         'test': [
             'pytest>=7.0.0',
             'pytest-cov>=4.0.0',
@@ -0,0 +1,177 @@
+"""Persistent on-disk cache of converted network lists.
+
+Results are keyed by a fingerprint of the input content, the options that
+affect the networks and the ip2cidr version, and stored as packed integers
+under a cache directory. File digests are memoised by path, size and
+modification time, so a repeat run on an unchanged file only needs a stat
+before it hits the cache. The cache is trimmed to a size limit by evicting the least recently used entries.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from version import __version__
+
+# Default location and size limit of the cache
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ip2cidr'
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Entry file signature and header: the number of IPv4 and IPv6 networks and
+# the length of the rejects summary that follows them
+MAGIC = b'IP2CRES2'
+_HEADER = struct.Struct('<QQQ')
+
+# Memoised file digests kept in the cache directory
+FINGERPRINTS_FILE = 'fingerprints.json'
+MAX_FINGERPRINTS = 1000
+
+def digest_bytes(data):
+    """Return the content digest of a bytes-like object."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+def digest_file(path):
+    """Return the content digest of a file, hashing it through a memory map."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest_bytes(b'')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return digest_bytes(mm)
+
+def cache_key(digests, prefix, prefix6, version=__version__):
+    """Combine input digests, conversion options and the ip2cidr version into a cache key.
+
+    The version is part of the key so entries written by an older release,
+    which may have parsed the input differently, are never served.
+    """
+    options = json.dumps({'inputs': list(digests), 'prefix': prefix, 'prefix6': prefix6, 'version': version})
+    return digest_bytes(options.encode('utf-8'))
+
+class ResultCache:
+    """Directory of cached network lists with LRU eviction."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _write_atomic(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def fingerprint(self, path):
+        """Return the content digest of path, reusing a memoised one if the file is unchanged."""
+        memo_path = os.path.join(self.directory, FINGERPRINTS_FILE)
+        try:
+            with open(memo_path, 'r') as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = {}
+
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        entry = memo.get(real_path)
+        if entry and entry[:3] == signature:
+            return entry[3]
+
+        digest = digest_file(real_path)
+        memo.pop(real_path, None)
+        memo[real_path] = signature + [digest]
+        # Keep only the most recently fingerprinted files
+        while len(memo) > MAX_FINGERPRINTS:
+            memo.pop(next(iter(memo)))
+        try:
+            self._write_atomic(memo_path, json.dumps(memo).encode('utf-8'))
+        except OSError:
+            pass
+        return digest
+
+    def get(self, key):
+        """Return the cached (networks, networks6, (reject_counts, reject_samples)) for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(MAGIC):
+                raise ValueError("not a cache entry")
+            offset = len(MAGIC)
+            count, count6, rejects_length = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            if len(data) != offset + 4 * count + 16 * count6 + rejects_length:
+                raise ValueError("truncated cache entry")
+            networks = array('I')
+            networks.frombytes(data[offset:offset + 4 * count])
+            if sys.byteorder == 'little':
+                networks.byteswap()
+            offset += 4 * count
+            networks6 = [int.from_bytes(data[i:i + 16], 'big') for i in range(offset, offset + 16 * count6, 16)]
+            offset += 16 * count6
+            rejects = json.loads(data[offset:]) if rejects_length else {}
+            reject_counts, reject_samples = rejects.get('counts', {}), rejects.get('samples', [])
+        except (struct.error, ValueError, AttributeError):
+            # Written by an older release or cut short; remove it so this run stores a new one
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        return networks.tolist(), networks6, (reject_counts, reject_samples)
+
+    def put(self, key, networks, networks6=(), rejects=None):
+        """Store sorted network lists under key and trim the cache to its size limit.
+
+        rejects, a RejectLog, has its counts and samples stored with the
+        networks, so a cache hit can print the same summary as the run
+        that filled it.
+        """
+        packed = array('I', networks)
+        if sys.byteorder == 'little':
+            packed.byteswap()
+        networks6 = list(networks6)
+        summary = b''
+        if rejects is not None and len(rejects):
+            summary = json.dumps({'counts': rejects.counts, 'samples': rejects.samples}).encode('utf-8')
+        data = b''.join([
+            MAGIC,
+            _HEADER.pack(len(packed), len(networks6), len(summary)),
+            packed.tobytes(),
+            b''.join(network.to_bytes(16, 'big') for network in networks6),
+            summary,
+        ])
+        self._write_atomic(self._path(key), data)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its size limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -4,34 +4,187 @@ import argparse
 import sys
 from version import __version__
 from sunsoft import send_first_run_stats
+from ip_reader import iter_file_batches, iter_file_chunks, iter_text_chunks
+from ip_engine import NetworkAggregator, format_networks, split_addresses
+from ip_shard import convert_files_parallel
+from ip_index import CidrIndex
+from ip_counter import NetworkCounter, SpaceSavingCounter
+from ip_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ResultCache, cache_key, digest_bytes
+from ip_rejects import RejectLog
 
-def ip_to_cidr(ip_list):
-    """Convert a comma-separated list of IP addresses to their /24 CIDR networks."""
+# Range of prefix lengths accepted on the command line
+MIN_PREFIX = 8
+MAX_PREFIX = 32
+MAX_PREFIX6 = 128
+
+# Decimal octets 0-255 without leading zeros, checked by set lookup
+_OCTETS = frozenset(str(octet) for octet in range(256))
+
+def _ip_to_network(ip):
+    """Return the /24 network for a single IP address, or None if it is invalid."""
+    # Split IP into octets
+    octets = ip.split('.')
+    if len(octets) != 4 or not _OCTETS.issuperset(octets):
+        return None
+
+    # Convert to /24 by keeping first 3 octets and setting last to 0
+    return f"{octets[0]}.{octets[1]}.{octets[2]}.0/24"
+
+def ip_to_cidr(ip_list, rejects=None):
+    """Convert a comma-separated list of IP addresses to their /24 CIDR networks.
+
+    This is the reference implementation, one string per address, that the
+    integer engine is tested and benchmarked against; the command line uses
+    NetworkAggregator. Invalid addresses are recorded in rejects, a
+    RejectLog, if given; otherwise they are summarised in one line on stderr.
+    """
     # Split the comma-separated string into individual IPs
     ip_addresses = [ip.strip() for ip in ip_list.split(',')]
 
     # Set to store unique /24 networks
     cidr_networks = set()
+    invalid = []
 
     for ip in ip_addresses:
-        try:
-            # Split IP into octets
-            octets = ip.split('.')
-            if len(octets) != 4:
-                print(f"Invalid IP format: {ip}", file=sys.stderr)
-                continue
-
-            # Convert to /24 by keeping first 3 octets and setting last to 0
-            network = f"{octets[0]}.{octets[1]}.{octets[2]}.0/24"
+        network = _ip_to_network(ip)
+        if network is not None:
             cidr_networks.add(network)
+        elif ip:
+            invalid.append(ip)
 
-        except Exception as e:
-            print(f"Error processing IP {ip}: {str(e)}", file=sys.stderr)
-            continue
+    log = rejects if rejects is not None else RejectLog()
+    log.extend(invalid)
+    if rejects is None:
+        log.report()
 
     # Convert set to sorted list for consistent output
     return sorted(list(cidr_networks))
 
+def _parse_prefix(value, maximum):
+    try:
+        prefix = int(value.lstrip('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid prefix length: {value}")
+    if not MIN_PREFIX <= prefix <= maximum:
+        raise argparse.ArgumentTypeError(f"prefix length must be between {MIN_PREFIX} and {maximum}")
+    return prefix
+
+def prefix_length(value):
+    """Parse an IPv4 prefix length argument, accepting /8 through /32."""
+    return _parse_prefix(value, MAX_PREFIX)
+
+def prefix6_length(value):
+    """Parse an IPv6 prefix length argument, accepting /8 through /128."""
+    return _parse_prefix(value, MAX_PREFIX6)
+
+def iter_new_cidrs(chunks, aggregator):
+    """Yield CIDR strings for networks as the aggregator first sees them."""
+    for chunk in chunks:
+        new, new6 = aggregator.add(chunk)
+        yield from format_networks(new, aggregator.prefix)
+        yield from format_networks(new6, aggregator.prefix6, 128)
+
+def write_streamed(networks, separator, out=None):
+    """Write networks to out as they arrive, flushing after each one."""
+    out = out or sys.stdout
+    first = True
+    for network in networks:
+        if not first:
+            out.write(separator)
+        out.write(network)
+        out.flush()
+        first = False
+    out.write('\n')
+
+def write_counts(rows, with_error=False, out=None):
+    """Write (cidr, count, error) rows, one network per line."""
+    out = out or sys.stdout
+    for cidr, hits, error in rows:
+        out.write(f"{cidr}\t{hits}\t{error}\n" if with_error else f"{cidr}\t{hits}\n")
+
+def annotate(index, chunks, delimiter='\t', out=None):
+    """Write each address with the network it falls in, or '-' when none matches."""
+    out = out or sys.stdout
+    for chunk in chunks:
+        addresses = split_addresses(chunk)
+        for address, network in zip(addresses, index.lookup_many(addresses)):
+            out.write(f"{address}{delimiter}{network or '-'}\n")
+
+def lookup_main(argv=None):
+    """Entry point for 'ip2cidr lookup': annotate addresses with their network."""
+    parser = argparse.ArgumentParser(
+        prog='ip2cidr lookup',
+        description='Annotate IP addresses with the most specific network that contains them'
+    )
+    networks = parser.add_mutually_exclusive_group(required=True)
+    networks.add_argument(
+        '-n', '--networks',
+        action='append',
+        metavar='FILE',
+        help="Read newline- or comma-separated CIDR networks from FILE ('-' for stdin); may be repeated"
+    )
+    networks.add_argument(
+        '--index',
+        metavar='PATH',
+        help='Load a network index previously written with --save-index'
+    )
+    parser.add_argument(
+        '--save-index',
+        metavar='PATH',
+        help='Write the network index to PATH for fast loading later'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        '-i', '--ips',
+        help='Comma-separated list of IP addresses to look up'
+    )
+    source.add_argument(
+        '-f', '--file',
+        action='append',
+        dest='files',
+        metavar='FILE',
+        help="Read IP addresses to look up from FILE ('-' for stdin); may be repeated"
+    )
+    parser.add_argument(
+        '-d', '--delimiter',
+        default='\t',
+        help='Separator between an address and its network (default: tab)'
+    )
+
+    args = parser.parse_args(argv)
+    if args.ips is None and not args.files and not args.save_index:
+        parser.error("one of the arguments -i/--ips -f/--file is required unless --save-index is given")
+
+    try:
+        if args.index:
+            index = CidrIndex.load(args.index)
+        else:
+            index = CidrIndex(cidr for batch in iter_file_batches(args.networks) for cidr in batch)
+        if args.save_index:
+            index.save(args.save_index)
+
+        if args.ips is not None:
+            annotate(index, [args.ips], args.delimiter)
+        elif args.files:
+            annotate(index, iter_text_chunks(args.files), args.delimiter)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+def convert(args, aggregator):
+    """Feed the addresses selected on the command line into aggregator."""
+    if args.ips is not None:
+        aggregator.add(args.ips)
+        return
+
+    files = args.files
+    if args.workers > 1:
+        # stdin cannot be sharded, so it is still read in this process
+        convert_files_parallel([path for path in files if path != '-'], aggregator, args.workers)
+        files = [path for path in files if path == '-']
+    for chunk in iter_file_chunks(files):
+        aggregator.add(chunk)
+
 def main():
     # Send first run statistics
     send_first_run_stats(
@@ -39,28 +192,184 @@ def main():
         version=__version__
     )
 
+    if sys.argv[1:2] == ['lookup']:
+        lookup_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
-        description='Convert IP addresses to /24 CIDR notation'
+        description='Convert IP addresses to CIDR notation (default /24)',
+        epilog="Run 'ip2cidr lookup --help' to annotate addresses with the network that contains them."
     )
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         '-i', '--ips',
-        required=True,
         help='Comma-separated list of IP addresses'
     )
+    source.add_argument(
+        '-f', '--file',
+        action='append',
+        dest='files',
+        metavar='FILE',
+        help="Read newline- or comma-separated IPs from FILE ('-' for stdin); may be repeated"
+    )
     parser.add_argument(
         '-s', '--separator',
         default=',',
         help='Output separator (default: comma)'
     )
+    parser.add_argument(
+        '-p', '--prefix',
+        type=prefix_length,
+        default=24,
+        help=f'IPv4 network prefix length from {MIN_PREFIX} to {MAX_PREFIX} (default: 24)'
+    )
+    parser.add_argument(
+        '--prefix6',
+        type=prefix6_length,
+        default=64,
+        help=f'IPv6 network prefix length from {MIN_PREFIX} to {MAX_PREFIX6} (default: 64)'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Split input files into shards and convert them with N processes (default: 1)'
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--stream',
+        action='store_true',
+        help='Print networks as they are first seen instead of sorted at the end'
+    )
+    output.add_argument(
+        '--collapse',
+        action='store_true',
+        help='Merge adjacent and overlapping networks into the smallest covering set'
+    )
+    output.add_argument(
+        '--count',
+        action='store_true',
+        help='Print the number of hits per network, most hit first, one per line'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        metavar='K',
+        help='With --count, only print the K most hit networks'
+    )
+    parser.add_argument(
+        '--approximate',
+        type=int,
+        metavar='COUNTERS',
+        help='With --count, track at most COUNTERS networks in fixed memory (Space-Saving)'
+    )
+
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        default=None,
+        help='Reuse networks computed earlier for the same input and prefixes'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_false',
+        dest='cache',
+        help='Bypass the result cache, even if --cache-dir is given'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help=f'Cache directory; implies --cache (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        metavar='MB',
+        help='Evict least recently used cache entries beyond this size (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--rejects',
+        metavar='FILE',
+        help='Write every invalid address and the reason it was rejected to FILE, one per line'
+    )
 
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.stream:
+        parser.error("--workers cannot be combined with --stream")
+    if args.workers > 1 and args.count:
+        parser.error("--workers cannot be combined with --count")
+    if (args.top is not None or args.approximate is not None) and not args.count:
+        parser.error("--top and --approximate require --count")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    if args.approximate is not None and args.approximate < 1:
+        parser.error("--approximate must be at least 1")
 
+    rejects_file = None
     try:
-        result = ip_to_cidr(args.ips)
-        print(args.separator.join(result))
+        if args.rejects:
+            rejects_file = open(args.rejects, 'w', encoding='utf-8')
+        rejects = RejectLog(rejects_file)
+        aggregator = NetworkAggregator(prefix=args.prefix, prefix6=args.prefix6, ordered=args.stream,
+                                       rejects=rejects)
+
+        if args.ips is not None:
+            chunks = [args.ips]
+        else:
+            chunks = iter_file_chunks(args.files)
+
+        if args.stream:
+            write_streamed(iter_new_cidrs(chunks, aggregator), args.separator)
+            rejects.report()
+            return
+
+        if args.count:
+            if args.approximate:
+                counter = SpaceSavingCounter(args.approximate, args.prefix, args.prefix6, rejects=rejects)
+            else:
+                counter = NetworkCounter(args.prefix, args.prefix6, rejects=rejects)
+            for chunk in chunks:
+                counter.add(chunk)
+            write_counts(counter.top(args.top), with_error=args.approximate is not None)
+            rejects.report()
+            return
+
+        use_cache = args.cache if args.cache is not None else args.cache_dir is not None
+        # stdin cannot be fingerprinted without consuming it, and a cache hit
+        # only has the rejects summary, not every line for the rejects file
+        if use_cache and '-' not in (args.files or []) and not args.rejects:
+            cache = ResultCache(args.cache_dir or DEFAULT_CACHE_DIR, args.cache_max_size * 1024 * 1024)
+            if args.ips is not None:
+                digests = [digest_bytes(args.ips.encode('utf-8'))]
+            else:
+                digests = [cache.fingerprint(path) for path in args.files]
+            key = cache_key(digests, args.prefix, args.prefix6)
+            cached = cache.get(key)
+            if cached is not None:
+                networks, networks6, (reject_counts, reject_samples) = cached
+                aggregator.update(networks, networks6)
+                rejects.merge(reject_counts, reject_samples)
+            else:
+                convert(args, aggregator)
+                cache.put(key, aggregator.networks(), aggregator.networks6(), rejects)
+        else:
+            convert(args, aggregator)
+
+        if args.collapse:
+            print(args.separator.join(aggregator.collapsed_cidrs()))
+        else:
+            print(aggregator.cidrs_text(args.separator))
+        rejects.report()
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""Per-network hit counts and top-K heavy hitters.
+
+Counts are keyed by integer networks. IPv6 keys carry an extra bit above the
+128 address bits so they never collide with IPv4 keys in the same table.
+
+``NetworkCounter`` counts every network exactly. ``SpaceSavingCounter`` keeps
+a fixed number of counters using the Space-Saving algorithm, so memory is set
+in advance however many distinct networks the stream contains; each reported
+count overestimates the true count by at most its error.
+"""
+
+import heapq
+from collections import Counter
+
+from ip_engine import format_network, np, parse_ip, prefix_mask
+from ip_rejects import RejectLog
+
+# Tag bit that marks a key as an IPv6 network
+_IPV6_TAG = 1 << 128
+
+def count_networks(values, packed6, prefix=24, prefix6=64):
+    """Return a Counter of network keys for one chunk of parsed addresses."""
+    counts = Counter()
+    mask = prefix_mask(prefix)
+    if np is not None and len(values):
+        networks, hits = np.unique(np.asarray(values, dtype=np.uint32) & np.uint32(mask), return_counts=True)
+        counts.update(dict(zip(networks.tolist(), hits.tolist())))
+    else:
+        # Count raw addresses in C first, then mask once per distinct address
+        for value, hits in Counter(values).items():
+            counts[value & mask] += hits
+
+    if packed6:
+        mask6 = prefix_mask(prefix6, 128)
+        for address, hits in Counter(packed6).items():
+            counts[(int.from_bytes(address, 'big') & mask6) | _IPV6_TAG] += hits
+    return counts
+
+def format_key(key, prefix=24, prefix6=64):
+    """Format a counter key as a CIDR string."""
+    if key & _IPV6_TAG:
+        return format_network(key ^ _IPV6_TAG, prefix6, 128)
+    return format_network(key, prefix)
+
+class NetworkCounter:
+    """Exact hit counts per network."""
+
+    def __init__(self, prefix=24, prefix6=64, rejects=None):
+        self.prefix = prefix
+        self.prefix6 = prefix6
+        self.rejects = rejects if rejects is not None else RejectLog()
+        self.counts = Counter()
+
+    def add(self, data):
+        """Count the networks of a chunk of separated addresses."""
+        values, packed6, invalid = parse_ip(data)
+        self.rejects.extend(invalid)
+        self.update(count_networks(values, packed6, self.prefix, self.prefix6))
+
+    def update(self, counts):
+        """Merge a Counter of network keys."""
+        self.counts.update(counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def top(self, k=None):
+        """Return the k most hit networks as (cidr, count, error) tuples.
+
+        The error is always 0 for exact counts.
+        """
+        return [(format_key(key, self.prefix, self.prefix6), hits, 0)
+                for key, hits in self.counts.most_common(k)]
+
+class SpaceSavingCounter:
+    """Approximate heavy hitters in a fixed number of counters.
+
+    Any network hit more than total/capacity times is guaranteed to be
+    tracked. Reported counts never undercount and overcount by at most
+    the reported error.
+    """
+
+    def __init__(self, capacity, prefix=24, prefix6=64, rejects=None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.prefix = prefix
+        self.prefix6 = prefix6
+        self.rejects = rejects if rejects is not None else RejectLog()
+        self.counts = {}
+        self.errors = {}
+        # Min-heap of (count, key); entries go stale when a count grows
+        self._heap = []
+
+    def _pop_min(self):
+        while True:
+            hits, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == hits:
+                return hits, key
+            if key in self.counts:
+                heapq.heappush(self._heap, (self.counts[key], key))
+
+    def add(self, data):
+        """Count the networks of a chunk of separated addresses."""
+        values, packed6, invalid = parse_ip(data)
+        self.rejects.extend(invalid)
+        self.update(count_networks(values, packed6, self.prefix, self.prefix6))
+
+    def update(self, counts):
+        """Merge a Counter of network keys, evicting the smallest counters when full."""
+        # Heaviest first, so a chunk's own light keys are the ones evicted
+        for key, hits in sorted(counts.items(), key=lambda item: -item[1]):
+            if key in self.counts:
+                self.counts[key] += hits
+                continue
+            error = 0
+            if len(self.counts) >= self.capacity:
+                error, evicted = self._pop_min()
+                del self.counts[evicted]
+                del self.errors[evicted]
+            self.counts[key] = error + hits
+            self.errors[key] = error
+            heapq.heappush(self._heap, (self.counts[key], key))
+        # Rebuild the heap once it holds mostly stale entries
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(hits, key) for key, hits in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def top(self, k=None):
+        """Return the k most hit networks as (cidr, count, error) tuples."""
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+        return [(format_key(key, self.prefix, self.prefix6), hits, self.errors[key]) for key, hits in ranked]
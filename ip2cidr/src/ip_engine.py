@@ -0,0 +1,497 @@
+"""Integer-packed conversion engine for IPv4 and IPv6 addresses.
+
+Addresses are parsed a whole chunk at a time into integers, masked to the
+network prefix and deduplicated as integers. Only the surviving networks are
+formatted back into strings at the end.
+
+IPv4 addresses are 32-bit integers. When NumPy is installed the chunk is parsed
+with vectorized operations on its raw bytes; otherwise addresses are packed with
+``socket.inet_pton`` into an ``array('I')``. Tokens that are not IPv4 but
+contain a colon are packed as IPv6 and keyed by 128-bit integers.
+"""
+
+import socket
+import sys
+from array import array
+from functools import partial
+
+from ip_rejects import RejectLog
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the array path is used without it
+    np = None
+
+_pton4 = partial(socket.inet_pton, socket.AF_INET)
+_pton6 = partial(socket.inet_pton, socket.AF_INET6)
+
+# Address width in bits for each IP version
+BITS = {4: 32, 6: 128}
+
+# Characters that separate addresses in the input
+SEPARATORS = b', \t\r\n'
+
+# Decimal string of every octet value, for formatting networks in bulk
+_OCTET_STRINGS = [str(octet) for octet in range(256)]
+
+# Position of each octet value's string among the sorted strings
+_RANKED_OCTETS = sorted(range(256), key=str)
+_OCTET_RANKS = [0] * 256
+for _rank, _octet in enumerate(_RANKED_OCTETS):
+    _OCTET_RANKS[_octet] = _rank
+if np is not None:
+    _OCTET_RANKS = np.array(_OCTET_RANKS, dtype=np.uint32)
+    # Each octet's string followed by a dot, and alone, as NUL-padded
+    # 4-byte words in rank order, for writing networks out in bulk
+    _RANKED_WORDS = np.frombuffer(b''.join(f"{octet}.".encode().ljust(4, b'\0') for octet in _RANKED_OCTETS),
+                                  dtype='<u4')
+    _RANKED_LAST_WORDS = np.frombuffer(b''.join(str(octet).encode().ljust(4, b'\0') for octet in _RANKED_OCTETS),
+                                       dtype='<u4')
+    # The same for every pair of octets, indexed by their two ranks, so
+    # half an address is written at once
+    _RANKED_PAIRS = (_RANKED_WORDS.astype(np.uint64)[:, None]
+                     | _RANKED_WORDS.astype(np.uint64) << np.uint64(32)).astype('<u8').ravel()
+    _RANKED_LAST_PAIRS = (_RANKED_WORDS.astype(np.uint64)[:, None]
+                          | _RANKED_LAST_WORDS.astype(np.uint64) << np.uint64(32)).astype('<u8').ravel()
+    # What each byte does when it ends a field: 2 for a separator, 1 for a
+    # dot and 0 for anything else
+    _FIELD_ENDS = np.zeros(256, dtype=np.uint8)
+    _FIELD_ENDS[list(SEPARATORS)] = 2
+    _FIELD_ENDS[0x0B:0x0D] = 2  # Vertical tab and form feed, which split() also skips
+    _FIELD_ENDS[ord('.')] = 1
+    # Smallest value a field may hold without a leading zero, by the distance
+    # from the delimiter before it to the one after it; empty fields and
+    # fields over three digits can never reach theirs
+    _FIELD_FLOORS = np.array([256, 256, 0, 10, 100, 256], dtype=np.int16)
+
+# Addresses an aggregator holds back before merging them into its sorted networks
+MERGE_BATCH = 1 << 20
+
+def split_addresses(text):
+    """Split text on commas and whitespace into non-empty tokens."""
+    return text.replace(',', ' ').split()
+
+def pack_ipv4(tokens):
+    """Parse IPv4 address strings into an array('I') of host-order integers.
+
+    Returns a tuple of (values, invalid) where invalid lists the tokens that
+    could not be parsed.
+    """
+    invalid = []
+    try:
+        # Fast path: the whole batch is valid and parsed in C
+        packed = b''.join(map(_pton4, tokens))
+    except OSError:
+        valid = []
+        for token in tokens:
+            try:
+                valid.append(_pton4(token))
+            except OSError:
+                invalid.append(token)
+        packed = b''.join(valid)
+
+    values = array('I')
+    values.frombytes(packed)
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values, invalid
+
+def pack_ipv6(tokens):
+    """Parse IPv6 address strings into a list of 16-byte packed addresses.
+
+    Returns a tuple of (packed, invalid) where invalid lists the tokens that
+    could not be parsed.
+    """
+    try:
+        return list(map(_pton6, tokens)), []
+    except OSError:
+        pass
+    packed = []
+    invalid = []
+    for token in tokens:
+        try:
+            packed.append(_pton6(token))
+        except OSError:
+            invalid.append(token)
+    return packed, invalid
+
+def _parse_ipv4_numpy(data):
+    """Parse a bytes buffer of separated IPv4 addresses with NumPy.
+
+    Applies the same rules as ``inet_pton``: exactly four dot-separated
+    decimal octets, each 0-255 without leading zeros. The work is done per
+    field, the run of bytes before each dot or separator, so the buffer
+    itself is only scanned twice.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    size = len(buf)
+    if not size:
+        return np.empty(0, dtype=np.uint32), []
+
+    # Every byte below '0' ends a field: dots, separators and other
+    # punctuation. Separators before and after the buffer close both ends.
+    inner = np.flatnonzero(buf < 0x30)
+    delims = np.empty(len(inner) + 2, dtype=inner.dtype)
+    delims[0] = -1
+    delims[1:-1] = inner
+    delims[-1] = size
+    kinds = _FIELD_ENDS.take(buf.take(delims, mode='clip'))
+    kinds[0] = kinds[-1] = 2
+    seps = np.flatnonzero(kinds == 2)
+    first = seps[:-1]
+    starts = delims[first] + 1
+    ends = delims[seps[1:]]
+
+    # Field i is the run of bytes before delimiter i + 1. Its last three
+    # digits are read through shifted views of the digit values, padded so
+    # a field at the start can look back three bytes. Delimiters read as
+    # zero, so the byte before a one-digit field adds nothing; only the
+    # hundreds have to be dropped for fields shorter than three digits.
+    digits = np.zeros(size + 3, dtype=np.uint8)
+    np.maximum(buf, 0x30, out=digits[3:])
+    digits[3:] -= 0x30
+    last = delims[1:]
+    span = np.diff(delims)
+    value = digits[2:].take(last).astype(np.int16)
+    value += np.multiply(digits[1:].take(last), 10, dtype=np.int16)
+    value += np.multiply(digits.take(last) * (span > 3), 100, dtype=np.int16)
+
+    # Fields of one to three digits, at most 255, without a leading zero,
+    # ended by a dot or a separator
+    floor = _FIELD_FLOORS.take(span, mode='clip')
+    bad = (value < floor) | (value > 255) | (kinds[1:] == 0)
+
+    # A dotted quad is a token of exactly four good fields. Bytes above '9'
+    # are inside fields, so the tokens holding them are ruled out apart.
+    valid = np.diff(seps) == 4
+    valid[np.searchsorted(first, np.flatnonzero(bad), side='right') - 1] = False
+    if buf.max() > 0x39:
+        valid[np.searchsorted(starts, np.flatnonzero(buf > 0x39), side='right') - 1] = False
+
+    index = first[valid]
+    if len(index) and index[-1] == 4 * (len(index) - 1):
+        # The valid tokens follow each other from the start, so their fields line up
+        octets = value[:4 * len(index)].astype(np.uint8)
+    else:
+        octets = value.take(index[:, None] + np.arange(4)).astype(np.uint8)
+    values = octets.view('>u4').ravel().astype(np.uint32)
+
+    rejected = (ends > starts) & ~valid
+    invalid = [
+        bytes(data[start:end]).decode('utf-8', 'replace')
+        for start, end in zip(starts[rejected].tolist(), ends[rejected].tolist())
+    ]
+    return values, invalid
+
+def parse_ipv4(data):
+    """Parse a chunk of comma- or whitespace-separated IPv4 addresses.
+
+    data may be str or any bytes-like object, such as a memoryview over a
+    memory-mapped file. Returns a tuple of (values, invalid) where values
+    holds the addresses as 32-bit integers and invalid lists the rejected tokens.
+    """
+    if np is not None:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return _parse_ipv4_numpy(data)
+    if not isinstance(data, str):
+        data = bytes(data).decode('utf-8', 'replace')
+    return pack_ipv4(split_addresses(data))
+
+def parse_ip(data):
+    """Parse a chunk of comma- or whitespace-separated IPv4 and IPv6 addresses.
+
+    Returns a tuple of (values, packed6, invalid): the IPv4 addresses as 32-bit
+    integers, the IPv6 addresses as 16-byte packed strings and the rejected
+    tokens.
+    """
+    values, rejected = parse_ipv4(data)
+    if not rejected:
+        return values, [], rejected
+
+    # Only tokens that failed as IPv4 are tried as IPv6
+    candidates = [token for token in rejected if ':' in token]
+    packed6, invalid6 = pack_ipv6(candidates)
+    if len(candidates) == len(rejected):
+        return values, packed6, invalid6
+    bad = set(invalid6)
+    invalid = [token for token in rejected if ':' not in token or token in bad]
+    return values, packed6, invalid
+
+def prefix_mask(prefix, bits=32):
+    """Return the netmask for a prefix length on an address of the given width."""
+    full = (1 << bits) - 1
+    return (full << (bits - prefix)) & full
+
+def _first_of_runs(values):
+    """Return a mask of the elements of a sorted array that differ from the one before."""
+    first = np.empty(len(values), dtype=bool)
+    first[:1] = True
+    np.not_equal(values[1:], values[:-1], out=first[1:])
+    return first
+
+def _network_set(values, mask):
+    """Return the set of networks of some addresses, without NumPy."""
+    # Deduplicate the raw addresses first so the Python-level mask only
+    # runs once per distinct address.
+    return {value & mask for value in set(values)}
+
+def unique_networks(values, prefix=24, ordered=False):
+    """Mask addresses to their network and return the unique networks.
+
+    The result is sorted, or in first-seen order when ordered is true.
+    """
+    mask = prefix_mask(prefix)
+    if np is not None:
+        masked = np.asarray(values, dtype=np.uint32) & np.uint32(mask)
+        # Sorting and dropping repeats avoids np.unique, whose first call
+        # imports numpy.ma and costs more than converting a small input
+        if not ordered:
+            masked.sort()
+            return masked[_first_of_runs(masked)].tolist()
+        order = np.argsort(masked, kind='stable')
+        first = _first_of_runs(masked[order])
+        return masked[np.sort(order[first])].tolist()
+    if not ordered:
+        return sorted(_network_set(values, mask))
+    return list(dict.fromkeys(value & mask for value in dict.fromkeys(values)))
+
+def unique_networks6(packed, prefix=64, ordered=False):
+    """Mask packed IPv6 addresses to their network and return the unique 128-bit networks.
+
+    The result is sorted, or in first-seen order when ordered is true.
+    """
+    mask = prefix_mask(prefix, 128)
+    from_bytes = int.from_bytes
+    # The packed strings are deduplicated in C before any integer work
+    networks = dict.fromkeys(from_bytes(address, 'big') & mask for address in dict.fromkeys(packed))
+    return list(networks) if ordered else sorted(networks)
+
+def merge_intervals(intervals):
+    """Merge sorted [start, end) intervals that overlap or touch."""
+    merged = []
+    current_start = current_end = None
+    for start, end in intervals:
+        if current_end is not None and start <= current_end:
+            if end > current_end:
+                current_end = end
+            continue
+        if current_end is not None:
+            merged.append((current_start, current_end))
+        current_start, current_end = start, end
+    if current_end is not None:
+        merged.append((current_start, current_end))
+    return merged
+
+def range_to_cidrs(start, end, bits=32):
+    """Split the address range [start, end) into the fewest aligned CIDR blocks.
+
+    Returns a list of (network, prefix) pairs.
+    """
+    blocks = []
+    while start < end:
+        # Largest block that is aligned at start and does not pass end
+        size = start & -start if start else 1 << bits
+        while size > end - start:
+            size >>= 1
+        blocks.append((start, bits - size.bit_length() + 1))
+        start += size
+    return blocks
+
+def collapse_networks(networks, prefix=24, bits=32):
+    """Collapse sorted networks of one prefix length into the smallest covering set.
+
+    Adjacent and overlapping networks are merged with a single sorted-interval
+    pass, then each merged range is split back into aligned CIDR blocks.
+    Returns a list of (network, prefix) pairs.
+    """
+    size = 1 << (bits - prefix)
+    blocks = []
+    for start, end in merge_intervals([(network, network + size) for network in networks]):
+        if end - start == size:
+            # A lone network is already its own block
+            blocks.append((start, prefix))
+        else:
+            blocks.extend(range_to_cidrs(start, end, bits))
+    return blocks
+
+def format_network(network, prefix=24, bits=32):
+    """Format an integer network address as CIDR notation."""
+    if bits == 32:
+        return f"{socket.inet_ntoa(network.to_bytes(4, 'big'))}/{prefix}"
+    return f"{socket.inet_ntop(socket.AF_INET6, network.to_bytes(16, 'big'))}/{prefix}"
+
+def format_networks(networks, prefix=24, bits=32):
+    """Format integer network addresses as a list of CIDR strings."""
+    if bits != 32:
+        return [format_network(network, prefix, bits) for network in networks]
+    octets = _OCTET_STRINGS
+    suffix = f"/{prefix}"
+    return [f"{octets[network >> 24]}.{octets[network >> 16 & 255]}.{octets[network >> 8 & 255]}."
+            f"{octets[network & 255]}{suffix}" for network in networks]
+
+def cidr_text(networks, prefix=24, separator='\n'):
+    """Return IPv4 networks as CIDR strings joined by separator, sorted as ip_to_cidr sorts them.
+
+    '.' and '/' sort before every digit, so the strings sort like the tuples
+    of their octet strings. With NumPy, the networks are ordered by the rank
+    of each octet's string and written as rows of NUL-padded words, which
+    are squeezed into the text in one pass, so no string is built per
+    network.
+    """
+    tail = f"/{prefix}{separator}".encode('utf-8')
+    if np is None or b'\0' in tail:
+        return separator.join(sorted(format_networks(networks, prefix)))
+    if isinstance(networks, np.ndarray):
+        values = networks.astype(np.uint32, copy=False)
+    else:
+        values = np.fromiter(networks, dtype=np.uint32, count=len(networks))
+    if not len(values):
+        return ''
+
+    ranks = _OCTET_RANKS
+    keys = ranks.take(values >> 24) << 24
+    keys |= ranks.take(values >> 16 & 255) << 16
+    keys |= ranks.take(values >> 8 & 255) << 8
+    keys |= ranks.take(values & 255)
+    keys.sort()
+    tail_words = np.frombuffer(tail.ljust(-(-len(tail) // 4) * 4, b'\0'), dtype='<u4')
+    rows = np.empty((len(keys), 4 + len(tail_words)), dtype='<u4')
+    pairs = rows[:, :4].view('<u8')
+    _RANKED_PAIRS.take(keys >> 16, out=pairs[:, 0])
+    _RANKED_LAST_PAIRS.take(keys & 0xFFFF, out=pairs[:, 1])
+    rows[:, 4:] = tail_words
+    text = rows.tobytes().translate(None, b'\0')
+    return text[:len(text) - len(separator.encode('utf-8'))].decode('utf-8')
+
+def sorted_cidrs(networks, prefix=24):
+    """Format IPv4 networks as CIDR strings sorted as strings, the order ip_to_cidr gives."""
+    if np is None:
+        return sorted(format_networks(networks, prefix))
+    return cidr_text(networks, prefix).split('\n') if len(networks) else []
+
+class NetworkAggregator:
+    """Accumulate unique IPv4 and IPv6 networks from chunks of separated addresses.
+
+    With ordered set, ``add`` returns new networks in the order they first
+    appear, at the cost of a stable sort per chunk. Otherwise, with NumPy,
+    the IPv4 networks are kept as a sorted array and each chunk's masked
+    addresses are held back and merged in batches of at least MERGE_BATCH,
+    so memory stays proportional to the number of unique networks. Rejected
+    tokens are recorded in ``rejects``, a RejectLog.
+    """
+
+    def __init__(self, prefix=24, prefix6=64, ordered=False, rejects=None):
+        self.prefix = prefix
+        self.prefix6 = prefix6
+        self.ordered = ordered
+        self.rejects = rejects if rejects is not None else RejectLog()
+        self._networks = set()
+        self._networks6 = set()
+        self._sorted = None if ordered or np is None else np.empty(0, dtype=np.uint32)
+        self._pending = []
+        self._pending_size = 0
+
+    def _merge(self, networks, seen):
+        new = [network for network in networks if network not in seen]
+        seen.update(new)
+        return new
+
+    def _hold(self, networks):
+        self._pending.append(networks)
+        self._pending_size += len(networks)
+        if self._pending_size > max(len(self._sorted), MERGE_BATCH):
+            self._flush()
+
+    def _flush(self):
+        """Merge the held-back networks into the sorted array and return it."""
+        if self._pending:
+            merged = np.concatenate([self._sorted] + self._pending)
+            merged.sort()
+            self._sorted = merged[_first_of_runs(merged)]
+            self._pending = []
+            self._pending_size = 0
+        return self._sorted
+
+    def _ipv4(self):
+        return self._flush() if self._sorted is not None else self._networks
+
+    def add(self, data):
+        """Add a chunk of addresses.
+
+        With ordered set, returns the (IPv4, IPv6) networks not seen before;
+        otherwise returns None, so nothing is looked up per chunk.
+        """
+        values, packed6, invalid = parse_ip(data)
+        self.rejects.extend(invalid)
+
+        if not self.ordered:
+            if self._sorted is not None:
+                self._hold(values & np.uint32(prefix_mask(self.prefix)))
+            else:
+                self._networks.update(_network_set(values, prefix_mask(self.prefix)))
+            if packed6:
+                self._networks6.update(unique_networks6(packed6, self.prefix6))
+            return None
+
+        new = self._merge(unique_networks(values, self.prefix, ordered=True), self._networks)
+        new6 = []
+        if packed6:
+            new6 = self._merge(unique_networks6(packed6, self.prefix6, ordered=True), self._networks6)
+        return new, new6
+
+    def update(self, networks, networks6=()):
+        """Merge networks already masked to this aggregator's prefixes."""
+        if self._sorted is not None:
+            self._hold(np.asarray(networks, dtype=np.uint32))
+        else:
+            self._networks.update(networks)
+        self._networks6.update(networks6)
+
+    def __len__(self):
+        return len(self._ipv4()) + len(self._networks6)
+
+    def networks(self):
+        """Return the unique IPv4 networks as sorted integers."""
+        if self._sorted is not None:
+            return self._flush().tolist()
+        return sorted(self._networks)
+
+    def networks6(self):
+        """Return the unique IPv6 networks as sorted integers."""
+        return sorted(self._networks6)
+
+    def cidrs(self):
+        """Return the unique networks as CIDR strings.
+
+        IPv4 networks come first, sorted like ip_to_cidr, followed by IPv6
+        networks in address order.
+        """
+        return sorted_cidrs(self._ipv4(), self.prefix) + format_networks(self.networks6(), self.prefix6, 128)
+
+    def cidrs_text(self, separator='\n'):
+        """Return the networks of ``cidrs`` joined by separator, as the command line prints them."""
+        text = cidr_text(self._ipv4(), self.prefix, separator)
+        cidrs6 = format_networks(self.networks6(), self.prefix6, 128)
+        return separator.join(([text] if text else []) + cidrs6)
+
+    def collapsed_cidrs(self):
+        """Return the smallest set of CIDR strings covering every network, in address order."""
+        blocks = [format_network(network, prefix)
+                  for network, prefix in collapse_networks(self.networks(), self.prefix)]
+        blocks.extend(format_network(network, prefix, 128)
+                      for network, prefix in collapse_networks(self.networks6(), self.prefix6, 128))
+        return blocks
+
+def ip_to_cidr_fast(ip_list, prefix=24, prefix6=64, rejects=None):
+    """Convert a comma-separated list of IP addresses using the integer engine.
+
+    For valid IPv4 addresses the result is identical to ``ip_to_cidr``. IPv6
+    networks follow the IPv4 ones in address order. Invalid tokens are
+    recorded in rejects if given, otherwise summarised on stderr.
+    """
+    aggregator = NetworkAggregator(prefix, prefix6, rejects=rejects)
+    aggregator.add(ip_list)
+    if rejects is None:
+        aggregator.rejects.report()
+    return aggregator.cidrs()
@@ -0,0 +1,257 @@
+"""CIDR membership index answering which network an address falls in.
+
+Networks are flattened into disjoint, sorted address ranges, each labelled
+with the most specific network that covers it. A lookup is a binary search
+over the range starts, so it runs in O(log n). The index can be saved to a
+compact binary file that loads with a few ``array.frombytes`` calls.
+"""
+
+import json
+import socket
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from ip_engine import BITS, format_network, np, prefix_mask
+
+# File signature and header layout of a saved index
+MAGIC = b'IP2CIDX1'
+_HEADER = struct.Struct('<I')
+
+def parse_cidr(cidr):
+    """Parse 'address/prefix' into (version, network, prefix).
+
+    A missing prefix means a single host. Host bits are cleared.
+    """
+    address, _, prefix = cidr.strip().partition('/')
+    version = 6 if ':' in address else 4
+    bits = BITS[version]
+    family = socket.AF_INET6 if version == 6 else socket.AF_INET
+    try:
+        value = int.from_bytes(socket.inet_pton(family, address), 'big')
+        prefix = int(prefix) if prefix else bits
+    except (OSError, ValueError):
+        raise ValueError(f"Invalid network: {cidr}")
+    if not 0 <= prefix <= bits:
+        raise ValueError(f"Invalid network: {cidr}")
+    return version, value & prefix_mask(prefix, bits), prefix
+
+def parse_address(address):
+    """Parse an address string into (version, integer), or None if it is invalid."""
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, address), 'big')
+        except OSError:
+            continue
+    return None
+
+def flatten_blocks(blocks, bits):
+    """Turn (network, prefix) blocks into disjoint (start, last, block_index) ranges.
+
+    CIDR blocks are either nested or disjoint, so a stack sweep over the
+    blocks sorted by start and size assigns every address to the most
+    specific block that contains it. blocks must not contain duplicates.
+    """
+    order = sorted(range(len(blocks)), key=lambda i: (blocks[i][0], blocks[i][1]))
+    ranges = []
+    stack = []  # (end, block_index) of the open enclosing blocks
+    cursor = 0
+
+    def emit(upto):
+        if stack and cursor < upto:
+            ranges.append((cursor, upto - 1, stack[-1][1]))
+
+    for index in order:
+        start, prefix = blocks[index]
+        end = start + (1 << (bits - prefix))
+        while stack and stack[-1][0] <= start:
+            emit(stack[-1][0])
+            cursor = stack.pop()[0]
+        emit(start)
+        stack.append((end, index))
+        cursor = start
+    while stack:
+        emit(stack[-1][0])
+        cursor = stack.pop()[0]
+    return ranges
+
+class _FamilyIndex:
+    """Sorted ranges for one address family."""
+
+    def __init__(self, version):
+        self.version = version
+        self.bits = BITS[version]
+        self.starts = []
+        self.lasts = []
+        self.labels = []
+        self.networks = []
+        self.prefixes = []
+        self._arrays = None
+
+    def build(self, blocks):
+        blocks = list(dict.fromkeys(blocks))
+        self.networks = [network for network, _ in blocks]
+        self.prefixes = [prefix for _, prefix in blocks]
+        ranges = flatten_blocks(blocks, self.bits)
+        self.starts = [start for start, _, _ in ranges]
+        self.lasts = [last for _, last, _ in ranges]
+        self.labels = [label for _, _, label in ranges]
+        if self.version == 4:
+            self.starts = array('I', self.starts)
+            self.lasts = array('I', self.lasts)
+        self._arrays = None
+        return self
+
+    def find(self, value):
+        """Return the block index containing value, or -1."""
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.lasts[i]:
+            return self.labels[i]
+        return -1
+
+    def find_many(self, values):
+        """Return the block index for each value, or -1, using NumPy when available."""
+        if np is None or self.version != 4 or not len(self.starts):
+            return [self.find(value) for value in values]
+        if self._arrays is None:
+            self._arrays = (
+                np.frombuffer(self.starts, dtype=np.uint32),
+                np.frombuffer(self.lasts, dtype=np.uint32),
+                np.asarray(self.labels, dtype=np.int64),
+            )
+        starts, lasts, labels = self._arrays
+        values = np.asarray(values, dtype=np.uint32)
+        i = np.searchsorted(starts, values, side='right') - 1
+        hit = (i >= 0) & (values <= lasts[np.maximum(i, 0)])
+        return np.where(hit, labels[np.maximum(i, 0)], -1).tolist()
+
+    def cidr(self, label):
+        return format_network(self.networks[label], self.prefixes[label], self.bits)
+
+    def to_bytes(self):
+        width = self.bits // 8
+        if self.version == 4:
+            parts = [array('I', self.starts), array('I', self.lasts), array('I', self.networks)]
+            body = b''.join(part.tobytes() for part in parts)
+        else:
+            body = b''.join(
+                b''.join(value.to_bytes(width, 'big') for value in values)
+                for values in (self.starts, self.lasts, self.networks)
+            )
+        return body + array('I', self.labels).tobytes() + array('B', self.prefixes).tobytes()
+
+    def from_bytes(self, data, ranges, blocks):
+        width = self.bits // 8
+        offset = 0
+
+        def take(count, typecode=None):
+            nonlocal offset
+            size = count * (width if typecode is None else array(typecode).itemsize)
+            chunk = data[offset:offset + size]
+            offset += size
+            if typecode is not None:
+                values = array(typecode)
+                values.frombytes(chunk)
+                return values
+            return [int.from_bytes(chunk[i:i + width], 'big') for i in range(0, size, width)]
+
+        if self.version == 4:
+            self.starts = take(ranges, 'I')
+            self.lasts = take(ranges, 'I')
+            self.networks = take(blocks, 'I').tolist()
+        else:
+            self.starts = take(ranges)
+            self.lasts = take(ranges)
+            self.networks = take(blocks)
+        self.labels = take(ranges, 'I').tolist()
+        self.prefixes = take(blocks, 'B').tolist()
+        self._arrays = None
+        return offset
+
+class CidrIndex:
+    """Longest-prefix membership index over IPv4 and IPv6 networks."""
+
+    def __init__(self, cidrs=()):
+        blocks = {4: [], 6: []}
+        for cidr in cidrs:
+            version, network, prefix = parse_cidr(cidr)
+            blocks[version].append((network, prefix))
+        self._families = {version: _FamilyIndex(version).build(blocks[version]) for version in BITS}
+
+    @classmethod
+    def from_aggregator(cls, aggregator):
+        """Build an index from the networks collected by a NetworkAggregator."""
+        index = cls()
+        index._families[4].build([(network, aggregator.prefix) for network in aggregator.networks()])
+        index._families[6].build([(network, aggregator.prefix6) for network in aggregator.networks6()])
+        return index
+
+    def __len__(self):
+        return sum(len(family.networks) for family in self._families.values())
+
+    def lookup(self, address):
+        """Return the most specific network containing address as a CIDR string, or None."""
+        parsed = parse_address(address.strip())
+        if parsed is None:
+            return None
+        family = self._families[parsed[0]]
+        label = family.find(parsed[1])
+        return family.cidr(label) if label >= 0 else None
+
+    def lookup_many(self, addresses):
+        """Return the matching network (or None) for each address, in order."""
+        results = [None] * len(addresses)
+        pending = {4: ([], []), 6: ([], [])}
+        for position, address in enumerate(addresses):
+            parsed = parse_address(address.strip())
+            if parsed is not None:
+                positions, values = pending[parsed[0]]
+                positions.append(position)
+                values.append(parsed[1])
+
+        for version, (positions, values) in pending.items():
+            family = self._families[version]
+            cache = {}
+            for position, label in zip(positions, family.find_many(values)):
+                if label >= 0:
+                    if label not in cache:
+                        cache[label] = family.cidr(label)
+                    results[position] = cache[label]
+        return results
+
+    def save(self, path):
+        """Write the index to path in a compact binary form."""
+        families = [self._families[4], self._families[6]]
+        header = json.dumps({
+            'byteorder': sys.byteorder,
+            'ranges': [len(family.starts) for family in families],
+            'blocks': [len(family.networks) for family in families],
+        }).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER.pack(len(header)))
+            f.write(header)
+            for family in families:
+                f.write(family.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"Not an ip2cidr index file: {path}")
+        offset = len(MAGIC)
+        (length,) = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        header = json.loads(data[offset:offset + length])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"Index file {path} was written on a machine with a different byte order")
+        offset += length
+
+        index = cls()
+        view = memoryview(data)
+        for version, ranges, blocks in zip((4, 6), header['ranges'], header['blocks']):
+            offset += index._families[version].from_bytes(view[offset:], ranges, blocks)
+        return index
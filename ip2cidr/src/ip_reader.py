@@ -0,0 +1,160 @@
+"""Streaming readers that yield IP address tokens from files and stdin.
+
+Regular files are memory-mapped and handed to the engine as memoryview slices,
+so no per-line Python strings are built. Pages are released once a chunk has
+been parsed, which keeps resident memory flat however large the file is.
+"""
+
+import mmap
+import os
+import sys
+
+# Read size used when pulling text from an input stream
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+# Largest page cache folio a fault can map at once: a PMD-sized huge page on x86-64
+MAX_FOLIO_SIZE = 2 << 20
+
+def split_tokens(text):
+    """Split newline- or comma-separated text into stripped, non-empty tokens."""
+    return list(filter(None, map(str.strip, text.replace('\n', ',').split(','))))
+
+def iter_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield text chunks read from a stream, each ending on a separator.
+
+    Tokens may be separated by newlines or commas. A token that straddles a
+    chunk boundary is carried over to the next chunk, so memory use is bounded
+    by the chunk size rather than the size of the input.
+    """
+    remainder = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = remainder + chunk
+        # Keep the trailing partial token for the next chunk
+        cut = max(text.rfind(','), text.rfind('\n'))
+        if cut == -1:
+            remainder = text
+            continue
+        remainder = text[cut + 1:]
+        yield text[:cut + 1]
+
+    if remainder:
+        yield remainder
+
+def iter_text_chunks(paths, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield text chunks from each path in turn; '-' reads from stdin."""
+    for path in paths:
+        if path == '-':
+            yield from iter_chunks(sys.stdin, chunk_size)
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_chunks(f, chunk_size)
+
+def iter_file_chunks(paths, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield chunks from each path in turn; '-' reads from stdin.
+
+    Files are memory-mapped and yield memoryview chunks; stdin yields text.
+    """
+    for path in paths:
+        if path == '-':
+            yield from iter_chunks(sys.stdin, chunk_size)
+        else:
+            yield from iter_range_chunks(path, chunk_size=chunk_size)
+
+def iter_file_batches(paths, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield IP token batches from each path in turn; '-' reads from stdin."""
+    for chunk in iter_text_chunks(paths, chunk_size):
+        batch = split_tokens(chunk)
+        if batch:
+            yield batch
+
+def _next_boundary(f, offset, size):
+    """Return the offset just past the first separator at or after offset."""
+    f.seek(offset)
+    while offset < size:
+        block = f.read(DEFAULT_CHUNK_SIZE)
+        if not block:
+            break
+        cuts = [i for i in (block.find(b','), block.find(b'\n')) if i != -1]
+        if cuts:
+            return offset + min(cuts) + 1
+        offset += len(block)
+    return size
+
+def shard_ranges(path, shards):
+    """Split a file into up to shards byte ranges that begin and end on separators.
+
+    Returns a list of (start, end) offsets covering the whole file.
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            boundary = _next_boundary(f, max(size * i // shards, bounds[-1]), size)
+            if boundary > bounds[-1]:
+                bounds.append(boundary)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def _advise(mm, advice, start=0, length=None):
+    """Pass a paging hint to the kernel where the platform supports it."""
+    if advice is None or not hasattr(mm, 'madvise'):
+        return
+    # madvise needs a page-aligned start; dropping part of the previous page is harmless
+    aligned = start - start % mmap.PAGESIZE
+    try:
+        if length is None:
+            mm.madvise(advice)
+        else:
+            mm.madvise(advice, aligned, length + start - aligned)
+    except OSError:
+        pass
+
+def _find_separator(mm, start, end, step=DEFAULT_CHUNK_SIZE):
+    """Return the index of the first separator in mm[start:end], or -1."""
+    while start < end:
+        stop = min(start + step, end)
+        cuts = [i for i in (mm.find(b',', start, stop), mm.find(b'\n', start, stop)) if i != -1]
+        if cuts:
+            return min(cuts)
+        start = stop
+    return -1
+
+def iter_range_chunks(path, start=0, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield memoryview chunks from the range [start, end) of a memory-mapped file.
+
+    Each chunk ends on a separator. A chunk is only valid until the next one is
+    requested, after which its view is released and its pages dropped; copy it
+    with bytes() to keep it.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _advise(mm, getattr(mmap, 'MADV_SEQUENTIAL', None))
+            position = start
+            while position < end:
+                limit = min(position + chunk_size, end)
+                if limit < end:
+                    cut = max(mm.rfind(b',', position, limit), mm.rfind(b'\n', position, limit))
+                    if cut == -1:
+                        # A single token longer than the chunk; extend to its end
+                        cut = _find_separator(mm, limit, end)
+                    limit = cut + 1 if cut != -1 else end
+
+                view = memoryview(mm)[position:limit]
+                try:
+                    yield view
+                finally:
+                    view.release()
+                # A fault maps the whole page cache folio around it, so reading this
+                # chunk may have mapped pages of the previous one again; drop from
+                # the start of the largest folio that can hold position
+                dropped = position - position % MAX_FOLIO_SIZE
+                _advise(mm, getattr(mmap, 'MADV_DONTNEED', None), dropped, limit - dropped)
+                position = limit
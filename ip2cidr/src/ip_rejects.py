@@ -0,0 +1,86 @@
+"""Collection and reporting of rejected input tokens.
+
+Rejected tokens are gathered a chunk at a time instead of being printed one
+per line, so dirty input does not slow a run down. A ``RejectLog`` counts the
+rejects by reason, keeps a few examples for the summary and can write every
+rejected token to a rejects file in bulk.
+"""
+
+import sys
+from collections import Counter
+
+# Reasons a token is rejected
+WRONG_OCTET_COUNT = 'wrong number of octets'
+NON_NUMERIC = 'non-numeric octet'
+LEADING_ZERO = 'leading zero'
+OUT_OF_RANGE = 'octet out of range'
+INVALID_IPV6 = 'invalid IPv6 address'
+
+# Examples kept for the summary
+MAX_SAMPLES = 5
+
+def classify_invalid(token):
+    """Return the reason a token is not a valid IP address."""
+    if ':' in token:
+        return INVALID_IPV6
+    octets = token.split('.')
+    if len(octets) != 4:
+        return WRONG_OCTET_COUNT
+    if '' in octets or not token.isascii() or not ''.join(octets).isdigit():
+        return NON_NUMERIC
+    if any(len(octet) > 1 and octet[0] == '0' for octet in octets):
+        return LEADING_ZERO
+    return OUT_OF_RANGE
+
+class RejectLog:
+    """Rejected tokens counted by reason, optionally written to a text stream.
+
+    Each line written to out holds a token and its reason, separated by a tab.
+    """
+
+    def __init__(self, out=None, max_samples=MAX_SAMPLES):
+        self.out = out
+        self.max_samples = max_samples
+        self.counts = Counter()
+        self.samples = []
+
+    def extend(self, tokens):
+        """Record a chunk of rejected tokens."""
+        if not tokens:
+            return
+        # Dirty input tends to repeat the same bad tokens, so each distinct
+        # token is classified once
+        reason_of = {token: classify_invalid(token) for token in set(tokens)}
+        reasons = list(map(reason_of.__getitem__, tokens))
+        self.counts.update(reasons)
+        if len(self.samples) < self.max_samples:
+            self.samples.extend(tokens[:self.max_samples - len(self.samples)])
+        if self.out is not None:
+            self.out.write(''.join(f"{token}\t{reason}\n" for token, reason in zip(tokens, reasons)))
+
+    def merge(self, counts, samples, lines=''):
+        """Record rejects gathered elsewhere, such as in a worker process."""
+        self.counts.update(counts)
+        if len(self.samples) < self.max_samples:
+            self.samples.extend(samples[:self.max_samples - len(self.samples)])
+        if self.out is not None and lines:
+            self.out.write(lines)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """Return a one-line description of the rejects, or None if there were none."""
+        total = len(self)
+        if not total:
+            return None
+        reasons = ', '.join(f"{count} {reason}" for reason, count in self.counts.most_common())
+        examples = ', '.join(self.samples)
+        noun = 'address' if total == 1 else 'addresses'
+        return f"Skipped {total} invalid IP {noun} ({reasons}), e.g. {examples}"
+
+    def report(self, file=None):
+        """Print the summary to file (stderr by default) if anything was rejected."""
+        summary = self.summary()
+        if summary is not None:
+            print(summary, file=file or sys.stderr)
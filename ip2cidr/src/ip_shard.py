@@ -0,0 +1,47 @@
+"""Multi-process conversion of large files split into byte-range shards."""
+
+import io
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from ip_engine import NetworkAggregator
+from ip_reader import iter_range_chunks, shard_ranges
+from ip_rejects import RejectLog
+
+def convert_shard(path, start, end, prefix=24, prefix6=64, keep_rejects=False):
+    """Convert one byte range of a file in a worker process.
+
+    Returns the shard's IPv4 networks packed as array('I') bytes, its IPv6
+    networks as a list of integers, which keeps the result cheap to pickle,
+    and its rejects as (counts, samples, lines) for RejectLog.merge. lines
+    is only filled in when keep_rejects is true.
+    """
+    rejects = RejectLog(io.StringIO() if keep_rejects else None)
+    aggregator = NetworkAggregator(prefix, prefix6, rejects=rejects)
+    for chunk in iter_range_chunks(path, start, end):
+        aggregator.add(chunk)
+    lines = rejects.out.getvalue() if keep_rejects else ''
+    return (array('I', aggregator.networks()).tobytes(), aggregator.networks6(),
+            (rejects.counts, rejects.samples, lines))
+
+def convert_files_parallel(paths, aggregator, workers):
+    """Convert files with a pool of worker processes, merging into aggregator.
+
+    Each file is split into shards on separator boundaries; the per-shard
+    network sets and rejects are merged in shard order, so the result is
+    identical to the single-process path.
+    """
+    keep_rejects = aggregator.rejects.out is not None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(convert_shard, path, start, end, aggregator.prefix, aggregator.prefix6, keep_rejects)
+            for path in paths
+            for start, end in shard_ranges(path, workers)
+        ]
+        for future in futures:
+            packed, networks6, rejects = future.result()
+            networks = array('I')
+            networks.frombytes(packed)
+            aggregator.update(networks, networks6)
+            aggregator.rejects.merge(*rejects)
+    return aggregator
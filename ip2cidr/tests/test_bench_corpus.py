@@ -0,0 +1,35 @@
+import ipaddress
+
+from benchmarks.corpus import MALFORMED, ensure_corpus, iter_corpus, write_corpus
+
+def test_corpus_is_reproducible(tmp_path):
+    """Test that the same parameters always write the same file."""
+    first = write_corpus(str(tmp_path / "a.txt"), 5000, 0.5, 0.1, 0.2, seed=3)
+    second = write_corpus(str(tmp_path / "b.txt"), 5000, 0.5, 0.1, 0.2, seed=3)
+    with open(first) as f, open(second) as g:
+        assert f.read() == g.read()
+    assert list(iter_corpus(100, seed=1)) != list(iter_corpus(100, seed=2))
+
+def test_corpus_ratios():
+    """Test that duplicates, malformed tokens and IPv6 addresses appear at the requested rates."""
+    tokens = list(iter_corpus(20000, duplicate_ratio=0.75, malformed_rate=0.1, ipv6_ratio=0.5))
+    assert len(tokens) == 20000
+    malformed = [token for token in tokens if token in MALFORMED]
+    valid = [ipaddress.ip_address(token) for token in tokens if token not in MALFORMED]
+    assert abs(len(malformed) / len(tokens) - 0.1) < 0.02
+    assert abs(len(set(valid)) / len(valid) - 0.25) < 0.02
+    assert abs(sum(address.version == 6 for address in valid) / len(valid) - 0.5) < 0.02
+
+def test_distinct_without_duplicates():
+    """Test that a corpus without duplicates never repeats an address."""
+    tokens = list(iter_corpus(10000, ipv6_ratio=0.3))
+    assert len(set(tokens)) == len(tokens)
+
+def test_ensure_corpus_reuses_file(tmp_path):
+    """Test that an existing corpus is not generated again."""
+    path = ensure_corpus(str(tmp_path), 10)
+    with open(path, 'a') as f:
+        f.write("marker\n")
+    assert ensure_corpus(str(tmp_path), 10) == path
+    with open(path) as f:
+        assert f.read().endswith("marker\n")
@@ -0,0 +1,85 @@
+import os
+
+from src.ip_cache import ResultCache, cache_key, digest_bytes
+from src.ip_rejects import RejectLog
+from src.version import __version__
+
+def test_put_and_get(tmp_path):
+    """Test that stored networks are returned unchanged."""
+    cache = ResultCache(str(tmp_path))
+    networks6 = [0x20010DB8 << 96]
+    cache.put("key", [0x0A000000, 0xC0A80100], networks6)
+    assert cache.get("key") == ([0x0A000000, 0xC0A80100], networks6, ({}, []))
+
+def test_put_and_get_rejects(tmp_path):
+    """Test that the rejects summary is stored with the networks."""
+    cache = ResultCache(str(tmp_path))
+    rejects = RejectLog()
+    rejects.extend(["999.1.2.3", "bad", "bad"])
+    cache.put("key", [0x0A000000], rejects=rejects)
+    _, _, (counts, samples) = cache.get("key")
+    replayed = RejectLog()
+    replayed.merge(counts, samples)
+    assert replayed.summary() == rejects.summary()
+
+def test_miss(tmp_path):
+    """Test that an unknown key is a miss."""
+    assert ResultCache(str(tmp_path)).get("missing") is None
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    """Test that a truncated or malformed entry is a miss and is removed."""
+    cache = ResultCache(str(tmp_path))
+    rejects = RejectLog()
+    rejects.extend(["bad"])
+    cache.put("key", [0x0A000000, 0xC0A80100], [1], rejects=rejects)
+    path = tmp_path / "key.bin"
+    entry = path.read_bytes()
+    for data in (b'IP2CRES2\x01', entry[:-1], entry + b'\x00', entry[:-2] + b'{}', b'IP2CRES1' + entry[8:]):
+        path.write_bytes(data)
+        assert cache.get("key") is None
+        assert not path.exists()
+
+def test_key_depends_on_options():
+    """Test that different prefixes or inputs give different keys."""
+    digests = [digest_bytes(b"10.0.0.1")]
+    assert cache_key(digests, 24, 64) != cache_key(digests, 16, 64)
+    assert cache_key(digests, 24, 64) != cache_key(digests, 24, 48)
+    assert cache_key(digests, 24, 64) != cache_key([digest_bytes(b"10.0.0.2")], 24, 64)
+
+def test_key_depends_on_version():
+    """Test that entries written by another release are not reused."""
+    digests = [digest_bytes(b"10.0.0.1")]
+    assert cache_key(digests, 24, 64) == cache_key(digests, 24, 64, __version__)
+    assert cache_key(digests, 24, 64, "0.0.1") != cache_key(digests, 24, 64, "0.0.2")
+
+def test_fingerprint_follows_content(tmp_path):
+    """Test that a file's fingerprint changes with its content but not its path."""
+    cache = ResultCache(str(tmp_path / "cache"))
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text("10.0.0.1\n")
+    second.write_text("10.0.0.1\n")
+    assert cache.fingerprint(str(first)) == cache.fingerprint(str(second))
+    assert cache.fingerprint(str(first)) == cache.fingerprint(str(first))
+
+    first.write_text("10.0.0.2\n")
+    os.utime(first, ns=(0, 1))
+    assert cache.fingerprint(str(first)) != cache.fingerprint(str(second))
+
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used entries are evicted first."""
+    cache = ResultCache(str(tmp_path), max_bytes=1)
+    cache.max_bytes = 10 ** 6
+    for key in ("old", "used", "new"):
+        cache.put(key, list(range(1000)))
+    os.utime(tmp_path / "old.bin", (1, 1))
+    os.utime(tmp_path / "used.bin", (2, 2))
+    os.utime(tmp_path / "new.bin", (3, 3))
+    assert cache.get("used") is not None
+
+    entry_size = os.path.getsize(tmp_path / "new.bin")
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
@@ -1,4 +1,11 @@
+import io
+import sys
+
+import pytest
+
+from src import ip_converter
 from src.ip_converter import ip_to_cidr
+from src.ip_rejects import RejectLog
 
 def test_single_ip():
     """Test converting a single IP address."""
@@ -38,4 +45,139 @@ def test_partial_ip():
 def test_special_ips():
     """Test handling of special IP addresses."""
     result = ip_to_cidr("127.0.0.1,0.0.0.0,255.255.255.255")
-    assert result == ["0.0.0.0/24", "127.0.0.0/24", "255.255.255.0/24"] 
\ No newline at end of file
+    assert result == ["0.0.0.0/24", "127.0.0.0/24", "255.255.255.0/24"]
+
+def test_out_of_range_octets():
+    """Test that octets outside 0-255 or with leading zeros are rejected."""
+    result = ip_to_cidr("999.1.2.3,10.0.0.256,01.2.3.4,192.168.1.100")
+    assert result == ["192.168.1.0/24"]
+
+def test_invalid_summary(capsys):
+    """Test that invalid addresses are reported in a single summary line."""
+    ip_to_cidr("192.168.1.100,invalid.ip,a.b.c.d,10.0.0,10.0.0.1")
+    lines = capsys.readouterr().err.splitlines()
+    assert lines == ["Skipped 3 invalid IP addresses (2 wrong number of octets, 1 non-numeric octet), "
+                     "e.g. invalid.ip, a.b.c.d, 10.0.0"]
+
+def test_invalid_rejects():
+    """Test that invalid addresses are collected instead of printed when a RejectLog is given."""
+    rejects = RejectLog()
+    ip_to_cidr("192.168.1.100,999.1.2.3", rejects=rejects)
+    assert rejects.samples == ["999.1.2.3"]
+
+def run_main(monkeypatch, capsys, *args, stdin=None):
+    """Run the ip2cidr command line with args and return its captured output."""
+    monkeypatch.setattr(sys, 'argv', ['ip2cidr', *args])
+    monkeypatch.setattr(ip_converter, 'send_first_run_stats', lambda **kwargs: None)
+    if stdin is not None:
+        monkeypatch.setattr(sys, 'stdin', io.StringIO(stdin))
+    ip_converter.main()
+    return capsys.readouterr()
+
+@pytest.fixture
+def ips_file(tmp_path):
+    path = tmp_path / "ips.txt"
+    path.write_text("".join(f"10.{i % 7}.{i % 5}.{i}\n" for i in range(200)) + "192.168.1.1,bad\n")
+    return str(path)
+
+def test_main_ips(monkeypatch, capsys):
+    """Test converting addresses given with -i."""
+    captured = run_main(monkeypatch, capsys, '-i', '192.168.1.100,10.0.0.1')
+    assert captured.out == "10.0.0.0/24,192.168.1.0/24\n"
+
+def test_main_file_and_stdin(monkeypatch, capsys, ips_file):
+    """Test that files and stdin give the same networks, with invalid addresses summarised."""
+    from_file = run_main(monkeypatch, capsys, '-f', ips_file, '-s', '\n')
+    with open(ips_file) as f:
+        from_stdin = run_main(monkeypatch, capsys, '-f', '-', '-s', '\n', stdin=f.read())
+    assert from_file.out == from_stdin.out
+    assert from_file.out.splitlines()[-1] == "192.168.1.0/24"
+    assert from_file.err.startswith("Skipped 1 invalid IP address")
+
+def test_main_stream(monkeypatch, capsys):
+    """Test that --stream prints networks in first-seen order."""
+    captured = run_main(monkeypatch, capsys, '--stream', '-i', '192.168.1.1,10.0.0.1,192.168.1.2')
+    assert captured.out == "192.168.1.0/24,10.0.0.0/24\n"
+
+def test_main_prefix_and_collapse(monkeypatch, capsys):
+    """Test -p and --collapse."""
+    captured = run_main(monkeypatch, capsys, '-p', '/16', '-i', '10.1.2.3,10.1.200.1')
+    assert captured.out == "10.1.0.0/16\n"
+    captured = run_main(monkeypatch, capsys, '--collapse', '-i', '10.0.0.1,10.0.1.1,10.0.2.1')
+    assert captured.out == "10.0.0.0/23,10.0.2.0/24\n"
+
+def test_main_invalid_prefix(monkeypatch, capsys):
+    """Test that out-of-range prefixes are rejected by the argument parser."""
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, capsys, '-p', '33', '-i', '10.0.0.1')
+
+def test_main_workers_match_single_process(monkeypatch, capsys, ips_file):
+    """Test that -w 4 prints the same networks as a single process."""
+    single = run_main(monkeypatch, capsys, '-f', ips_file)
+    parallel = run_main(monkeypatch, capsys, '-w', '4', '-f', ips_file)
+    assert parallel.out == single.out
+    assert parallel.err == single.err
+
+def test_main_count(monkeypatch, capsys):
+    """Test --count, --top and --approximate."""
+    ips = '10.0.0.1,10.0.0.2,10.0.0.3,192.168.1.1,192.168.1.2,172.16.0.1'
+    captured = run_main(monkeypatch, capsys, '--count', '-i', ips)
+    assert captured.out == "10.0.0.0/24\t3\n192.168.1.0/24\t2\n172.16.0.0/24\t1\n"
+    captured = run_main(monkeypatch, capsys, '--count', '--top', '1', '-i', ips)
+    assert captured.out == "10.0.0.0/24\t3\n"
+    captured = run_main(monkeypatch, capsys, '--count', '--approximate', '10', '--top', '2', '-i', ips)
+    assert captured.out == "10.0.0.0/24\t3\t0\n192.168.1.0/24\t2\t0\n"
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, capsys, '--top', '1', '-i', ips)
+    for option in ('--top', '--approximate'):
+        for value in ('0', '-1'):
+            with pytest.raises(SystemExit):
+                run_main(monkeypatch, capsys, '--count', option, value, '-i', ips)
+            assert f"{option} must be at least 1" in capsys.readouterr().err
+
+def test_main_cache(monkeypatch, capsys, tmp_path, ips_file):
+    """Test that a cached run prints the same output and rejects summary as an uncached one."""
+    uncached = run_main(monkeypatch, capsys, '-f', ips_file, '--no-cache')
+    first = run_main(monkeypatch, capsys, '-f', ips_file, '--cache-dir', str(tmp_path / "cache"))
+    cached = run_main(monkeypatch, capsys, '-f', ips_file, '--cache-dir', str(tmp_path / "cache"))
+    assert first.out == cached.out == uncached.out
+    # A cache hit reports the invalid addresses of the input like a full run
+    assert first.err == cached.err == uncached.err
+    assert cached.err.startswith("Skipped 1 invalid IP address")
+    assert len(list((tmp_path / "cache").glob("*.bin"))) == 1
+
+def test_main_rejects_file(monkeypatch, capsys, tmp_path):
+    """Test that --rejects writes every invalid address with its reason."""
+    rejects = tmp_path / "rejects.txt"
+    run_main(monkeypatch, capsys, '-i', '10.0.0.1,999.1.1.1,bad', '--rejects', str(rejects))
+    assert rejects.read_text() == "999.1.1.1\toctet out of range\nbad\twrong number of octets\n"
+
+def test_main_lookup(monkeypatch, capsys, tmp_path):
+    """Test that 'ip2cidr lookup' annotates addresses, from networks or a saved index."""
+    networks = tmp_path / "networks.txt"
+    networks.write_text("10.0.0.0/8\n10.1.0.0/16\n")
+    index = tmp_path / "networks.idx"
+    captured = run_main(monkeypatch, capsys, 'lookup', '-n', str(networks), '--save-index', str(index),
+                        '-i', '10.1.2.3,10.2.0.1,192.168.0.1')
+    assert captured.out == "10.1.2.3\t10.1.0.0/16\n10.2.0.1\t10.0.0.0/8\n192.168.0.1\t-\n"
+    assert run_main(monkeypatch, capsys, 'lookup', '--index', str(index), '-f', '-',
+                    stdin="10.1.2.3\n10.2.0.1\n192.168.0.1\n").out == captured.out
+
+def test_main_help_mentions_lookup(monkeypatch, capsys):
+    """Test that ip2cidr --help points to the lookup subcommand."""
+    with pytest.raises(SystemExit):
+        run_main(monkeypatch, capsys, '--help')
+    assert 'ip2cidr lookup' in capsys.readouterr().out
+
+def test_main_lookup_requires_addresses(monkeypatch, capsys, tmp_path):
+    """Test that lookup without addresses is an error unless it only saves an index."""
+    networks = tmp_path / "networks.txt"
+    networks.write_text("10.0.0.0/8\n")
+    with pytest.raises(SystemExit) as exit_info:
+        run_main(monkeypatch, capsys, 'lookup', '-n', str(networks))
+    assert exit_info.value.code == 2
+    assert '--save-index' in capsys.readouterr().err
+
+    index = tmp_path / "networks.idx"
+    run_main(monkeypatch, capsys, 'lookup', '-n', str(networks), '--save-index', str(index))
+    assert index.exists()
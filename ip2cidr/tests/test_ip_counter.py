@@ -0,0 +1,47 @@
+import random
+
+from src.ip_counter import NetworkCounter, SpaceSavingCounter
+
+def test_exact_counts():
+    """Test counting hits per network across chunks."""
+    counter = NetworkCounter()
+    counter.add("192.168.1.100,192.168.1.5,10.0.0.1")
+    counter.add("192.168.1.7\n2001:db8::1,2001:db8::2")
+    assert counter.top() == [("192.168.1.0/24", 3, 0), ("2001:db8::/64", 2, 0), ("10.0.0.0/24", 1, 0)]
+    assert counter.top(1) == [("192.168.1.0/24", 3, 0)]
+
+def test_ipv4_and_ipv6_keys_do_not_collide():
+    """Test that 0.0.0.0/24 and ::/64 are counted separately."""
+    counter = NetworkCounter()
+    counter.add("0.0.0.1,::1,::2")
+    assert sorted(counter.top()) == [("0.0.0.0/24", 1, 0), ("::/64", 2, 0)]
+
+def test_invalid_addresses_are_not_counted():
+    """Test that malformed tokens are skipped."""
+    counter = NetworkCounter()
+    counter.add("192.168.1.100,invalid.ip,999.1.1.1")
+    assert counter.top() == [("192.168.1.0/24", 1, 0)]
+
+def test_space_saving_fixed_memory():
+    """Test that the approximate counter never holds more than its capacity."""
+    counter = SpaceSavingCounter(5)
+    for i in range(50):
+        counter.add(f"10.0.{i}.1")
+    assert len(counter) == 5
+
+def test_space_saving_finds_heavy_hitters():
+    """Test that heavy hitters are reported with counts that never undercount."""
+    rng = random.Random(7)
+    heavy = {"10.0.0.1": 500, "10.0.1.1": 300, "10.0.2.1": 200}
+    ips = [ip for ip, hits in heavy.items() for _ in range(hits)]
+    ips += [f"172.16.{rng.randrange(256)}.1" for _ in range(1000)]
+    rng.shuffle(ips)
+
+    counter = SpaceSavingCounter(20)
+    for start in range(0, len(ips), 100):
+        counter.add(",".join(ips[start:start + 100]))
+
+    top = counter.top(3)
+    assert [cidr for cidr, _, _ in top] == ["10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24"]
+    for (cidr, hits, error), true_hits in zip(top, heavy.values()):
+        assert hits - error <= true_hits <= hits
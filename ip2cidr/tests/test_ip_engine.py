@@ -0,0 +1,164 @@
+import ipaddress
+import random
+
+import pytest
+
+from src import ip_engine
+from src.ip_engine import (
+    NetworkAggregator, collapse_networks, ip_to_cidr_fast, merge_intervals,
+    parse_ip, parse_ipv4, range_to_cidrs, sorted_cidrs, unique_networks, unique_networks6,
+)
+from src.ip_converter import ip_to_cidr
+
+@pytest.fixture(params=['numpy', 'array'])
+def engine(request, monkeypatch):
+    """Run a test against both the NumPy and the array('I') code paths."""
+    if request.param == 'numpy':
+        if ip_engine.np is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(ip_engine, 'np', None)
+    return request.param
+
+def test_matches_reference(engine):
+    """Test that the engine output matches ip_to_cidr for valid addresses."""
+    ips = "192.168.1.100, 10.0.0.1,172.16.5.200,9.9.9.9,192.168.1.7,127.0.0.1,0.0.0.0,255.255.255.255"
+    assert ip_to_cidr_fast(ips) == ip_to_cidr(ips)
+
+def test_sorted_cidrs_sort_as_strings(engine):
+    """Test that bulk-formatted networks come out in the string order ip_to_cidr uses."""
+    networks = {octet << 24 | (octet * 7 % 256) << 16 | (octet * 13 % 256) << 8 for octet in range(256)}
+    networks |= {0x01020300, 0x0A000000, 0x0A640000, 0x64000000}
+    expected = sorted(str(ipaddress.ip_network((network, 24))) for network in networks)
+    assert sorted_cidrs(networks) == expected
+    assert sorted_cidrs(set()) == []
+
+@pytest.mark.parametrize("separator", [",", ", ", "\n", " \u2192 ", "", "\0"])
+def test_cidrs_text(engine, separator):
+    """Test that the joined output matches joining cidrs, whatever the separator."""
+    aggregator = NetworkAggregator(prefix=28)
+    aggregator.add("10.0.0.17,9.255.3.200,100.2.3.4,10.0.0.1,2001:db8::1,10.0.0.18")
+    assert aggregator.cidrs_text(separator) == separator.join(aggregator.cidrs())
+    assert aggregator.cidrs()[:3] == ["10.0.0.0/28", "10.0.0.16/28", "100.2.3.0/28"]
+    assert NetworkAggregator().cidrs_text(separator) == ""
+
+def test_parse_values(engine):
+    """Test that addresses are parsed into 32-bit integers."""
+    values, invalid = parse_ipv4("1.2.3.4\n255.255.255.255 0.0.0.0")
+    assert list(values) == [0x01020304, 0xFFFFFFFF, 0]
+    assert invalid == []
+
+def test_rejects_malformed(engine):
+    """Test that malformed addresses are rejected like inet_pton does."""
+    tokens = ["192.168.1", "999.x.1.2", "256.1.1.1", "01.2.3.4", "1.2.3.4.5", "1..2.3", ".1.2.3", "1.2.3.4."]
+    values, invalid = parse_ipv4(",".join(tokens + ["10.0.0.1"]))
+    assert list(values) == [0x0A000001]
+    assert invalid == tokens
+
+def test_parse_matches_inet_pton(engine):
+    """Test the chunk parser against inet_pton on random well-formed and malformed tokens."""
+    rng = random.Random(0)
+    pieces = ['0', '1', '9', '10', '25', '99', '100', '199', '249', '255', '256', '300', '999', '1000',
+              '00', '01', '007', '', 'a', '1a', '-1', '+1']
+    tokens = []
+    for _ in range(5000):
+        fields = [rng.choice(pieces) for _ in range(rng.choice((3, 4, 4, 4, 5)))]
+        tokens.append(rng.choice(('.', '.', '.', '..', '/')).join(fields))
+    text = ''.join(token + rng.choice((',', '\n', ' ', '\r\n', ', ', '\t')) for token in tokens)
+    expected, invalid = ip_engine.pack_ipv4(tokens)
+    values, rejected = parse_ipv4(text)
+    assert list(values) == list(expected)
+    assert rejected == [token for token in invalid if token]
+
+def test_empty_input(engine):
+    """Test that empty input produces no networks."""
+    assert ip_to_cidr_fast("") == []
+    assert ip_to_cidr_fast(" , ,") == []
+
+def test_unique_networks_ordered(engine):
+    """Test that ordered deduplication keeps first-seen order."""
+    values, _ = parse_ipv4("10.0.0.1,1.2.3.4,10.0.0.2,1.2.3.5")
+    assert unique_networks(values, ordered=True) == [0x0A000000, 0x01020300]
+    assert unique_networks(values) == [0x01020300, 0x0A000000]
+
+def test_aggregator_merges_in_batches(engine, monkeypatch):
+    """Test that networks held back between merges are all counted once."""
+    monkeypatch.setattr(ip_engine, 'MERGE_BATCH', 3)
+    aggregator = NetworkAggregator()
+    for i in range(20):
+        aggregator.add(f"10.0.{i % 7}.1,10.0.{i % 5}.2")
+    aggregator.update([0x0A000000, 0x0B000000])
+    assert len(aggregator) == 8
+    assert aggregator.networks() == [0x0A000000 + (i << 8) for i in range(7)] + [0x0B000000]
+
+def test_aggregator_returns_new_networks(engine):
+    """Test that each network is reported only the first time it is added."""
+    aggregator = NetworkAggregator(ordered=True)
+    assert aggregator.add("192.168.1.100,10.0.0.1") == ([0xC0A80100, 0x0A000000], [])
+    assert aggregator.add("192.168.1.5\n172.16.5.200") == ([0xAC100500], [])
+    assert aggregator.cidrs() == ["10.0.0.0/24", "172.16.5.0/24", "192.168.1.0/24"]
+
+@pytest.mark.parametrize("prefix,expected", [
+    (8, ["10.0.0.0/8"]),
+    (16, ["10.200.0.0/16"]),
+    (24, ["10.200.2.0/24"]),
+    (32, ["10.200.2.132/32"]),
+])
+def test_prefix_lengths(engine, prefix, expected):
+    """Test converting to prefix lengths other than /24."""
+    assert ip_to_cidr_fast("10.200.2.132", prefix=prefix) == expected
+
+def test_merge_intervals():
+    """Test that overlapping and touching intervals are merged."""
+    assert merge_intervals([(0, 5), (2, 3), (4, 8), (8, 9), (10, 12)]) == [(0, 9), (10, 12)]
+
+def test_range_to_cidrs():
+    """Test splitting a range into aligned blocks."""
+    assert range_to_cidrs(0x0A000100, 0x0A000400) == [(0x0A000100, 24), (0x0A000200, 23)]
+    assert range_to_cidrs(0, 1 << 32) == [(0, 0)]
+
+def test_collapse_matches_ipaddress():
+    """Test that collapsing matches ipaddress.collapse_addresses."""
+    networks = sorted({(i * 7919) % 4096 << 8 for i in range(2000)})
+    expected = [
+        (int(network.network_address), network.prefixlen)
+        for network in ipaddress.collapse_addresses(ipaddress.ip_network((n, 24)) for n in networks)
+    ]
+    assert collapse_networks(networks, 24) == expected
+
+def test_aggregator_collapsed_cidrs(engine):
+    """Test collapsing adjacent networks found in the input."""
+    aggregator = NetworkAggregator()
+    aggregator.add("10.0.0.1,10.0.1.1,10.0.2.1,10.0.3.1,10.0.5.1")
+    assert aggregator.collapsed_cidrs() == ["10.0.0.0/22", "10.0.5.0/24"]
+
+def test_ipv6_networks(engine):
+    """Test that IPv6 addresses are masked to their /64 by default."""
+    result = ip_to_cidr_fast("2001:db8::1,2001:db8::ffff,2001:db8:0:1::5")
+    assert result == ["2001:db8::/64", "2001:db8:0:1::/64"]
+
+def test_mixed_input(engine):
+    """Test that IPv4 and IPv6 addresses are handled side by side."""
+    result = ip_to_cidr_fast("2001:db8::1,10.0.0.1,::ffff:1.2.3.4,192.168.1.100", prefix6=48)
+    assert result == ["10.0.0.0/24", "192.168.1.0/24", "::/48", "2001:db8::/48"]
+
+def test_parse_ip_splits_families(engine):
+    """Test that parse_ip separates IPv4, IPv6 and invalid tokens."""
+    values, packed6, invalid = parse_ip("1.2.3.4,2001:db8::1,bad,2001:zz::1")
+    assert list(values) == [0x01020304]
+    assert packed6 == [ipaddress.ip_address("2001:db8::1").packed]
+    assert invalid == ["bad", "2001:zz::1"]
+
+def test_unique_networks6_ordered():
+    """Test IPv6 deduplication in sorted and first-seen order."""
+    packed = [ipaddress.ip_address(ip).packed for ip in ("2001:db8:1::1", "2001:db8::1", "2001:db8:1::2")]
+    first = int(ipaddress.ip_address("2001:db8:1::"))
+    second = int(ipaddress.ip_address("2001:db8::"))
+    assert unique_networks6(packed, 48, ordered=True) == [first, second]
+    assert unique_networks6(packed, 48) == [second, first]
+
+def test_collapse_ipv6(engine):
+    """Test collapsing adjacent IPv6 networks."""
+    aggregator = NetworkAggregator(prefix6=64)
+    aggregator.add("2001:db8::1,2001:db8:0:1::1,2001:db8:0:3::1")
+    assert aggregator.collapsed_cidrs() == ["2001:db8::/63", "2001:db8:0:3::/64"]
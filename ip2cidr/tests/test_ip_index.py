@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from src.ip_engine import NetworkAggregator
+from src.ip_index import CidrIndex, flatten_blocks, parse_cidr
+from src.ip_converter import annotate
+
+NETWORKS = ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "192.168.1.0/24", "2001:db8::/32", "2001:db8:1::/48"]
+
+def test_parse_cidr():
+    """Test parsing networks, clearing host bits."""
+    assert parse_cidr("10.1.2.3/16") == (4, 0x0A010000, 16)
+    assert parse_cidr("10.1.2.3") == (4, 0x0A010203, 32)
+    assert parse_cidr("2001:db8::/32") == (6, 0x20010DB8 << 96, 32)
+    with pytest.raises(ValueError):
+        parse_cidr("10.1.2.3/33")
+
+def test_flatten_nested_blocks():
+    """Test that nested blocks are split into disjoint ranges."""
+    blocks = [(0, 24), (64, 26)]
+    assert flatten_blocks(blocks, 32) == [(0, 63, 0), (64, 127, 1), (128, 255, 0)]
+
+def test_longest_prefix_lookup():
+    """Test that the most specific network wins."""
+    index = CidrIndex(NETWORKS)
+    assert index.lookup("10.1.2.3") == "10.1.2.0/24"
+    assert index.lookup("10.1.3.3") == "10.1.0.0/16"
+    assert index.lookup("10.200.0.1") == "10.0.0.0/8"
+    assert index.lookup("2001:db8:1::5") == "2001:db8:1::/48"
+    assert index.lookup("2001:db8:2::5") == "2001:db8::/32"
+    assert index.lookup("8.8.8.8") is None
+    assert index.lookup("not an ip") is None
+
+def test_lookup_many_matches_lookup():
+    """Test that batch lookup agrees with single lookups."""
+    index = CidrIndex(NETWORKS)
+    addresses = ["10.1.2.3", "8.8.8.8", "2001:db8:1::5", "junk", "192.168.1.255", "11.0.0.0", "9.255.255.255"]
+    assert index.lookup_many(addresses) == [index.lookup(address) for address in addresses]
+
+def test_save_and_load(tmp_path):
+    """Test that a saved index answers the same lookups after loading."""
+    path = tmp_path / "networks.idx"
+    CidrIndex(NETWORKS).save(str(path))
+    index = CidrIndex.load(str(path))
+    assert len(index) == len(NETWORKS)
+    assert index.lookup_many(["10.1.2.3", "2001:db8:1::5", "8.8.8.8"]) == ["10.1.2.0/24", "2001:db8:1::/48", None]
+
+def test_from_aggregator():
+    """Test building an index from converted networks."""
+    aggregator = NetworkAggregator()
+    aggregator.add("192.168.1.100,10.0.0.1,2001:db8::1")
+    index = CidrIndex.from_aggregator(aggregator)
+    assert index.lookup("10.0.0.200") == "10.0.0.0/24"
+    assert index.lookup("2001:db8::ffff") == "2001:db8::/64"
+
+def test_annotate():
+    """Test annotating a stream of addresses."""
+    out = io.StringIO()
+    annotate(CidrIndex(NETWORKS), ["10.1.2.3\n8.8.8.8\n"], out=out)
+    assert out.getvalue() == "10.1.2.3\t10.1.2.0/24\n8.8.8.8\t-\n"
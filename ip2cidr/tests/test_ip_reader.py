@@ -0,0 +1,105 @@
+import io
+import mmap
+import os
+
+import pytest
+
+from src.ip_reader import split_tokens, iter_chunks, iter_file_batches, iter_file_chunks, iter_range_chunks
+from src.ip_converter import iter_new_cidrs, ip_to_cidr
+from src.ip_engine import NetworkAggregator
+
+def _tokens(chunks):
+    return [token for chunk in chunks for token in split_tokens(chunk)]
+
+def test_newline_and_comma_separated():
+    """Test that both newlines and commas separate tokens."""
+    stream = io.StringIO("192.168.1.100\n10.0.0.1,172.16.5.200\r\n")
+    assert _tokens(iter_chunks(stream)) == ["192.168.1.100", "10.0.0.1", "172.16.5.200"]
+
+def test_token_across_chunk_boundary():
+    """Test that a token split across chunks is reassembled."""
+    stream = io.StringIO("192.168.1.100,10.0.0.1\n172.16.5.200")
+    chunks = list(iter_chunks(stream, chunk_size=5))
+    assert all(chunk.endswith((",", "\n")) for chunk in chunks[:-1])
+    assert _tokens(chunks) == ["192.168.1.100", "10.0.0.1", "172.16.5.200"]
+
+def test_empty_stream():
+    """Test that an empty stream yields no chunks."""
+    assert list(iter_chunks(io.StringIO(""))) == []
+
+def test_file_batches(tmp_path):
+    """Test reading IPs from several files."""
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text("192.168.1.100\n192.168.1.200\n")
+    second.write_text("10.0.0.1")
+    batches = iter_file_batches([str(first), str(second)], chunk_size=8)
+    assert ip_to_cidr(",".join(ip for batch in batches for ip in batch)) == ["10.0.0.0/24", "192.168.1.0/24"]
+
+def test_text_chunks_match_ip_to_cidr():
+    """Test that the engine fed with text chunks matches ip_to_cidr."""
+    ips = "192.168.1.100,invalid.ip,10.0.0.1,192.168.1.7"
+    aggregator = NetworkAggregator()
+    for chunk in iter_chunks(io.StringIO(ips.replace(",", "\n")), chunk_size=7):
+        aggregator.add(chunk)
+    assert aggregator.cidrs() == ip_to_cidr(ips)
+
+def test_networks_in_first_seen_order():
+    """Test that --stream prints new networks once, in order of first appearance."""
+    chunks = ["192.168.1.100,10.0.0.1", "192.168.1.5\n172.16.5.200"]
+    networks = iter_new_cidrs(chunks, NetworkAggregator(ordered=True))
+    assert list(networks) == ["192.168.1.0/24", "10.0.0.0/24", "172.16.5.0/24"]
+
+def test_mapped_chunks_end_on_separators(tmp_path):
+    """Test that memory-mapped chunks never split an address."""
+    path = tmp_path / "ips.txt"
+    path.write_text("192.168.1.100\n10.0.0.1,172.16.5.200\n")
+    chunks = [bytes(chunk) for chunk in iter_range_chunks(str(path), chunk_size=10)]
+    assert b"".join(chunks) == path.read_bytes()
+    assert all(chunk.endswith((b",", b"\n")) for chunk in chunks)
+
+def test_mapped_chunk_longer_than_chunk_size(tmp_path):
+    """Test that a token longer than the chunk size is kept whole."""
+    path = tmp_path / "ips.txt"
+    path.write_text("2001:db8:1:2:3:4:5:6,10.0.0.1")
+    chunks = [bytes(chunk) for chunk in iter_range_chunks(str(path), chunk_size=4)]
+    assert chunks == [b"2001:db8:1:2:3:4:5:6,", b"10.0.0.1"]
+
+def test_mapped_empty_file(tmp_path):
+    """Test that an empty file yields no chunks."""
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    assert list(iter_range_chunks(str(path))) == []
+
+def test_file_chunks_feed_engine(tmp_path):
+    """Test that memory-mapped chunks feed the aggregator directly."""
+    path = tmp_path / "ips.txt"
+    path.write_text("192.168.1.100\n10.0.0.1\n" * 100)
+    aggregator = NetworkAggregator()
+    for chunk in iter_file_chunks([str(path)], chunk_size=64):
+        aggregator.add(chunk)
+    assert aggregator.cidrs() == ["10.0.0.0/24", "192.168.1.0/24"]
+
+def _mapped_file_kb():
+    """Return the resident file-backed memory of this process in kB."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssFile:'):
+                return int(line.split()[1])
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status') or not hasattr(mmap.mmap, 'madvise'),
+                    reason="needs /proc and madvise")
+def test_mapped_chunks_keep_memory_flat(tmp_path):
+    path = tmp_path / "ips.txt"
+    line = b"192.168.1.100,10.0.0.1\n" * 4096
+    with open(path, 'wb') as f:
+        for _ in range(700):
+            f.write(line)
+
+    baseline = _mapped_file_kb()
+    peak = baseline
+    for chunk in iter_range_chunks(str(path)):
+        chunk.tobytes()
+        peak = max(peak, _mapped_file_kb())
+    # The file is about 64 MB; only the chunks around the cursor stay mapped
+    assert peak - baseline < 8 * 1024
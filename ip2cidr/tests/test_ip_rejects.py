@@ -0,0 +1,38 @@
+import io
+
+from src.ip_rejects import (
+    INVALID_IPV6, LEADING_ZERO, NON_NUMERIC, OUT_OF_RANGE, WRONG_OCTET_COUNT, RejectLog, classify_invalid,
+)
+
+def test_classify_invalid():
+    """Test that each kind of malformed address gets its own reason."""
+    assert classify_invalid("10.0.0") == WRONG_OCTET_COUNT
+    assert classify_invalid("1.2.3.4.5") == WRONG_OCTET_COUNT
+    assert classify_invalid("999.x.1.2") == NON_NUMERIC
+    assert classify_invalid("10..0.1") == NON_NUMERIC
+    assert classify_invalid("01.2.3.4") == LEADING_ZERO
+    assert classify_invalid("256.1.2.3") == OUT_OF_RANGE
+    assert classify_invalid("2001:db8::g") == INVALID_IPV6
+
+def test_summary():
+    """Test that rejects are summarised in one line, by reason."""
+    rejects = RejectLog(max_samples=2)
+    assert rejects.summary() is None
+    rejects.extend(["10.0.0", "256.1.2.3"])
+    rejects.extend(["300.1.2.3"])
+    assert len(rejects) == 3
+    assert rejects.summary() == (
+        "Skipped 3 invalid IP addresses (2 octet out of range, 1 wrong number of octets), e.g. 10.0.0, 256.1.2.3"
+    )
+
+def test_rejects_file():
+    """Test that every rejected token is written with its reason."""
+    out = io.StringIO()
+    rejects = RejectLog(out)
+    rejects.extend(["10.0.0", "256.1.2.3"])
+    rejects.merge({OUT_OF_RANGE: 1}, ["1.1.1.999"], "1.1.1.999\toctet out of range\n")
+    assert out.getvalue() == (
+        "10.0.0\twrong number of octets\n256.1.2.3\toctet out of range\n1.1.1.999\toctet out of range\n"
+    )
+    assert rejects.counts[OUT_OF_RANGE] == 2
+    assert rejects.samples == ["10.0.0", "256.1.2.3", "1.1.1.999"]
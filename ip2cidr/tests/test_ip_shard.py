@@ -0,0 +1,65 @@
+import io
+
+from src.ip_engine import NetworkAggregator
+from src.ip_reader import iter_range_chunks, shard_ranges
+from src.ip_rejects import RejectLog
+from src.ip_shard import convert_files_parallel, convert_shard
+
+IPS = ["192.168.1.100", "10.0.0.1", "172.16.5.200", "2001:db8::1", "10.0.1.7", "192.168.1.5"] * 50
+
+def write_ips(tmp_path, separator="\n"):
+    path = tmp_path / "ips.txt"
+    path.write_text(separator.join(IPS))
+    return str(path)
+
+def test_shards_cover_file_on_boundaries(tmp_path):
+    """Test that shards cover the file and never split an address."""
+    path = write_ips(tmp_path)
+    ranges = shard_ranges(path, 4)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len("\n".join(IPS))
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+
+    tokens = []
+    for start, end in ranges:
+        for chunk in iter_range_chunks(path, start, end, chunk_size=7):
+            tokens.extend(bytes(chunk).decode().replace(",", "\n").split())
+    assert tokens == IPS
+
+def test_more_shards_than_separators(tmp_path):
+    """Test that a file with a single address yields a single shard."""
+    path = tmp_path / "one.txt"
+    path.write_text("10.0.0.1")
+    assert shard_ranges(str(path), 8) == [(0, 8)]
+
+def test_convert_shard(tmp_path):
+    """Test converting a single shard in-process."""
+    path = write_ips(tmp_path, ",")
+    packed, networks6, _ = convert_shard(path, 0, len(",".join(IPS)))
+    assert len(packed) == 4 * 4
+    assert len(networks6) == 1
+
+def test_parallel_matches_single_process(tmp_path):
+    """Test that the sharded path produces the same output as the single-process path."""
+    path = write_ips(tmp_path)
+    single = NetworkAggregator()
+    with open(path) as f:
+        single.add(f.read())
+
+    parallel = convert_files_parallel([path], NetworkAggregator(), workers=3)
+    assert parallel.cidrs() == single.cidrs()
+
+def test_parallel_rejects_in_order(tmp_path):
+    """Test that rejects from all shards are merged in input order."""
+    path = tmp_path / "dirty.txt"
+    tokens = [f"10.0.{i}.1" if i % 3 else f"10.0.{i}.999" for i in range(60)]
+    path.write_text("\n".join(tokens))
+
+    single = NetworkAggregator(rejects=RejectLog(io.StringIO()))
+    with open(path) as f:
+        single.add(f.read())
+
+    parallel = convert_files_parallel([str(path)], NetworkAggregator(rejects=RejectLog(io.StringIO())), workers=4)
+    assert parallel.cidrs() == single.cidrs()
+    assert len(parallel.rejects) == 20
+    assert parallel.rejects.out.getvalue() == single.rejects.out.getvalue()
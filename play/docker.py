@@ -1,27 +1,72 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
 import subprocess
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
-from pathlib import Path
 
-def get_overlay2_folder_sizes():
-    """Get sizes of overlay2 folders as a dict: {folder_name: size_in_bytes}."""
-    folder_sizes = {}
-    overlay2_path = "/var/lib/docker/overlay2"
+OVERLAY2_PATH = "/var/lib/docker/overlay2"
 
-    for folder in Path(overlay2_path).iterdir():
-        if folder.is_dir():
-            try:
-                cmd = f"du -sh {folder}"
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-                size_str = result.stdout.split()[0]
-                folder_sizes[folder.name] = parse_size_to_bytes(size_str)
-            except (subprocess.SubprocessError, ValueError):
-                continue
+def allocated_size(stat):
+    """Return the bytes allocated on disk for a stat result, as du counts them."""
+    blocks = getattr(stat, 'st_blocks', None)
+    # st_blocks is in 512-byte units; without it, fall back to the apparent size
+    return blocks * 512 if blocks is not None else stat.st_size
 
-    return folder_sizes
+def directory_size(path):
+    """Return the bytes allocated by a directory tree, like du -s but exact.
+
+    Symbolic links are counted but not followed, and a file with several
+    hard links in the tree is counted once. Entries that vanish or cannot be
+    read during the walk are skipped.
+    """
+    try:
+        total = allocated_size(os.lstat(path))
+    except OSError:
+        return 0
+    seen = set()
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif stat.st_nlink > 1:
+                            key = (stat.st_dev, stat.st_ino)
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                        total += allocated_size(stat)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+def get_overlay2_folder_sizes(overlay2_path=OVERLAY2_PATH, workers=None):
+    """Get sizes of overlay2 folders as a dict: {folder_name: size_in_bytes}.
+
+    The folders are measured in process, spread over a pool of workers
+    threads (by default a few per CPU, since the walk mostly waits on the
+    file system).
+    """
+    try:
+        with os.scandir(overlay2_path) as entries:
+            folders = [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return {}
+
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = executor.map(directory_size, [folder.path for folder in folders])
+        return {folder.name: size for folder, size in zip(folders, sizes)}
 
 def parse_size_to_bytes(size_str):
     """Convert human-readable size (e.g., '113.07M') to bytes."""
@@ -39,7 +84,52 @@ def parse_size_to_bytes(size_str):
 
     return int(num * units.get(unit, 1))
 
-def get_docker_containers():
+# Containers inspected per `docker inspect` call, and the most bytes of
+# container ids passed to one call, far below any platform's argv limit
+INSPECT_CHUNK_SIZE = 200
+INSPECT_CHUNK_BYTES = 16 * 1024
+
+def chunk_arguments(arguments, max_count=INSPECT_CHUNK_SIZE, max_bytes=INSPECT_CHUNK_BYTES):
+    """Split arguments into lists of at most max_count items and about max_bytes bytes each."""
+    chunks = []
+    chunk = []
+    size = 0
+    for argument in arguments:
+        length = len(argument) + 1
+        if chunk and (len(chunk) >= max_count or size + length > max_bytes):
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+        chunk.append(argument)
+        size += length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _inspect_chunk(container_ids):
+    """Return the inspect data of a chunk of containers from one `docker inspect` call."""
+    try:
+        result = subprocess.run(['docker', 'inspect', *container_ids], capture_output=True, text=True)
+        # Containers removed since they were listed make docker exit non-zero,
+        # but the others are still printed
+        return json.loads(result.stdout) if result.stdout.strip() else []
+    except (subprocess.SubprocessError, OSError, json.JSONDecodeError):
+        return []
+
+def inspect_containers(container_ids, chunk_size=INSPECT_CHUNK_SIZE, workers=1):
+    """Return the inspect data of the given containers, in batched `docker inspect` calls.
+
+    With workers above 1, that many chunks are inspected at the same time.
+    """
+    chunks = chunk_arguments(container_ids, chunk_size)
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_inspect_chunk, chunks))
+    else:
+        results = [_inspect_chunk(chunk) for chunk in chunks]
+    return [inspect_data for result in results for inspect_data in result]
+
+def get_docker_containers(chunk_size=INSPECT_CHUNK_SIZE, workers=1):
     """Get list of (container_id, container_name, inspect_data) tuples."""
     containers = []
     try:
@@ -47,15 +137,9 @@ def get_docker_containers():
         result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
         container_ids = result.stdout.strip().split()
 
-        for cid in container_ids:
-            cmd = f"docker inspect {cid}"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            try:
-                inspect_data = json.loads(result.stdout)[0]
-                container_name = inspect_data.get('Name', '').lstrip('/')
-                containers.append((cid[:12], container_name, inspect_data))
-            except json.JSONDecodeError:
-                continue
+        for inspect_data in inspect_containers(container_ids, chunk_size, workers):
+            container_name = inspect_data.get('Name', '').lstrip('/')
+            containers.append((inspect_data.get('Id', '')[:12], container_name, inspect_data))
     except subprocess.SubprocessError:
         pass
 
@@ -77,11 +161,26 @@ def format_size(size_bytes):
     return f"{size:.2f} {units[unit_index]}"
 
 def main():
+    parser = argparse.ArgumentParser(description='Show the overlay2 disk usage of each Docker container')
+    parser.add_argument('--overlay2-path', default=OVERLAY2_PATH,
+                        help='Docker overlay2 directory (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='Threads measuring overlay2 folders (default: 4 per CPU, at most 32)')
+    parser.add_argument('--chunk-size', type=int, default=INSPECT_CHUNK_SIZE,
+                        help='Containers per docker inspect call (default: %(default)s)')
+    parser.add_argument('--inspect-workers', type=int, default=1,
+                        help='docker inspect calls run at the same time (default: %(default)s)')
+    args = parser.parse_args()
+    for option, value in (('--workers', args.workers), ('--chunk-size', args.chunk_size),
+                          ('--inspect-workers', args.inspect_workers)):
+        if value is not None and value < 1:
+            parser.error(f"{option} must be at least 1")
+
     # Get folder sizes
-    folder_sizes = get_overlay2_folder_sizes()
+    folder_sizes = get_overlay2_folder_sizes(args.overlay2_path, args.workers)
 
     # Get containers
-    containers = get_docker_containers()
+    containers = get_docker_containers(args.chunk_size, args.inspect_workers)
 
     # Map folder sizes to containers
     container_sizes = {container[1]: 0 for container in containers}
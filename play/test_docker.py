@@ -1,4 +1,12 @@
-from .docker import parse_size_to_bytes, format_size
+import json
+import os
+import subprocess
+
+import pytest
+
+from . import docker
+from .docker import (parse_size_to_bytes, format_size, directory_size, get_overlay2_folder_sizes,
+                     chunk_arguments, inspect_containers)
 
 def test_parse_size_to_bytes():
     # Test different units
@@ -38,3 +46,89 @@ def test_format_size():
     # Test values just under next unit
     assert format_size(1023) == '1023.00 B'
     assert format_size(1024**2 - 1) == '1024.00 KB'
+
+def test_directory_size(tmp_path):
+    layer = tmp_path / 'layer'
+    (layer / 'diff' / 'etc').mkdir(parents=True)
+    (layer / 'diff' / 'etc' / 'config').write_bytes(b'x' * 10000)
+    os.link(layer / 'diff' / 'etc' / 'config', layer / 'diff' / 'config-link')
+    os.symlink('etc/config', layer / 'diff' / 'config-symlink')
+
+    # Every entry is counted by its allocated blocks, the hard link once
+    expected = sum(os.lstat(path).st_blocks * 512 for path in [
+        layer, layer / 'diff', layer / 'diff' / 'etc', layer / 'diff' / 'etc' / 'config',
+        layer / 'diff' / 'config-symlink',
+    ])
+    assert directory_size(str(layer)) == expected
+
+    # Missing directories count as empty
+    assert directory_size(str(tmp_path / 'missing')) == 0
+
+def test_get_overlay2_folder_sizes(tmp_path):
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'file').write_bytes(b'x' * 5000)
+    (tmp_path / 'not-a-layer').write_text('')
+
+    sizes = get_overlay2_folder_sizes(str(tmp_path), workers=2)
+    assert sizes == {name: directory_size(str(tmp_path / name)) for name in ('a', 'b')}
+    assert get_overlay2_folder_sizes(str(tmp_path / 'missing')) == {}
+
+def test_chunk_arguments():
+    assert chunk_arguments([]) == []
+    assert chunk_arguments(['a', 'b', 'c'], max_count=2) == [['a', 'b'], ['c']]
+    # Each argument costs its length plus a separator
+    assert chunk_arguments(['aaa', 'bbb', 'ccc'], max_bytes=8) == [['aaa', 'bbb'], ['ccc']]
+    # An argument longer than the budget still gets a chunk of its own
+    assert chunk_arguments(['a' * 20, 'b'], max_bytes=8) == [['a' * 20], ['b']]
+
+def test_inspect_containers(monkeypatch):
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        # The last container was removed after it was listed
+        found = [{'Id': cid * 8, 'Name': f'/{cid}'} for cid in args[2:] if cid != 'gone']
+        return subprocess.CompletedProcess(args, 1 if 'gone' in args else 0, json.dumps(found), '')
+    monkeypatch.setattr(docker.subprocess, 'run', run)
+
+    ids = [f'c{i:02d}' for i in range(5)] + ['gone']
+    for workers in (1, 3):
+        calls.clear()
+        inspected = inspect_containers(ids, chunk_size=2, workers=workers)
+        assert [data['Name'] for data in inspected] == [f'/c{i:02d}' for i in range(5)]
+        assert sorted(calls) == [['docker', 'inspect', 'c00', 'c01'], ['docker', 'inspect', 'c02', 'c03'],
+                                 ['docker', 'inspect', 'c04', 'gone']]
+
+def test_main_options(monkeypatch, capsys, tmp_path):
+    (tmp_path / 'layer').mkdir()
+    (tmp_path / 'layer' / 'file').write_bytes(b'x' * 5000)
+    scans = []
+
+    def folder_sizes(overlay2_path, workers):
+        scans.append((overlay2_path, workers))
+        return get_overlay2_folder_sizes(overlay2_path, workers)
+    monkeypatch.setattr(docker, 'get_overlay2_folder_sizes', folder_sizes)
+    inspections = []
+
+    def docker_containers(chunk_size, workers):
+        inspections.append((chunk_size, workers))
+        return []
+    monkeypatch.setattr(docker, 'get_docker_containers', docker_containers)
+
+    monkeypatch.setattr('sys.argv', ['docker.py', '--overlay2-path', str(tmp_path), '-w', '2'])
+    docker.main()
+    assert scans == [(str(tmp_path), 2)]
+    assert inspections == [(docker.INSPECT_CHUNK_SIZE, 1)]
+    assert ' - layer' in capsys.readouterr().out
+
+    monkeypatch.setattr('sys.argv', ['docker.py', '--overlay2-path', str(tmp_path),
+                                     '--chunk-size', '50', '--inspect-workers', '4'])
+    docker.main()
+    assert inspections[-1] == (50, 4)
+
+    for option in ('--workers', '--chunk-size', '--inspect-workers'):
+        monkeypatch.setattr('sys.argv', ['docker.py', option, '0'])
+        with pytest.raises(SystemExit) as exc:
+            docker.main()
+        assert exc.value.code == 2